@@ -5,6 +5,9 @@
 # This file is Copyright (c) 2021-2023 Florent Kermarrec <florent@enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import sys
+import array
+
 from migen.fhdl.structure    import *
 from migen.fhdl.module       import *
 from migen.fhdl.bitcontainer import bits_for
@@ -12,6 +15,48 @@ from migen.fhdl.tools        import *
 from migen.fhdl.verilog      import _printexpr as verilog_printexpr
 from migen.fhdl.specials     import *
 
+# LiteX Memory Init Content ------------------------------------------------------------------------
+
+_init_chunk_size = 2**16
+
+def _memory_init_chunks(init, width):
+    """Generate Memory init as $readmemh content (one hex word per line) by chunks.
+
+    8/16/32/64-bit words are packed in arrays and converted with bytes.hex by chunks, other widths
+    (or values not fitting the width) are formatted word by word.
+    """
+    formatter = f"{{:0{int(width/4)}x}}\n"
+    typecodes = [t for t in "BHILQ" if array.array(t).itemsize*8 == width]
+    fast      = (len(typecodes) > 0) and (sys.version_info >= (3, 8)) # bytes.hex separator.
+    for i in range(0, len(init), _init_chunk_size):
+        chunk = init[i:i + _init_chunk_size]
+        words = None
+        if fast:
+            try:
+                words = array.array(typecodes[0], chunk)
+            except (OverflowError, TypeError):
+                pass
+        if words is None:
+            yield "".join(map(formatter.format, chunk))
+        else:
+            if sys.byteorder == "little":
+                words.byteswap()
+            yield words.tobytes().hex("\n", width//8) + "\n"
+
+class _MemoryInitContent:
+    """Memory init data file content, iterable in chunks (streamed to the file, see ConvOutput)."""
+    def __init__(self, init, width):
+        if not isinstance(init, (list, tuple, array.array)):
+            init = list(init)
+        self.init  = init
+        self.width = width
+
+    def __iter__(self):
+        return _memory_init_chunks(self.init, self.width)
+
+    def __str__(self):
+        return "".join(self)
+
 # LiteX Memory Verilog Generation ------------------------------------------------------------------
 
 def _memory_generate_verilog(name, memory, namespace, add_data_file):
@@ -74,10 +119,7 @@ def _memory_generate_verilog(name, memory, namespace, add_data_file):
     # ----------------------------------------
     r += f"reg [{memory.width-1}:0] {_get_name(memory)}[0:{memory.depth-1}];\n"
     if memory.init is not None:
-        content = ""
-        formatter = f"{{:0{int(memory.width/4)}x}}\n"
-        for d in memory.init:
-            content += formatter.format(d)
+        content = _MemoryInitContent(memory.init, memory.width)
         memory_filename = add_data_file(f"{name}_{_get_name(memory)}.init", content)
 
         r += "initial begin\n"
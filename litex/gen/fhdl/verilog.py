@@ -13,7 +13,9 @@
 # This file is Copyright (c) 2018 Robin Ole Heinemann <robin.ole.heinemann@t-online.de>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import os
 import time
+import hashlib
 import datetime
 import collections
 
@@ -24,7 +26,7 @@ from migen.fhdl.structure   import *
 from migen.fhdl.structure   import _Operator, _Slice, _Assign, _Fragment
 from migen.fhdl.tools       import *
 from migen.fhdl.tools       import _apply_lowerer, _Lowerer
-from migen.fhdl.conv_output import ConvOutput
+from migen.fhdl.conv_output import ConvOutput as MigenConvOutput
 from migen.fhdl.specials    import Instance, Memory
 
 from litex.gen import LiteXContext
@@ -472,6 +474,56 @@ class _ComplexSliceLowerer(_Lowerer):
 def lower_complex_slices(f):
     return _apply_lowerer(_ComplexSliceLowerer(), f)
 
+# ------------------------------------------------------------------------------------------------ #
+#                                      CONV OUTPUT                                                 #
+# ------------------------------------------------------------------------------------------------ #
+
+def _file_digest(filename, chunk_size=2**20):
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.digest()
+
+def _write_data_file(filename, content):
+    # Only (re-)write data files when content changes, to avoid invalidating incremental builds.
+    # Content (str or iterable of str chunks) is streamed to a temporary file while hashed.
+    if isinstance(content, str):
+        content = [content]
+    h   = hashlib.sha256()
+    tmp = filename + ".tmp"
+    def chunks():
+        for chunk in content:
+            data = chunk.encode()
+            h.update(data)
+            yield data
+    with open(tmp, "wb") as f:
+        f.writelines(chunks())
+    if os.path.isfile(filename) and (os.path.getsize(filename) == os.path.getsize(tmp)):
+        if _file_digest(filename) == h.digest():
+            os.remove(tmp)
+            return False
+    os.replace(tmp, filename)
+    return True
+
+class ConvOutput(MigenConvOutput):
+    """Verilog conversion output.
+
+    ``data_files`` values are ``str`` or, for Memory init files, iterables of ``str`` chunks
+    (streamed to the files): use ``str(content)`` or ``"".join(content)`` to get the full content.
+    """
+    def __str__(self):
+        r = self.main_source + "\n"
+        for filename, content in sorted(self.data_files.items(), key=lambda item: item[0]):
+            r += filename + ":\n" + "".join(content)
+        return r
+
+    def write(self, main_filename):
+        with open(main_filename, "w") as f:
+            f.write(self.main_source)
+        for filename, content in self.data_files.items():
+            _write_data_file(filename, content)
+
 # ------------------------------------------------------------------------------------------------ #
 #                                    FHDL --> VERILOG                                              #
 # ------------------------------------------------------------------------------------------------ #
@@ -5,29 +5,111 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 from migen import *
+from migen.fhdl.bitcontainer import value_bits_sign
 
-from functools import reduce
-from operator import and_, or_, not_, xor, add
+from operator import and_, or_, xor, add
 
-# Reduction ----------------------------------------------------------------------------------------
+from litex.gen.fhdl.module import LiteXModule
 
-def Reduce(operator, value):
-    # List of supported Operators.
-    operators = {
-        "AND"  : and_,
-        "OR"   : or_,
-        "NOR"  : not_,
-        "XOR"  : xor,
-        "ADD"  : add,
-    }
+# Helpers ------------------------------------------------------------------------------------------
+
+# List of supported Operators.
+_operators = {
+    "AND"  : and_,
+    "OR"   : or_,
+    "NOR"  : or_, # Inverted after the reduction (see _invert).
+    "XOR"  : xor,
+    "ADD"  : add,
+}
 
+def _get_operator(operator):
     # Switch to upper-case.
     operator = operator.upper()
 
     # Check if provided operator is supported.
-    if operator not in operators.keys():
-        supported = ", ".join(operators.keys())
+    if operator not in _operators.keys():
+        supported = ", ".join(_operators.keys())
         raise ValueError(f"Reduce does not support {operator} operator; supported: {supported}.")
+    return operator
+
+def _get_values(value):
+    values = list(value)
+    if len(values) == 0:
+        raise ValueError("Reduce requires at least one value.")
+    return values
+
+def _invert(value):
+    # XOR with all ones (rather than ~) to keep the result unsigned/positive in simulation.
+    return value ^ (2**len(value) - 1)
+
+def _reduce_level(operator, values):
+    # Combine adjacent pairs, odd element is forwarded to the next level.
+    return [operator(values[i], values[i + 1]) if (i + 1) < len(values) else values[i]
+        for i in range(0, len(values), 2)]
+
+# Reduction ----------------------------------------------------------------------------------------
+
+def Reduce(operator, value):
+    """Reduce ``value`` (iterable of values or bits of a value) with ``operator``.
+
+    The reduction is built as a balanced tree, giving a log2(N) logic depth.
+    """
+    operator = _get_operator(operator)
+    values   = _get_values(value)
+
+    # Build balanced tree.
+    while len(values) > 1:
+        values = _reduce_level(_operators[operator], values)
+    r = values[0]
+
+    # Invert for NOR.
+    if operator == "NOR":
+        r = _invert(r)
+    return r
+
+# Pipelined Reduction ------------------------------------------------------------------------------
+
+class PipelinedReduce(LiteXModule):
+    """Pipelined version of ``Reduce`` for wide reductions.
+
+    Registers are inserted every ``ceil(levels/pipeline_stages)`` levels of the balanced tree, the
+    result (``o``) is available ``pipeline_stages`` cycles after the inputs (``latency``).
+    """
+    def __init__(self, operator, value, pipeline_stages=1, clk_domain="sys"):
+        assert pipeline_stages >= 1
+        operator = _get_operator(operator)
+        values   = _get_values(value)
+        sync     = getattr(self.sync, clk_domain)
+
+        # Tree depth/Registers spacing.
+        levels = (len(values) - 1).bit_length()
+        step   = max(1, -(-levels//pipeline_stages))
+
+        # Build balanced tree with registers.
+        stages = 0
+        level  = 0
+        while len(values) > 1:
+            values = _reduce_level(_operators[operator], values)
+            level += 1
+            if (level % step == 0) and (stages < pipeline_stages):
+                regs = [Signal(value_bits_sign(v)) for v in values]
+                sync += [reg.eq(v) for reg, v in zip(regs, values)]
+                values  = regs
+                stages += 1
+        r = values[0]
+
+        # Complete latency.
+        while stages < pipeline_stages:
+            reg = Signal(value_bits_sign(r))
+            sync += reg.eq(r)
+            r       = reg
+            stages += 1
+
+        # Invert for NOR.
+        if operator == "NOR":
+            r = _invert(r)
 
-    # Return Python's reduction.
-    return reduce(operators[operator], value)
+        # Output.
+        self.latency = pipeline_stages
+        self.o       = Signal(value_bits_sign(r))
+        self.comb   += self.o.eq(r)
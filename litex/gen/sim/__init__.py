@@ -1 +1,2 @@
 from litex.gen.sim.core import Simulator, run_simulation, passive
+from litex.gen.sim.parallel import SimulationJob, SimulationResult, run_simulations
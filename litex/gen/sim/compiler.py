@@ -0,0 +1,306 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import collections
+
+from migen.fhdl.structure import *
+from migen.fhdl.structure import _Operator, _Slice, _ArrayProxy, _Assign
+from migen.fhdl.bitcontainer import value_bits_sign
+from migen.fhdl.specials import _MemoryLocation
+
+# Helpers ------------------------------------------------------------------------------------------
+
+_binary_ops = {
+    "+"   : "+",
+    "-"   : "-",
+    "*"   : "*",
+    ">>>" : ">>",
+    "<<<" : "<<",
+    "&"   : "&",
+    "^"   : "^",
+    "|"   : "|",
+    "<"   : "<",
+    "<="  : "<=",
+    "=="  : "==",
+    "!="  : "!=",
+    ">"   : ">",
+    ">="  : ">=",
+}
+
+# Maximum nesting of a generated expression before it is hoisted into a local: keeps the generated
+# code far from CPython's parser limits on deeply chained operators.
+_max_expr_depth = 32
+
+
+def _truncate_code(code, nbits, signed):
+    mask = 2**nbits - 1
+    if signed:
+        half = 2**(nbits - 1)
+        return "(((({}) + {}) & {}) - {})".format(code, half, mask, half)
+    return "(({}) & {})".format(code, mask)
+
+# Statement Compiler -------------------------------------------------------------------------------
+
+class StatementCompiler:
+    """Lower FHDL statements to Python functions.
+
+    Signals are mapped to integer indexes in a flat list of committed values (``v``); assignments
+    are written to a dict of pending modifications (``m``) keyed by the same indexes, matching the
+    commit semantics of the interpreted ``Evaluator``.
+    """
+    def __init__(self, index, values, modifications, clock_domains, replaced_memories, display):
+        self.index             = index
+        self.values            = values
+        self.modifications     = modifications
+        self.clock_domains     = clock_domains
+        self.replaced_memories = replaced_memories
+        self.display           = display
+
+    def compile(self, statements, name="execute"):
+        self._lines     = []
+        self._namespace = {"v": self.values, "m": self.modifications, "D": self.display}
+        self._tables    = {}
+        self._ntemps    = 0
+        self._statements(statements, 1)
+        if not self._lines:
+            self._emit(1, "pass")
+        args   = ", ".join("{0}={0}".format(k) for k in self._namespace.keys())
+        source = "def {}({}):\n".format(name, args) + "\n".join(self._lines) + "\n"
+        code   = compile(source, "<litex.gen.sim:{}>".format(name), "exec")
+        scope  = dict(self._namespace)
+        exec(code, scope)
+        return scope[name]
+
+    # Code emission --------------------------------------------------------------------------------
+
+    def _emit(self, level, line):
+        self._lines.append("    "*level + line)
+
+    def _temp(self, level, code):
+        name = "t{}".format(self._ntemps)
+        self._ntemps += 1
+        self._emit(level, "{} = {}".format(name, code))
+        return name
+
+    def _table(self, values):
+        values = tuple(values)
+        try:
+            return self._tables[values]
+        except KeyError:
+            name = "T{}".format(len(self._tables))
+            self._tables[values]  = name
+            self._namespace[name] = values
+            return name
+
+    def _signal(self, signal):
+        try:
+            return self.index[signal]
+        except KeyError:
+            raise ValueError("Signal {} is not part of the simulated fragment".format(signal))
+
+    # Expressions ----------------------------------------------------------------------------------
+
+    def _expr(self, node, level, postcommit=False):
+        code, depth = self._expr_depth(node, level, postcommit)
+        return code
+
+    def _expr_depth(self, node, level, postcommit):
+        if isinstance(node, Constant):
+            return repr(node.value), 0
+        elif isinstance(node, Signal):
+            i = self._signal(node)
+            if postcommit:
+                return "m.get({0}, v[{0}])".format(i), 0
+            return "v[{}]".format(i), 0
+        elif isinstance(node, ClockSignal):
+            return self._expr_depth(self.clock_domains[node.cd].clk, level, postcommit)
+        elif isinstance(node, ResetSignal):
+            rst = self.clock_domains[node.cd].rst
+            if rst is None:
+                if node.allow_reset_less:
+                    return "0", 0
+                raise ValueError("Attempted to get reset signal of resetless"
+                                 " domain '{}'".format(node.cd))
+            return self._expr_depth(rst, level, postcommit)
+
+        if isinstance(node, _Operator):
+            operands = [self._expr_depth(o, level, postcommit) for o in node.operands]
+            depth    = max(d for c, d in operands) + 1
+            operands = [c for c, d in operands]
+            if node.op == "-" and len(operands) == 1:
+                code = "(-{})".format(*operands)
+            elif node.op == "~":
+                code = "(~{})".format(*operands)
+            elif node.op == "m":
+                code = "({1} if {0} else {2})".format(*operands)
+            elif node.op in _binary_ops:
+                code = "({} {} {})".format(operands[0], _binary_ops[node.op], operands[1])
+            else:
+                raise NotImplementedError(node.op)
+        elif isinstance(node, _Slice):
+            code, depth = self._expr_depth(node.value, level, postcommit)
+            mask = 2**(node.stop - node.start) - 1
+            if node.start:
+                code = "(({} >> {}) & {})".format(code, node.start, mask)
+            else:
+                code = "({} & {})".format(code, mask)
+            depth += 1
+        elif isinstance(node, Cat):
+            terms = []
+            depth = 0
+            shift = 0
+            for element in node.l:
+                nbits = len(element)
+                c, d  = self._expr_depth(element, level, postcommit)
+                depth = max(depth, d)
+                if shift:
+                    terms.append("(({} & {}) << {})".format(c, 2**nbits - 1, shift))
+                else:
+                    terms.append("({} & {})".format(c, 2**nbits - 1))
+                shift += nbits
+            code  = "(" + " | ".join(terms) + ")" if terms else "0"
+            depth += 1
+        elif isinstance(node, Replicate):
+            nbits = len(node.v)
+            code, depth = self._expr_depth(node.v, level, postcommit)
+            factor = sum(1 << i*nbits for i in range(node.n))
+            code   = "(({} & {}) * {})".format(code, 2**nbits - 1, factor)
+            depth += 1
+        elif isinstance(node, _ArrayProxy):
+            key = self._key(node, level, postcommit)
+            if all(isinstance(c, Constant) for c in node.choices):
+                code = "{}[{}]".format(self._table(c.value for c in node.choices), key)
+            elif all(isinstance(c, Signal) for c in node.choices):
+                table = self._table(self._signal(c) for c in node.choices)
+                if postcommit:
+                    i    = self._temp(level, "{}[{}]".format(table, key))
+                    code = "m.get({0}, v[{0}])".format(i)
+                else:
+                    code = "v[{}[{}]]".format(table, key)
+            else:
+                # Balanced binary selection tree over arbitrary choices.
+                choices = [self._expr(c, level, postcommit) for c in node.choices]
+                def select(lo, hi):
+                    if hi - lo == 1:
+                        return choices[lo]
+                    mid = (lo + hi)//2
+                    return "({} if {} < {} else {})".format(
+                        select(lo, mid), key, mid, select(mid, hi))
+                code = select(0, len(choices))
+            depth = 1
+        elif isinstance(node, _MemoryLocation):
+            array = self.replaced_memories[node.memory]
+            index = self._expr(node.index, level, postcommit)
+            table = self._table(self._signal(s) for s in array)
+            if postcommit:
+                i    = self._temp(level, "{}[{}]".format(table, index))
+                code = "m.get({0}, v[{0}])".format(i)
+            else:
+                code = "v[{}[{}]]".format(table, index)
+            depth = 1
+        else:
+            raise NotImplementedError(node)
+
+        if depth > _max_expr_depth:
+            return self._temp(level, code), 0
+        return code, depth
+
+    def _key(self, node, level, postcommit=False):
+        key = self._expr(node.key, level, postcommit)
+        nbits, signed = value_bits_sign(node.key)
+        if not signed and 2**nbits <= len(node.choices):
+            # Key can't overflow the choices, no clamping needed.
+            return self._temp(level, key)
+        return self._temp(level, "min({}, {})".format(len(node.choices) - 1, key))
+
+    # Assignments ----------------------------------------------------------------------------------
+
+    def _assign(self, node, value, level):
+        if isinstance(node, Signal):
+            assert not node.variable
+            nbits, signed = value_bits_sign(node)
+            self._emit(level, "m[{}] = {}".format(
+                self._signal(node), _truncate_code(value, nbits, signed)))
+        elif isinstance(node, Cat):
+            value = self._temp(level, value)
+            shift = 0
+            for element in node.l:
+                nbits = len(element)
+                if shift:
+                    self._assign(element, "({} >> {})".format(value, shift), level)
+                else:
+                    self._assign(element, value, level)
+                shift += nbits
+        elif isinstance(node, _Slice):
+            value = self._temp(level, value)
+            full  = self._expr(node.value, level, postcommit=True)
+            clear = ~((2**node.stop - 1) - (2**node.start - 1))
+            mask  = 2**(node.stop - node.start) - 1
+            self._assign(node.value, "(({} & {}) | (({} & {}) << {}))".format(
+                full, clear, value, mask, node.start), level)
+        elif isinstance(node, _ArrayProxy):
+            value = self._temp(level, value)
+            key   = self._key(node, level)
+            if all(isinstance(c, Signal) for c in node.choices) and \
+               len(set(value_bits_sign(c) for c in node.choices)) == 1:
+                nbits, signed = value_bits_sign(node.choices[0])
+                table = self._table(self._signal(c) for c in node.choices)
+                self._emit(level, "m[{}[{}]] = {}".format(
+                    table, key, _truncate_code(value, nbits, signed)))
+            else:
+                for n, choice in enumerate(node.choices):
+                    self._emit(level, "{} {} == {}:".format("if" if n == 0 else "elif", key, n))
+                    self._assign(choice, value, level + 1)
+        elif isinstance(node, _MemoryLocation):
+            array = self.replaced_memories[node.memory]
+            value = self._temp(level, value)
+            index = self._expr(node.index, level)
+            table = self._table(self._signal(s) for s in array)
+            nbits, signed = value_bits_sign(array[0])
+            self._emit(level, "m[{}[{}]] = {}".format(
+                table, index, _truncate_code(value, nbits, signed)))
+        else:
+            raise NotImplementedError(node)
+
+    # Statements -----------------------------------------------------------------------------------
+
+    def _block(self, statements, level):
+        start = len(self._lines)
+        self._statements(statements, level)
+        if len(self._lines) == start:
+            self._emit(level, "pass")
+
+    def _statements(self, statements, level):
+        for s in statements:
+            if isinstance(s, _Assign):
+                self._assign(s.l, self._expr(s.r, level), level)
+            elif isinstance(s, If):
+                cond = self._expr(s.cond, level)
+                self._emit(level, "if {} & {}:".format(cond, 2**len(s.cond) - 1))
+                self._block(s.t, level + 1)
+                if s.f:
+                    self._emit(level, "else:")
+                    self._block(s.f, level + 1)
+            elif isinstance(s, Case):
+                nbits, signed = value_bits_sign(s.test)
+                test  = self._temp(level, _truncate_code(self._expr(s.test, level), nbits, signed))
+                first = True
+                for k, v in s.cases.items():
+                    if isinstance(k, Constant):
+                        self._emit(level, "{} {} == {}:".format("if" if first else "elif", test, k.value))
+                        self._block(v, level + 1)
+                        first = False
+                if "default" in s.cases:
+                    if first:
+                        self._statements(s.cases["default"], level)
+                    else:
+                        self._emit(level, "else:")
+                        self._block(s.cases["default"], level + 1)
+            elif isinstance(s, collections.abc.Iterable):
+                self._statements(s, level)
+            elif isinstance(s, Display):
+                self._emit(level, "D({}[0])".format(self._table([s])))
+            else:
+                raise NotImplementedError
@@ -9,65 +9,199 @@
 # This file is Copyright (c) 2018 Robin Ole Heinemann <robin.ole.heinemann@t-online.de>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import gzip
+import heapq
+import pickle
+import random
 import operator
 import collections
 import inspect
 from functools import wraps
+from fractions import Fraction
 
 from migen.fhdl.structure import *
 from migen.fhdl.structure import (_Value, _Statement,
                                   _Operator, _Slice, _ArrayProxy,
                                   _Assign, _Fragment)
 from migen.fhdl.bitcontainer import value_bits_sign
-from migen.fhdl.tools import (list_targets, list_signals,
+from migen.fhdl.tools import (list_targets, list_signals, group_by_targets,
                               insert_resets, lower_specials)
+from migen.fhdl.visit import NodeVisitor
 from migen.fhdl.simplify import MemoryToArray
 from migen.fhdl.specials import _MemoryLocation
 from migen.fhdl.module import Module
 from migen.genlib.resetsync import AsyncResetSynchronizer
 
 from litex.gen.sim.vcd import VCDWriter, DummyVCDWriter
+from litex.gen.sim.compiler import StatementCompiler
 
 
 class ClockState:
-    def __init__(self, high, half_period, time_before_trans):
-        self.high = high
-        self.half_period = half_period
-        self.time_before_trans = time_before_trans
+    def __init__(self, high, half_period, next_transition, jitter=0, exact=True):
+        self.high            = high
+        self.half_period     = half_period
+        self.next_transition = next_transition
+        self.nominal         = next_transition
+        self.jitter          = jitter
+        self.exact           = exact
+        self.enable          = True
+        self.generation      = 0
+
+
+def _time(value):
+    # Non-integer periods are handled as exact fractions to keep clock ratios exact.
+    if isinstance(value, int):
+        return value
+    return Fraction(str(value))
+
+
+def _resolution(times):
+    # Coarsest power of ten (from 1 down to 1e-6 time unit) representing all times exactly.
+    for n in range(7):
+        resolution = Fraction(1, 10**n)
+        if all(t % resolution == 0 for t in times):
+            return resolution
+    return resolution
 
 
 class TimeManager:
-    def __init__(self, description):
+    """Clock scheduler.
+
+    Clocks are described by ``period``, ``(period, phase)`` or ``(period, phase, jitter)``.
+    Transitions are kept in a priority queue so each tick only visits the clocks that toggle;
+    gated clocks (``set_enable``) are removed from the queue until re-enabled. ``jitter`` randomly
+    offsets each transition by up to +/- jitter around its nominal time (without drift).
+
+    Transition times are multiples of ``resolution`` (so they can be dumped as integers): by
+    default the coarsest power of ten (down to 1e-6 time unit) representing all the half-periods
+    and phases exactly. Nominal times are kept exact, times not representable (jitter, or a
+    coarser ``resolution``) are rounded without drift.
+    """
+    def __init__(self, description, seed=0, resolution=None):
         self.clocks = collections.OrderedDict()
+        self.time   = 0
+        self.events = []
+        self.order  = dict()
+        self.random = random.Random(seed)
 
+        clocks = []
         for k, period_phase in description.items():
+            jitter = 0
             if isinstance(period_phase, tuple):
-                period, phase = period_phase
+                period, phase, *jitter = period_phase
+                jitter = jitter[0] if jitter else 0
             else:
                 period = period_phase
                 phase = 0
-            half_period = period//2
+            period, phase = _time(period), _time(phase)
+            if isinstance(period, int):
+                half_period = period//2
+            else:
+                half_period = period/2
             if phase >= half_period:
                 phase -= half_period
                 high = True
             else:
                 high = False
-            self.clocks[k] = ClockState(high, half_period, half_period - phase)
+            clocks.append((k, high, half_period, phase, jitter))
+
+        if resolution is None:
+            resolution = _resolution([t for _, _, half_period, phase, _ in clocks for t in [half_period, phase]])
+        self.resolution = _time(resolution)
+        if self.resolution <= 0:
+            raise ValueError("Invalid time resolution: {}".format(resolution))
+
+        for k, high, half_period, phase, jitter in clocks:
+            exact = (half_period % self.resolution == 0) and (phase % self.resolution == 0)
+            self.order[k]  = len(self.order)
+            self.clocks[k] = ClockState(high, half_period, half_period - phase, jitter, exact)
+            self._schedule(k)
+
+    def _quantize(self, t):
+        t = round(t/self.resolution)*self.resolution
+        return t.numerator if t.denominator == 1 else t
+
+    def _schedule(self, k):
+        cs = self.clocks[k]
+        if cs.jitter:
+            t = self._quantize(cs.nominal + Fraction(self.random.uniform(-cs.jitter, cs.jitter)))
+            cs.next_transition = max(t, self._quantize(self.time + self.resolution))
+        elif cs.exact:
+            cs.next_transition = cs.nominal
+        else:
+            cs.next_transition = self._quantize(cs.nominal)
+        heapq.heappush(self.events, (cs.next_transition, self.order[k], cs.generation, k))
+
+    def set_enable(self, k, enable):
+        cs = self.clocks[k]
+        if enable and not cs.enable:
+            cs.nominal = self.time + cs.half_period
+            self._schedule(k)
+        elif not enable and cs.enable:
+            # Invalidate the pending transition.
+            cs.generation += 1
+        cs.enable = enable
+
+    def get_state(self):
+        clocks = {k: (cs.high, cs.nominal, cs.next_transition, cs.enable)
+            for k, cs in self.clocks.items()}
+        return {"time": self.time, "resolution": self.resolution, "clocks": clocks,
+            "random": self.random.getstate()}
+
+    def set_state(self, state):
+        if set(state["clocks"].keys()) != set(self.clocks.keys()):
+            raise ValueError("Clocks of the saved state do not match the simulation clocks")
+        if state["resolution"] != self.resolution:
+            raise ValueError("Time resolution of the saved state does not match the simulation")
+        self.time   = state["time"]
+        self.events = []
+        self.random.setstate(state["random"])
+        for k, (high, nominal, next_transition, enable) in state["clocks"].items():
+            cs = self.clocks[k]
+            cs.high            = high
+            cs.nominal         = nominal
+            cs.next_transition = next_transition
+            cs.enable          = enable
+            cs.generation     += 1
+            if enable:
+                self.events.append((next_transition, self.order[k], cs.generation, k))
+        heapq.heapify(self.events)
 
     def tick(self):
-        rising = set()
-        falling = set()
-        dt = min(cs.time_before_trans for cs in self.clocks.values())
-        for k, cs in self.clocks.items():
-            if cs.time_before_trans == dt:
-                cs.high = not cs.high
-                if cs.high:
-                    rising.add(k)
-                else:
-                    falling.add(k)
-            cs.time_before_trans -= dt
-            if not cs.time_before_trans:
-                cs.time_before_trans += cs.half_period
+        rising  = []
+        falling = []
+        events  = self.events
+        clocks  = self.clocks
+        t = None
+        while events:
+            et, order, generation, k = events[0]
+            if t is not None and et != t:
+                break
+            cs = clocks[k]
+            if generation != cs.generation:
+                heapq.heappop(events)
+                continue
+            if t is None:
+                t  = et
+                dt = t - self.time
+                self.time = t
+            cs.high = not cs.high
+            if cs.high:
+                rising.append(k)
+            else:
+                falling.append(k)
+            cs.nominal += cs.half_period
+            next_transition = cs.nominal
+            if cs.jitter:
+                next_transition = self._quantize(next_transition + Fraction(self.random.uniform(-cs.jitter, cs.jitter)))
+                # Keep transitions strictly after the current one (no zero-width half-periods).
+                next_transition = max(next_transition, self._quantize(t + self.resolution))
+            elif not cs.exact:
+                next_transition = self._quantize(next_transition)
+            cs.next_transition = next_transition
+            heapq.heapreplace(events, (next_transition, order, generation, k))
+        if t is None:
+            raise ValueError("No clock enabled")
         return dt, rising, falling
 
 
@@ -100,6 +234,67 @@ def _truncate(value, nbits, signed):
     return value
 
 
+class _InputLister(NodeVisitor):
+    def __init__(self, clock_domains, replaced_memories):
+        self.clock_domains     = clock_domains
+        self.replaced_memories = replaced_memories
+        self.output_list       = set()
+
+    def visit_Signal(self, node):
+        self.output_list.add(node)
+
+    def visit_ClockSignal(self, node):
+        self.output_list.add(self.clock_domains[node.cd].clk)
+
+    def visit_ResetSignal(self, node):
+        rst = self.clock_domains[node.cd].rst
+        if rst is not None:
+            self.output_list.add(rst)
+
+    def visit_Assign(self, node):
+        self.visit(node.r)
+        self.visit_target(node.l)
+
+    def visit_target(self, node):
+        # Only indexes are read when assigning.
+        if isinstance(node, Cat):
+            for element in node.l:
+                self.visit_target(element)
+        elif isinstance(node, _Slice):
+            self.visit_target(node.value)
+        elif isinstance(node, _ArrayProxy):
+            self.visit(node.key)
+            for choice in node.choices:
+                self.visit_target(choice)
+        elif isinstance(node, _MemoryLocation):
+            self.visit(node.index)
+
+    def visit_unknown(self, node):
+        if isinstance(node, _MemoryLocation):
+            self.output_list |= set(self.replaced_memories[node.memory])
+            self.visit(node.index)
+        elif isinstance(node, Display):
+            for arg in node.args:
+                self.visit(arg)
+
+
+def list_simulation_signals(fragment, replaced_memories):
+    signals = list_signals(fragment)
+    for cd in fragment.clock_domains:
+        signals.add(cd.clk)
+        if cd.rst is not None:
+            signals.add(cd.rst)
+    for memory_array in replaced_memories.values():
+        signals |= set(memory_array)
+    return sorted(signals, key=lambda x: x.duid)
+
+
+def list_inputs(node, clock_domains, replaced_memories):
+    lister = _InputLister(clock_domains, replaced_memories)
+    lister.visit(node)
+    return lister.output_list
+
+
 class Evaluator:
     def __init__(self, clock_domains, replaced_memories):
         self.clock_domains = clock_domains
@@ -116,6 +311,15 @@ class Evaluator:
         self.modifications.clear()
         return r
 
+    def modified_values(self, modified):
+        return ((signal, self.signal_values[signal]) for signal in modified)
+
+    def signal_key(self, signal):
+        return signal
+
+    def compile(self, statements):
+        return lambda: self.execute(statements)
+
     def eval(self, node, postcommit=False):
         if isinstance(node, Constant):
             return node.value
@@ -240,6 +444,103 @@ class Evaluator:
                 raise NotImplementedError
 
 
+class _SignalValues(collections.abc.Mapping):
+    def __init__(self, index, values):
+        self.index  = index
+        self.values = values
+
+    def __getitem__(self, signal):
+        return self.values[self.index[signal]]
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class CompiledEvaluator(Evaluator):
+    """Evaluator running statements lowered to Python functions.
+
+    Signal values are kept in a flat list indexed by signal. ``execute`` runs the compiled function
+    for any statement list passed to ``compile`` and falls back to the interpreter for the rest
+    (generator requests).
+    """
+    def __init__(self, fragment, replaced_memories):
+        Evaluator.__init__(self, fragment.clock_domains, replaced_memories)
+        self.index   = dict()
+        self.signals = []
+        self.values  = []
+
+        for signal in list_simulation_signals(fragment, replaced_memories):
+            self._signal_index(signal)
+        self.signal_values = _SignalValues(self.index, self.values)
+
+        self.compiler = StatementCompiler(self.index, self.values, self.modifications,
+            self.clock_domains, self.replaced_memories, self._display)
+        self.compiled = dict()
+
+    def _signal_index(self, signal):
+        try:
+            return self.index[signal]
+        except KeyError:
+            i = len(self.signals)
+            self.index[signal] = i
+            self.signals.append(signal)
+            self.values.append(signal.reset.value)
+            return i
+
+    def _display(self, s):
+        print(s.s %(*[self.eval(arg) for arg in s.args],))
+
+    def compile(self, statements):
+        # Keep a reference on the statements so that their id stays unique.
+        function = self.compiler.compile(statements)
+        self.compiled[id(statements)] = (statements, function)
+        return function
+
+    def commit(self):
+        values        = self.values
+        modifications = self.modifications
+        r = {k for k, v in modifications.items() if values[k] != v}
+        for k in r:
+            values[k] = modifications[k]
+        modifications.clear()
+        return r
+
+    def modified_values(self, modified):
+        return ((self.signals[i], self.values[i]) for i in modified)
+
+    def signal_key(self, signal):
+        return self._signal_index(signal)
+
+    def eval(self, node, postcommit=False):
+        if isinstance(node, Signal):
+            i = self._signal_index(node)
+            if postcommit:
+                try:
+                    return self.modifications[i]
+                except KeyError:
+                    pass
+            return self.values[i]
+        return Evaluator.eval(self, node, postcommit)
+
+    def assign(self, node, value):
+        if isinstance(node, Signal):
+            assert not node.variable
+            self.modifications[self._signal_index(node)] = _truncate(value,
+                                                                     node.nbits, node.signed)
+        else:
+            Evaluator.assign(self, node, value)
+
+    def execute(self, statements):
+        compiled = self.compiled.get(id(statements))
+        if compiled is None:
+            Evaluator.execute(self, statements)
+        else:
+            compiled[1]()
+
+
 class DummyAsyncResetSynchronizerImpl(Module):
     def __init__(self, cd, async_reset):
         # TODO: asynchronous set
@@ -257,7 +558,7 @@ class DummyAsyncResetSynchronizer:
 # TODO: instances via Iverilog/VPI
 class Simulator:
     def __init__(self, fragment_or_module, generators, clocks={"sys": 10}, vcd_name=None,
-                 special_overrides={}):
+                 special_overrides={}, backend="interpreted", vcd_options={}, time_resolution=None):
         if isinstance(fragment_or_module, _Fragment):
             self.fragment = fragment_or_module
         else:
@@ -265,6 +566,7 @@ class Simulator:
 
         mta = MemoryToArray()
         mta.transform_fragment(None, self.fragment)
+        self.replaced_memories = mta.replacements
 
         overrides = {AsyncResetSynchronizer: DummyAsyncResetSynchronizer}
         overrides.update(special_overrides)
@@ -285,7 +587,7 @@ class Simulator:
 
         clocks = collections.OrderedDict(sorted(clocks.items(),
                                                 key=operator.itemgetter(0)))
-        self.time = TimeManager(clocks)
+        self.time = TimeManager(clocks, resolution=time_resolution)
         for clock in clocks.keys():
             if clock not in self.fragment.clock_domains:
                 cd = ClockDomain(name=clock, reset_less=True)
@@ -296,45 +598,162 @@ class Simulator:
         # comb signals return to their reset value if nothing assigns them
         self.fragment.comb[0:0] = [s.eq(s.reset)
                                    for s in list_targets(self.fragment.comb)]
-        self.evaluator = Evaluator(self.fragment.clock_domains,
-                                   mta.replacements)
+        if backend == "interpreted":
+            self.evaluator = Evaluator(self.fragment.clock_domains,
+                                       mta.replacements)
+        elif backend == "compiled":
+            self.evaluator = CompiledEvaluator(self.fragment, mta.replacements)
+        else:
+            raise ValueError("Unknown simulator backend: '{}'".format(backend))
+
+        self._build_comb_groups()
+        for statements in self.fragment.sync.values():
+            self.evaluator.compile(statements)
 
         if vcd_name is None:
             self.vcd = DummyVCDWriter()
         else:
-            self.vcd = VCDWriter(vcd_name)
-
-            signals = list_signals(self.fragment)
-            for cd in self.fragment.clock_domains:
-                signals.add(cd.clk)
-                if cd.rst is not None:
-                    signals.add(cd.rst)
-            for memory_array in mta.replacements.values():
-                signals |= set(memory_array)
-            self.vcd.init(signals)
-            for signal in sorted(signals, key=lambda x: x.duid):
-                self.vcd.set(signal, signal.reset.value)
+            self.vcd = VCDWriter(vcd_name, resolution=self.time.resolution, **vcd_options)
+            self.vcd.init(list_simulation_signals(self.fragment, mta.replacements))
 
     def __enter__(self):
         return self
 
+    # Clocks ---------------------------------------------------------------------------------------
+
+    def set_enable(self, clock, enable):
+        """Enable/disable (gate) ``clock``, can be called before or during ``run``."""
+        if clock not in self.time.clocks:
+            raise ValueError("Unknown clock: '{}'".format(clock))
+        self.time.set_enable(clock, enable)
+
+    # Snapshot -------------------------------------------------------------------------------------
+
+    _state_version = 2
+
+    def save_state(self, filename):
+        """Save signal values (including memories) and clocks phases to ``filename``.
+
+        Signals are identified by their creation order, so the state can be restored in a
+        simulation of the same design built again (for example in another process). Generators
+        state is not saved.
+        """
+        signals = list_simulation_signals(self.fragment, self.replaced_memories)
+        state = {
+            "version" : self._state_version,
+            "widths"  : [value_bits_sign(signal) for signal in signals],
+            "values"  : [self.evaluator.eval(signal) for signal in signals],
+            "time"    : self.time.get_state(),
+        }
+        with gzip.open(filename, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore_state(self, filename):
+        """Restore a state saved by ``save_state``."""
+        with gzip.open(filename, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != self._state_version:
+            raise ValueError("Unsupported simulation state version: {}".format(state.get("version")))
+        signals = list_simulation_signals(self.fragment, self.replaced_memories)
+        if state["widths"] != [value_bits_sign(signal) for signal in signals]:
+            raise ValueError("Saved state does not match the simulated design")
+        for signal, value in zip(signals, state["values"]):
+            self.evaluator.assign(signal, value)
+        self.evaluator.commit()
+        self.time.set_state(state["time"])
+        self.vcd.set_time(self.time.time)
+        for signal, value in zip(signals, state["values"]):
+            self.vcd.set(signal, value)
+
     def __exit__(self, type, value, traceback):
         self.close()
 
     def close(self):
         self.vcd.close()
 
-    def _commit_and_comb_propagate(self):
-        # TODO: optimize
-        all_modified = set()
-        modified = self.evaluator.commit()
-        all_modified |= modified
-        while modified:
-            self.evaluator.execute(self.fragment.comb)
-            modified = self.evaluator.commit()
-            all_modified |= modified
-        for signal in all_modified:
-            self.vcd.set(signal, self.evaluator.signal_values[signal])
+    def _build_comb_groups(self):
+        # Statements driving the same signals are grouped and executed together.
+        groups  = group_by_targets(self.fragment.comb)
+        inputs  = [list_inputs(statements, self.fragment.clock_domains, self.evaluator.replaced_memories)
+            for targets, statements in groups]
+        drivers = dict()
+        for n, (targets, statements) in enumerate(groups):
+            for signal in targets:
+                drivers[signal] = n
+
+        # Sort groups topologically (drivers before readers), loops are broken in statement order.
+        successors = [set() for _ in groups]
+        indegree   = [0]*len(groups)
+        for n, group_inputs in enumerate(inputs):
+            for signal in group_inputs:
+                d = drivers.get(signal)
+                if d is not None and d != n and n not in successors[d]:
+                    successors[d].add(n)
+                    indegree[n] += 1
+        order = []
+        ready = [n for n in range(len(groups)) if not indegree[n]]
+        heapq.heapify(ready)
+        while len(order) < len(groups):
+            if not ready:
+                n = min(n for n in range(len(groups)) if indegree[n] > 0)
+                indegree[n] = 0
+                ready.append(n)
+            n = heapq.heappop(ready)
+            order.append(n)
+            for m in successors[n]:
+                if indegree[m] > 0:
+                    indegree[m] -= 1
+                    if not indegree[m]:
+                        heapq.heappush(ready, m)
+
+        # Groups are then identified by their rank in the topological order.
+        key = self.evaluator.signal_key
+        self.comb_groups      = []
+        self.comb_drivers     = dict()
+        self.comb_sensitivity = dict()
+        for rank, n in enumerate(order):
+            targets, statements = groups[n]
+            self.comb_groups.append(self.evaluator.compile(statements))
+            for signal in targets:
+                self.comb_drivers[key(signal)] = rank
+            for signal in inputs[n]:
+                self.comb_sensitivity.setdefault(key(signal), []).append(rank)
+
+    def _commit_and_comb_propagate(self, pending=()):
+        evaluator   = self.evaluator
+        groups      = self.comb_groups
+        sensitivity = self.comb_sensitivity
+
+        modified     = evaluator.commit()
+        all_modified = set(modified)
+
+        # Wake up groups reading the modified signals and re-drive comb signals assigned from
+        # outside of their group.
+        scheduled = set(pending)
+        for key in modified:
+            rank = self.comb_drivers.get(key)
+            if rank is not None:
+                scheduled.add(rank)
+            scheduled.update(sensitivity.get(key, ()))
+
+        # Execute scheduled groups in topological order until no signal changes.
+        pending = list(scheduled)
+        heapq.heapify(pending)
+        while pending:
+            rank = heapq.heappop(pending)
+            scheduled.discard(rank)
+            groups[rank]()
+            modified = evaluator.commit()
+            if modified:
+                all_modified |= modified
+                for key in modified:
+                    for rank in sensitivity.get(key, ()):
+                        if rank not in scheduled:
+                            scheduled.add(rank)
+                            heapq.heappush(pending, rank)
+
+        for signal, value in evaluator.modified_values(all_modified):
+            self.vcd.set(signal, value)
 
     def _evalexec_nested_lists(self, x):
         if isinstance(x, list):
@@ -379,8 +798,7 @@ class Simulator:
         return False
 
     def run(self):
-        self.evaluator.execute(self.fragment.comb)
-        self._commit_and_comb_propagate()
+        self._commit_and_comb_propagate(range(len(self.comb_groups)))
 
         while True:
             dt, rising, falling = self.time.tick()
@@ -0,0 +1,96 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import time
+import pickle
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from litex.gen.sim.core import run_simulation
+
+# Simulation Job -----------------------------------------------------------------------------------
+
+class SimulationJob:
+    """Simulation to run in a worker process.
+
+    Only the job itself is pickled, so ``factory``, ``generators`` and ``result`` must be picklable
+    (module-level functions or classes).
+
+    Parameters:
+        factory    (callable): Called with ``args``/``kwargs`` to build the module to simulate.
+        generators (callable): Called with the module, returns the generator(s) to simulate (same
+                               format as ``run_simulation``).
+        clocks         (dict): Simulation clocks.
+        args/kwargs          : Parameters of the factory.
+        result     (callable): Optional, called with the module after the simulation; its return
+                               value is the result of the job.
+        sim_kwargs           : Extra arguments passed to ``run_simulation`` (backend, vcd_name...).
+    """
+    def __init__(self, factory, generators, clocks={"sys": 10}, args=(), kwargs={}, result=None,
+        **sim_kwargs):
+        self.factory    = factory
+        self.generators = generators
+        self.clocks     = clocks
+        self.args       = args
+        self.kwargs     = kwargs
+        self.result     = result
+        self.sim_kwargs = sim_kwargs
+
+    def run(self):
+        dut = self.factory(*self.args, **self.kwargs)
+        run_simulation(dut, self.generators(dut), clocks=self.clocks, **self.sim_kwargs)
+        if self.result is not None:
+            return self.result(dut)
+        return None
+
+# Simulation Result --------------------------------------------------------------------------------
+
+class SimulationResult(namedtuple("SimulationResult", "job result exception traceback duration")):
+    """Result of a ``SimulationJob``: returned ``result`` or raised ``exception`` (with formatted
+    ``traceback``) and ``duration`` of the job (in seconds)."""
+    def check(self):
+        if self.exception is not None:
+            raise RuntimeError("Simulation failed:\n" + self.traceback) from self.exception
+        return self.result
+
+
+def _run_job(job):
+    start = time.perf_counter()
+    try:
+        result = job.run()
+        return result, None, None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, traceback.format_exc(), time.perf_counter() - start
+
+def _run_job_worker(job):
+    # Outcomes are pickled back to the parent process: replace unpicklable results/exceptions, that
+    # would otherwise make the results of all the jobs lost.
+    result, exception, tb, duration = _run_job(job)
+    try:
+        pickle.loads(pickle.dumps((result, exception)))
+    except Exception as e:
+        if exception is None:
+            tb = "Unpicklable simulation result: {!r}\n".format(e)
+        exception = RuntimeError("{!r} (unpicklable)".format(exception if exception is not None else result))
+        result    = None
+    return result, exception, tb, duration
+
+# Run Simulations ----------------------------------------------------------------------------------
+
+def run_simulations(jobs, max_workers=None):
+    """Run ``SimulationJob`` s over a process pool.
+
+    Returns a list of ``SimulationResult`` in the order of ``jobs``; exceptions raised by a job are
+    captured in its result (replaced by a ``RuntimeError`` with their ``repr`` when they can not be
+    pickled back from the worker). ``max_workers=1`` runs the jobs in the current process.
+    """
+    jobs = list(jobs)
+    if max_workers == 1:
+        outcomes = [_run_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(_run_job_worker, jobs))
+    return [SimulationResult(job, *outcome) for job, outcome in zip(jobs, outcomes)]
@@ -6,11 +6,15 @@
 # This file is Copyright (c) 2018 Florent Kermarrec <florent@enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
-from itertools import count
-import tempfile
 import os
-from collections import OrderedDict
+import io
+import gzip
 import shutil
+import tempfile
+import subprocess
+from fnmatch import fnmatchcase
+from itertools import count
+from fractions import Fraction
 
 from litex.gen.fhdl.namer import build_signal_namespace
 
@@ -25,89 +29,172 @@ def vcd_codes():
         yield code
 
 
+def vcd_timescale(resolution):
+    """Return the VCD ``$timescale`` of a time resolution (in ns, the simulation time unit)."""
+    fs = Fraction(str(resolution) if isinstance(resolution, float) else resolution)*10**6
+    for unit, scale in [("s", 10**15), ("ms", 10**12), ("us", 10**9), ("ns", 10**6), ("ps", 10**3), ("fs", 1)]:
+        for n in [100, 10, 1]:
+            if fs == n*scale:
+                return "{}{}".format(n, unit)
+    raise ValueError("Time resolution {} not supported by VCD (1/10/100 s/ms/us/ns/ps/fs).".format(resolution))
+
+
+def _patterns(patterns):
+    if patterns is None:
+        return []
+    if isinstance(patterns, str):
+        return [patterns]
+    return list(patterns)
+
+
 class VCDWriter:
-    def __init__(self, filename):
-        self.filename = filename
-        self.out_file = None
-        self.buffer_file = tempfile.TemporaryFile(
-            dir=os.path.dirname(filename), mode="w+")
-        self.initialized = False
-        self.codegen = vcd_codes()
-        self.codes = OrderedDict()
+    """Streaming VCD writer.
+
+    All signals are declared once by ``init``; value changes are then written (through the file
+    buffer) with a single timestamp per simulated time step that has changes. Times are in ns,
+    dumped as multiples of ``resolution`` (``$timescale``).
+
+    Parameters:
+        filename    (str): Output file; ``.gz`` compresses the VCD, ``.fst`` converts it to FST
+                           with ``vcd2fst`` (GTKWave) on close.
+        include    (list): Glob patterns on signal names to dump (default: all signals).
+        exclude    (list): Glob patterns on signal names to skip.
+        start       (int): Dump start time.
+        stop        (int): Dump stop time (default: end of simulation).
+        buffer_size (int): Write buffer size in bytes.
+        resolution  (int): Time resolution (in ns), timestamps are dumped as multiples of it.
+    """
+    def __init__(self, filename, include=None, exclude=None, start=0, stop=None, buffer_size=2**20,
+        resolution=1):
+        self.filename    = filename
+        self.include     = _patterns(include)
+        self.exclude     = _patterns(exclude)
+        self.start       = start
+        self.stop        = stop
+        self.buffer_size = buffer_size
+        self.resolution  = resolution
+        self.timescale   = vcd_timescale(resolution)
+        self.codes         = dict()
         self.signal_values = dict()
-        self.t = 0
-
-    def _write_value(self, signal, value):
-        l = len(signal)
+        self.t             = 0
+        self.t_written     = None
+        self.dumping       = False
+        self.stopped       = False
+        self.out_file      = None
+
+        self.fst_filename = None
+        if filename.endswith(".fst"):
+            if shutil.which("vcd2fst") is None:
+                raise OSError("Unable to find vcd2fst (from GTKWave), required for FST dumps.")
+            self.fst_filename = filename
+            fd, self.filename = tempfile.mkstemp(suffix=".vcd", dir=os.path.dirname(filename) or None)
+            os.close(fd)
+
+    def _open(self):
+        if self.filename.endswith(".gz"):
+            f = gzip.GzipFile(self.filename, "wb", compresslevel=1)
+            return io.TextIOWrapper(io.BufferedWriter(f, buffer_size=self.buffer_size))
+        return open(self.filename, "w", buffering=self.buffer_size)
+
+    def _selected(self, name):
+        if self.include and not any(fnmatchcase(name, p) for p in self.include):
+            return False
+        return not any(fnmatchcase(name, p) for p in self.exclude)
+
+    def _format_value(self, value, code, nbits):
         if value < 0:
-            value += 2**l
-        if l > 1:
-            fmtstr = "b{:0" + str(l) + "b} {}\n"
-        else:
-            fmtstr = "{}{}\n"
-        try:
-            code = self.codes[signal]
-        except KeyError:
-            code = next(self.codegen)
-            self.codes[signal] = code
-            self.init(self.codes.keys())
-
-        return fmtstr.format(value, code)
+            value += 2**nbits
+        if nbits > 1:
+            return "b{:b} {}\n".format(value, code)
+        return "{}{}\n".format(value, code)
+
+    def _timestamp(self, t):
+        # Simulation times are multiples of the resolution (see TimeManager), only user times
+        # (stop) may be rounded.
+        if self.resolution != 1:
+            t = t/self.resolution
+        return "#{}\n".format(round(t))
 
     def _write(self, s):
         self.out_file.write(s)
-        self.buffer_file.write(s)
+
+    def _dump_all(self):
+        self._write(self._timestamp(self.t) + "$dumpvars\n")
+        for signal, (code, nbits) in self.codes.items():
+            self._write(self._format_value(self.signal_values[signal], code, nbits))
+        self._write("$end\n")
+        self.t_written = self.t
+        self.dumping   = True
+
+    def _update_window(self):
+        if self.dumping:
+            if self.stop is not None and self.t >= self.stop:
+                self._write(self._timestamp(self.stop))
+                self.dumping = False
+                self.stopped = True
+        elif not self.stopped and self.t >= self.start:
+            if self.stop is not None and self.t >= self.stop:
+                # Window skipped (time moved past it).
+                self.stopped = True
+            else:
+                self._dump_all()
 
     def init(self, signals):
-        self.out_file = open(self.filename, "w")
-
-        # generate codes
-        for signal in signals:
-            try:
-                code = self.codes[signal]
-            except KeyError:
-                code = next(self.codegen)
-                self.codes[signal] = code
-
-        # write vcd header
-        header = ""
-        ns = build_signal_namespace(self.codes.keys())
-        for signal, code in self.codes.items():
+        self.out_file = self._open()
+
+        # Generate codes for the selected signals.
+        ns = build_signal_namespace(signals)
+        codegen = vcd_codes()
+        header  = "$timescale {} $end\n".format(self.timescale)
+        for signal in sorted(signals, key=lambda x: x.duid):
             name = ns.get_name(signal)
-            header += "$var wire {len} {code} {name} $end\n".format(name=name, code=code, len=len(signal))
-        header += "$dumpvars\n"
-        for signal in self.codes.keys():
-            header += self._write_value(signal, signal.reset.value)
-        header += "$end\n"
+            if not self._selected(name):
+                continue
+            code  = next(codegen)
+            nbits = len(signal)
+            self.codes[signal] = (code, nbits)
+            self.signal_values[signal] = signal.reset.value
+            header += "$var wire {len} {code} {name} $end\n".format(name=name, code=code, len=nbits)
+        header += "$enddefinitions $end\n"
         self.out_file.write(header)
-
-        if self.initialized:
-            self.buffer_file.seek(0)
-            shutil.copyfileobj(self.buffer_file, self.out_file)
-            self.buffer_file.seek(0, 2)
-        else:
-            # init time
-            self._write("#0\n")
-
-        self.initialized = True
+        self._update_window()
 
     def set(self, signal, value):
-        if (signal not in self.signal_values
-                or self.signal_values[signal] != value):
-            self._write(self._write_value(signal, value))
+        try:
+            code, nbits = self.codes[signal]
+        except KeyError:
+            # Signal not declared or filtered out.
+            return
+        if self.signal_values[signal] != value:
             self.signal_values[signal] = value
+            if self.dumping:
+                if self.t_written != self.t:
+                    self._write(self._timestamp(self.t))
+                    self.t_written = self.t
+                self._write(self._format_value(value, code, nbits))
 
     def delay(self, delay):
         self.t += delay
-        self._write("#{}\n".format(self.t))
+        self._update_window()
+
+    def set_time(self, t):
+        """Move to time ``t`` (restored simulation state) and update the dump window."""
+        self.t = t
+        self._update_window()
 
     def close(self):
-        self.out_file.close()
-        self.buffer_file.close()
+        if self.out_file is not None:
+            if self.dumping and self.t_written != self.t:
+                self._write(self._timestamp(self.t))
+            self.out_file.close()
+            self.out_file = None
+            if self.fst_filename is not None:
+                subprocess.check_call(["vcd2fst", self.filename, self.fst_filename])
+                os.remove(self.filename)
 
 
 class DummyVCDWriter:
-    def init(self):
+    def init(self, signals):
         pass
 
     def set(self, signal, value):
@@ -116,5 +203,8 @@ class DummyVCDWriter:
     def delay(self, delay):
         pass
 
+    def set_time(self, t):
+        pass
+
     def close(self):
         pass
@@ -12,6 +12,7 @@ from litex.gen import *
 from litex.gen.common import reverse_bytes
 
 from litex.soc.interconnect.csr import *
+from litex.soc.interconnect.csr_eventmanager import *
 from litex.soc.interconnect import stream
 from litex.soc.interconnect import wishbone
 
@@ -246,3 +247,622 @@ class WishboneDMAWriter(LiteXModule):
             self._done.status.eq(self.done),
             self._offset.status.eq(self.offset),
         ]
+
+# DMA Descriptors ----------------------------------------------------------------------------------
+
+DMA_DESCRIPTOR_LAST = 0b001 # Last buffer of a packet/frame.
+DMA_DESCRIPTOR_END  = 0b010 # Last descriptor of the list.
+DMA_DESCRIPTOR_IRQ  = 0b100 # Interrupt on completion (bypassing coalescing, DMA Ring).
+
+DMA_STATUS_DONE        = 1 << 31       # Descriptor completed.
+DMA_STATUS_LAST        = 1 << 30       # Buffer ends a packet/frame.
+DMA_STATUS_LENGTH_MASK = (1 << 30) - 1 # Transferred length (bytes).
+
+# Descriptors are stored little-endian in memory and should be aligned on their size.
+dma_descriptor_layout = [
+    ("address",  64), # Buffer address (bytes).
+    ("next",     64), # Next descriptor address (bytes).
+    ("length",   32), # Buffer length (bytes, multiple of the bus word size).
+    ("control",  32), # DMA_DESCRIPTOR_XXX flags.
+    ("status",   32), # DMA_STATUS_XXX flags/length written back (DMA Ring).
+    ("reserved", 32),
+]
+dma_descriptor_size = sum(width for _, width in dma_descriptor_layout)//8
+
+def _layout_offset(layout, name):
+    # Bit offset of field name in layout.
+    offset = 0
+    for field, width in layout:
+        if field == name:
+            return offset
+        offset += width
+    raise ValueError(f"Field {name} not in layout.")
+
+# Wishbone Burst Engine ----------------------------------------------------------------------------
+
+class _WishboneBurstEngine(LiteXModule):
+    """Split commands (address/length in words) in incrementing Wishbone bursts.
+
+    Bursts are up to ``burst_length`` words and aligned on ``burst_length``. A burst only starts when
+    ``allow`` is set for its ``size`` and then keeps ``stb`` asserted until its last word, ``stop``
+    ends the command on the current word.
+    """
+    def __init__(self, bus, burst_length=16):
+        assert burst_length in [2**n for n in range(9)]
+        self.sink   = sink = stream.Endpoint([("address", bus.adr_width), ("length", bus.adr_width)])
+        self.allow  = Signal()                         # i: Burst of size words can start.
+        self.stop   = Signal()                         # i: End command on current word.
+        self.size   = Signal(max=burst_length + 1)     # o: Size of the next burst.
+        self.start  = Signal()                         # o: Burst start.
+        self.ack    = Signal()                         # o: Current word acked.
+        self.last   = Signal()                         # o: Current word is the last of a last command.
+        self.idle   = Signal()                         # o: No command in progress.
+        self.offset = Signal(bus.adr_width)            # o: Acked words of the current command.
+
+        # # #
+
+        active    = Signal()
+        address   = Signal(bus.adr_width)
+        remaining = Signal(bus.adr_width)
+        last      = Signal()
+        beats     = Signal(max=burst_length + 1)
+        beat_last = Signal()
+
+        # Size of the next burst (limited to the next burst_length boundary).
+        boundary = Signal(max=burst_length + 1)
+        if burst_length > 1:
+            self.comb += boundary.eq(burst_length - address[:log2_int(burst_length)])
+        else:
+            self.comb += boundary.eq(1)
+        self.comb += If(remaining < boundary,
+            self.size.eq(remaining)
+        ).Else(
+            self.size.eq(boundary)
+        )
+
+        # Bus.
+        self.comb += [
+            self.start.eq(active & (beats == 0) & self.allow),
+            beat_last.eq(Mux(beats == 0, self.size == 1, beats == 1) | self.stop),
+            bus.cyc.eq(self.start | (beats != 0)),
+            bus.stb.eq(self.start | (beats != 0)),
+            bus.adr.eq(address),
+            bus.sel.eq(2**(bus.data_width//8)-1),
+            bus.cti.eq(Mux(beat_last, wishbone.CTI_BURST_END, wishbone.CTI_BURST_INCREMENTING)),
+            bus.bte.eq(0b00),
+            self.ack.eq(bus.stb & bus.ack),
+            self.last.eq(last & (remaining == 1)),
+            self.idle.eq(~active),
+            sink.ready.eq(~active),
+        ]
+
+        # Command/Burst tracking.
+        self.sync += [
+            If(sink.valid & sink.ready,
+                active.eq(sink.length != 0),
+                address.eq(sink.address),
+                remaining.eq(sink.length),
+                last.eq(sink.last),
+                self.offset.eq(0),
+            ),
+            If(self.start & ~self.ack,
+                beats.eq(self.size)
+            ),
+            If(self.ack,
+                address.eq(address + 1),
+                remaining.eq(remaining - 1),
+                self.offset.eq(self.offset + 1),
+                beats.eq(Mux(beats == 0, self.size, beats) - 1),
+                If((remaining == 1) | self.stop,
+                    active.eq(0),
+                    beats.eq(0),
+                )
+            )
+        ]
+
+# WishboneDMADescriptorFetcher ---------------------------------------------------------------------
+
+class WishboneDMADescriptorFetcher(LiteXModule):
+    """Fetch a list of DMA descriptors from Wishbone MMAP memory.
+
+    While ``enable`` is set, follows the list starting at ``address`` (bytes) and generates a command
+    for each descriptor on ``source`` (``address``/``length`` in words, ``last`` from the descriptor
+    control). The next descriptor is fetched while the command is executed, ``done`` is set after
+    the descriptor with ``DMA_DESCRIPTOR_END``.
+    """
+    def __init__(self, bus):
+        assert isinstance(bus, wishbone.Interface)
+        self.enable     = Signal()
+        self.address    = Signal(64)
+        self.done       = Signal()
+        self.descriptor = descriptor = Record(dma_descriptor_layout)
+        self.source     = source     = stream.Endpoint([("address", bus.adr_width), ("length", bus.adr_width)])
+
+        # # #
+
+        shift = log2_int(bus.data_width//8)
+        words = max(1, len(descriptor)//bus.data_width)
+
+        # Descriptor reads.
+        self.engine = engine = _WishboneBurstEngine(bus, burst_length=words)
+        index = Signal(max=max(2, words))
+        data  = Array(descriptor.raw_bits()[i*bus.data_width:(i + 1)*bus.data_width] for i in range(words))
+        self.comb += [
+            bus.we.eq(0),
+            engine.allow.eq(1),
+        ]
+        self.sync += If(engine.ack,
+            data[index].eq(bus.dat_r),
+            index.eq(index + 1),
+        )
+
+        # FSM.
+        self.fsm = fsm = ResetInserter()(FSM(reset_state="IDLE"))
+        self.comb += fsm.reset.eq(~self.enable)
+        fsm.act("IDLE",
+            NextValue(engine.sink.address, self.address[shift:]),
+            NextState("FETCH"),
+        )
+        fsm.act("FETCH",
+            engine.sink.valid.eq(1),
+            engine.sink.length.eq(words),
+            engine.sink.last.eq(1),
+            NextValue(index, 0),
+            If(engine.sink.ready,
+                NextState("WAIT")
+            )
+        )
+        fsm.act("WAIT",
+            If(engine.ack & engine.last,
+                NextState("COMMAND")
+            )
+        )
+        fsm.act("COMMAND",
+            source.valid.eq(1),
+            source.address.eq(descriptor.address[shift:]),
+            source.length.eq(descriptor.length[shift:]),
+            source.last.eq((descriptor.control & DMA_DESCRIPTOR_LAST) != 0),
+            If(source.ready,
+                NextValue(engine.sink.address, descriptor.next[shift:]),
+                If((descriptor.control & DMA_DESCRIPTOR_END) != 0,
+                    NextState("DONE")
+                ).Else(
+                    NextState("FETCH")
+                )
+            )
+        )
+        fsm.act("DONE", self.done.eq(1))
+
+# Wishbone Burst DMA Control -----------------------------------------------------------------------
+
+class _WishboneDMABurstCtrl:
+    def add_ctrl(self, default_base=0, default_length=0, default_enable=0, default_loop=0):
+        self.enable = Signal(reset=default_enable)
+        self.done   = Signal()
+        self.offset = Signal(32)
+
+        # # #
+
+        shift = log2_int(self.bus.data_width//8)
+        self.comb += self.offset.eq(self.engine.offset)
+
+        # Scatter-Gather: Commands from the descriptors list.
+        if self.with_sg:
+            self.descriptor = Signal(64, reset=default_base)
+            self.comb += [
+                self.sg.enable.eq(self.enable),
+                self.sg.address.eq(self.descriptor),
+                self.done.eq(self.sg.done & self.engine.idle),
+            ]
+            return
+
+        # Base/Length: Single command (repeated in loop mode).
+        self.base   = Signal(64, reset=default_base)
+        self.length = Signal(32, reset=default_length)
+        self.loop   = Signal(reset=default_loop)
+
+        self.fsm = fsm = ResetInserter()(FSM(reset_state="IDLE"))
+        self.comb += fsm.reset.eq(~self.enable)
+        fsm.act("IDLE",
+            NextState("RUN"),
+        )
+        fsm.act("RUN",
+            self.engine.sink.valid.eq(1),
+            self.engine.sink.last.eq(1),
+            self.engine.sink.address.eq(self.base[shift:]),
+            self.engine.sink.length.eq(self.length[shift:]),
+            If(self.engine.sink.ready,
+                NextState("WAIT")
+            )
+        )
+        fsm.act("WAIT",
+            If(self.engine.idle,
+                If(self.loop,
+                    NextState("RUN")
+                ).Else(
+                    NextState("DONE")
+                )
+            )
+        )
+        fsm.act("DONE", self.done.eq(1))
+
+    def add_csr(self, default_base=0, default_length=0, default_enable=0, default_loop=0):
+        if not hasattr(self, "enable"):
+            self.add_ctrl()
+        self._enable = CSRStorage(reset=default_enable)
+        self._done   = CSRStatus()
+        self._offset = CSRStatus(32)
+
+        # # #
+
+        self.comb += [
+            # Control.
+            self.enable.eq(self._enable.storage),
+            # Status.
+            self._done.status.eq(self.done),
+            self._offset.status.eq(self.offset),
+        ]
+
+        # Scatter-Gather.
+        if self.with_sg:
+            self._descriptor = CSRStorage(64, reset=default_base)
+            self.comb += self.descriptor.eq(self._descriptor.storage)
+        # Base/Length.
+        else:
+            self._base   = CSRStorage(64, reset=default_base)
+            self._length = CSRStorage(32, reset=default_length)
+            self._loop   = CSRStorage(reset=default_loop)
+            self.comb += [
+                self.base.eq(self._base.storage),
+                self.length.eq(self._length.storage),
+                self.loop.eq(self._loop.storage),
+            ]
+
+    def add_sg(self, bus):
+        # Share the bus between the data bursts and the descriptors reads.
+        data_bus = wishbone.Interface.like(bus)
+        desc_bus = wishbone.Interface.like(bus)
+        self.arbiter = wishbone.Arbiter([data_bus, desc_bus], bus)
+        self.sg      = WishboneDMADescriptorFetcher(desc_bus)
+        return data_bus
+
+# WishboneDMABurstReader ---------------------------------------------------------------------------
+
+class WishboneDMABurstReader(_WishboneDMABurstCtrl, LiteXModule):
+    """Read data from Wishbone MMAP memory with incrementing bursts.
+
+    Commands (``address``/``length`` in words) written to the sink are split in incrementing bursts of
+    up to ``burst_length`` words. A burst only starts when the FIFO has credits for all its words, so
+    ``stb`` is never deasserted during a burst. With ``with_sg``, commands are generated from a list
+    of descriptors fetched from memory (see ``WishboneDMADescriptorFetcher``).
+
+    Parameters
+    ----------
+    bus : bus
+        Wishbone bus of the SoC to read from.
+
+    Attributes
+    ----------
+    sink : Record("address", "length")
+        Sink for MMAP areas to be read (``last`` is set on the last word of the area).
+
+    source : Record("data")
+        Source for MMAP word results from reading.
+    """
+    def __init__(self, bus, endianness="little", fifo_depth=64, burst_length=16, with_csr=False, with_sg=False):
+        assert isinstance(bus, wishbone.Interface)
+        assert fifo_depth >= burst_length
+        self.bus     = bus
+        self.with_sg = with_sg
+        self.source  = source = stream.Endpoint([("data", bus.data_width)])
+
+        # # #
+
+        # Scatter-Gather.
+        if with_sg:
+            bus = self.add_sg(bus)
+
+        # Bursts.
+        self.engine = engine = _WishboneBurstEngine(bus, burst_length)
+        self.sink   = engine.sink
+        if with_sg:
+            self.comb += self.sg.source.connect(engine.sink)
+
+        # FIFO/Credits.
+        self.fifo = fifo = stream.SyncFIFO([("data", bus.data_width)], depth=fifo_depth)
+        credits = Signal(max=fifo_depth + 1, reset=fifo_depth)
+        self.comb += engine.allow.eq(credits >= engine.size)
+        self.sync += credits.eq(credits
+            - Mux(engine.start, engine.size, 0)
+            + (fifo.source.valid & fifo.source.ready)
+        )
+
+        # Reads -> FIFO.
+        self.comb += [
+            bus.we.eq(0),
+            fifo.sink.valid.eq(engine.ack),
+            fifo.sink.last.eq(engine.last),
+            fifo.sink.data.eq(format_bytes(bus.dat_r, endianness)),
+        ]
+
+        # FIFO -> Output.
+        self.comb += fifo.source.connect(source)
+
+        # CSRs.
+        if with_csr:
+            self.add_csr()
+
+# WishboneDMABurstWriter ---------------------------------------------------------------------------
+
+class WishboneDMABurstWriter(_WishboneDMABurstCtrl, LiteXModule):
+    """Write data to Wishbone MMAP memory with incrementing bursts.
+
+    Commands (``address``/``length`` in words) written to ``cmd`` are split in incrementing bursts of
+    up to ``burst_length`` words. A burst only starts when the FIFO holds all its words (or the
+    ``last`` word of a packet, that ends the command), so ``stb`` is never deasserted during a burst.
+    With ``with_sg``, commands are generated from a list of descriptors fetched from memory (see
+    ``WishboneDMADescriptorFetcher``), a packet then ends its descriptor.
+
+    Parameters
+    ----------
+    bus : bus
+        Wishbone bus of the SoC to write to.
+
+    Attributes
+    ----------
+    cmd : Record("address", "length")
+        Sink for MMAP areas to be written.
+
+    sink : Record("data")
+        Sink for MMAP words to be written.
+    """
+    def __init__(self, bus, endianness="little", fifo_depth=64, burst_length=16, with_csr=False, with_sg=False):
+        assert isinstance(bus, wishbone.Interface)
+        assert fifo_depth >= burst_length
+        self.bus     = bus
+        self.with_sg = with_sg
+        self.sink    = sink = stream.Endpoint([("data", bus.data_width)])
+
+        # # #
+
+        # Scatter-Gather.
+        if with_sg:
+            bus = self.add_sg(bus)
+
+        # Bursts.
+        self.engine = engine = _WishboneBurstEngine(bus, burst_length)
+        self.cmd    = engine.sink
+        if with_sg:
+            self.comb += self.sg.source.connect(engine.sink)
+
+        # Input -> FIFO.
+        self.fifo = fifo = stream.SyncFIFO([("data", bus.data_width)], depth=fifo_depth)
+        self.comb += sink.connect(fifo.sink)
+
+        # Count packets ends in the FIFO.
+        lasts = Signal(max=fifo_depth + 1)
+        self.sync += lasts.eq(lasts
+            + (fifo.sink.valid   & fifo.sink.ready   & fifo.sink.last)
+            - (fifo.source.valid & fifo.source.ready & fifo.source.last)
+        )
+
+        # FIFO -> Writes.
+        self.comb += [
+            engine.allow.eq((fifo.level >= engine.size) | (lasts != 0)),
+            engine.stop.eq(fifo.source.valid & fifo.source.last),
+            bus.we.eq(1),
+            bus.dat_w.eq(format_bytes(fifo.source.data, endianness)),
+            fifo.source.ready.eq(engine.ack),
+        ]
+
+        # CSRs.
+        if with_csr:
+            self.add_csr()
+
+# WishboneDMARing ----------------------------------------------------------------------------------
+
+class WishboneDMARing(LiteXModule):
+    """Descriptor ring DMA between Wishbone MMAP memory and a stream.
+
+    Software posts descriptors (``dma_descriptor_layout``, ``next`` is unused) in a ring of ``size``
+    descriptors at ``base`` and advances the ``tail`` index. The DMA processes descriptors from ``head``
+    to ``tail``:
+
+    - reader: memory -> ``source``, ``last`` is set at the end of buffers with ``DMA_DESCRIPTOR_LAST``.
+    - writer: ``sink`` -> memory, a packet (``last``) ends its buffer and sets ``DMA_STATUS_LAST``.
+
+    Once a buffer is transferred, its status (``DMA_STATUS_DONE``, flags and length in bytes) is
+    written back to the descriptor and ``head`` is advanced. Completion interrupts are coalesced:
+    ``irq`` pulses after ``irq_count`` completions, after ``irq_timeout`` cycles with pending
+    completions, or on descriptors with ``DMA_DESCRIPTOR_IRQ``.
+    """
+    def __init__(self, bus, mode="reader", endianness="little", fifo_depth=64, burst_length=16, with_csr=True):
+        assert isinstance(bus, wishbone.Interface)
+        assert mode in ["reader", "writer"]
+        assert bus.data_width <= len(Record(dma_descriptor_layout))
+        self.bus         = bus
+        self.enable      = Signal()
+        self.base        = Signal(64)
+        self.size        = Signal(16)
+        self.tail        = Signal(16)
+        self.head        = Signal(16)
+        self.irq_count   = Signal(16, reset=1)
+        self.irq_timeout = Signal(32)
+        self.irq         = Signal()
+
+        # # #
+
+        shift = log2_int(bus.data_width//8)
+        words = len(Record(dma_descriptor_layout))//bus.data_width
+
+        # Buses: Data bursts and Descriptors reads/status write-backs.
+        data_bus = wishbone.Interface.like(bus)
+        desc_bus = wishbone.Interface.like(bus)
+        self.arbiter = wishbone.Arbiter([data_bus, desc_bus], bus)
+
+        # Data.
+        if mode == "reader":
+            self.dma = dma = WishboneDMABurstReader(data_bus, endianness, fifo_depth, burst_length)
+            self.source = dma.source
+            dma_cmd     = dma.sink
+        else:
+            self.dma = dma = WishboneDMABurstWriter(data_bus, endianness, fifo_depth, burst_length)
+            self.sink   = dma.sink
+            dma_cmd     = dma.cmd
+
+        # Descriptors.
+        self.engine = engine = _WishboneBurstEngine(desc_bus, burst_length=words)
+        descriptor  = Record(dma_descriptor_layout)
+        writeback   = Record(dma_descriptor_layout)
+        index       = Signal(max=max(2, words))
+        status_word = _layout_offset(dma_descriptor_layout, "status")//bus.data_width
+        self.sync += If(engine.ack & ~desc_bus.we,
+            Array(descriptor.raw_bits()[i*bus.data_width:(i + 1)*bus.data_width] for i in range(words))[index].eq(desc_bus.dat_r),
+            index.eq(index + 1),
+        )
+        self.comb += [
+            engine.allow.eq(1),
+            writeback.eq(descriptor),
+            desc_bus.dat_w.eq(writeback.raw_bits()[status_word*bus.data_width:(status_word + 1)*bus.data_width]),
+        ]
+
+        # Status.
+        last = Signal()
+        if mode == "reader":
+            self.comb += last.eq((descriptor.control & DMA_DESCRIPTOR_LAST) != 0)
+        else:
+            self.sync += [
+                If(dma_cmd.valid & dma_cmd.ready,
+                    last.eq(0)
+                ),
+                If(dma.engine.ack & dma.engine.stop,
+                    last.eq(1)
+                )
+            ]
+        self.comb += writeback.status.eq(DMA_STATUS_DONE | (last << 30) | (dma.engine.offset << shift)[:30])
+
+        # FSM.
+        head     = Signal(16)
+        complete = Signal()
+        self.comb += self.head.eq(head)
+        self.fsm = fsm = ResetInserter()(FSM(reset_state="IDLE"))
+        self.comb += fsm.reset.eq(~self.enable)
+        fsm.act("IDLE",
+            NextValue(head, 0),
+            NextState("CHECK"),
+        )
+        fsm.act("CHECK",
+            NextValue(index, 0),
+            If(head != self.tail,
+                NextState("FETCH")
+            )
+        )
+        fsm.act("FETCH",
+            engine.sink.valid.eq(1),
+            engine.sink.address.eq(self.base[shift:] + head*words),
+            engine.sink.length.eq(words),
+            engine.sink.last.eq(1),
+            If(engine.sink.ready,
+                NextState("FETCH-WAIT")
+            )
+        )
+        fsm.act("FETCH-WAIT",
+            If(engine.ack & engine.last,
+                NextState("TRANSFER")
+            )
+        )
+        fsm.act("TRANSFER",
+            dma_cmd.valid.eq(1),
+            dma_cmd.address.eq(descriptor.address[shift:]),
+            dma_cmd.length.eq(descriptor.length[shift:]),
+            dma_cmd.last.eq((descriptor.control & DMA_DESCRIPTOR_LAST) != 0),
+            If(dma_cmd.ready,
+                NextState("TRANSFER-WAIT")
+            )
+        )
+        fsm.act("TRANSFER-WAIT",
+            If(dma.engine.idle,
+                NextState("WRITEBACK")
+            )
+        )
+        fsm.act("WRITEBACK",
+            desc_bus.we.eq(1),
+            engine.sink.valid.eq(1),
+            engine.sink.address.eq(self.base[shift:] + head*words + status_word),
+            engine.sink.length.eq(1),
+            engine.sink.last.eq(1),
+            If(engine.sink.ready,
+                NextState("WRITEBACK-WAIT")
+            )
+        )
+        fsm.act("WRITEBACK-WAIT",
+            desc_bus.we.eq(1),
+            If(engine.ack,
+                complete.eq(1),
+                If(head == (self.size - 1),
+                    NextValue(head, 0)
+                ).Else(
+                    NextValue(head, head + 1)
+                ),
+                NextState("CHECK")
+            )
+        )
+
+        # IRQ Coalescing.
+        pending = Signal(16)
+        timer   = Signal(32)
+        timeout = Signal()
+        self.comb += [
+            timeout.eq((self.irq_timeout != 0) & (pending != 0) & (timer >= self.irq_timeout)),
+            self.irq.eq(timeout | (complete & (
+                ((descriptor.control & DMA_DESCRIPTOR_IRQ) != 0) |
+                ((pending + 1) >= self.irq_count)
+            ))),
+        ]
+        self.sync += [
+            If(self.irq,
+                pending.eq(0),
+                timer.eq(0),
+            ).Else(
+                If(complete,
+                    pending.eq(pending + 1)
+                ),
+                If(pending != 0,
+                    timer.eq(timer + 1)
+                )
+            )
+        ]
+
+        # CSRs.
+        if with_csr:
+            self.add_csr()
+
+    def add_csr(self):
+        self._base        = CSRStorage(64, description="Ring base address (bytes).")
+        self._size        = CSRStorage(16, description="Ring size (descriptors).")
+        self._enable      = CSRStorage(description="Enable (Ring is restarted from index 0 on enable).")
+        self._tail        = CSRStorage(16, description="Ring tail index (next descriptor to be posted by software).")
+        self._head        = CSRStatus(16,  description="Ring head index (next descriptor to be processed by the DMA).")
+        self._irq_count   = CSRStorage(16, reset=1, description="IRQ coalescing: Completions per IRQ.")
+        self._irq_timeout = CSRStorage(32, description="IRQ coalescing: Timeout (cycles) with pending completions (0: disabled).")
+        self._dma_descriptors = CSRConstant(dma_descriptor_size, name="dma_descriptors")
+
+        self.ev = EventManager()
+        self.ev.done = EventSourcePulse(description="Descriptor(s) completed.")
+        self.ev.finalize()
+
+        # # #
+
+        self.comb += [
+            # Control.
+            self.base.eq(self._base.storage),
+            self.size.eq(self._size.storage),
+            self.enable.eq(self._enable.storage),
+            self.tail.eq(self._tail.storage),
+            self.irq_count.eq(self._irq_count.storage),
+            self.irq_timeout.eq(self._irq_timeout.storage),
+            # Status.
+            self._head.status.eq(self.head),
+            # IRQ.
+            self.ev.done.trigger.eq(self.irq),
+        ]
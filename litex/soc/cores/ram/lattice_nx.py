@@ -103,7 +103,7 @@ class NXLRAM(LiteXModule):
 
         self.sync += self.bus.ack.eq(self.bus.stb & self.bus.cyc & ~self.bus.ack)
 
-        if init != []:
+        if len(init) != 0:
             self.add_init(init)
 
     def add_init(self, data):
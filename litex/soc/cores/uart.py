@@ -431,19 +431,39 @@ class Stream2Wishbone(LiteXModule):
 
 
 class UARTBone(Stream2Wishbone):
-    def __init__(self, phy, clk_freq, cd="sys", address_width=32):
-        if cd == "sys":
+    """UART Wishbone bridge.
+
+    An optional RX FIFO (``rx_fifo_depth``) buffers the commands received while UARTBone is busy
+    (ex sending read data), allowing the host to pipeline commands (see CommUART).
+    """
+    def __init__(self, phy, clk_freq, cd="sys", address_width=32, rx_fifo_depth=0):
+        if cd == "sys" and rx_fifo_depth == 0:
             self.phy = phy
             Stream2Wishbone.__init__(self, self.phy, clk_freq=clk_freq, address_width=address_width)
         else:
-            self.phy = ClockDomainsRenamer(cd)(phy)
-            self.tx_cdc = stream.ClockDomainCrossing([("data", 8)], cd_from="sys", cd_to=cd)
-            self.rx_cdc = stream.ClockDomainCrossing([("data", 8)], cd_from=cd,    cd_to="sys")
-            self.comb += self.phy.source.connect(self.rx_cdc.sink)
-            self.comb += self.tx_cdc.source.connect(self.phy.sink)
             Stream2Wishbone.__init__(self, clk_freq=clk_freq, address_width=address_width)
-            self.comb += self.rx_cdc.source.connect(self.sink)
-            self.comb += self.source.connect(self.tx_cdc.sink)
+            rx = self.sink
+            tx = self.source
+
+            # RX FIFO (Optional).
+            if rx_fifo_depth:
+                self.rx_fifo = stream.SyncFIFO([("data", 8)], rx_fifo_depth, buffered=True)
+                self.comb += self.rx_fifo.source.connect(rx)
+                rx = self.rx_fifo.sink
+
+            # Clock Domain Crossing (Optional).
+            if cd == "sys":
+                self.phy = phy
+            else:
+                self.phy = ClockDomainsRenamer(cd)(phy)
+                self.tx_cdc = stream.ClockDomainCrossing([("data", 8)], cd_from="sys", cd_to=cd)
+                self.rx_cdc = stream.ClockDomainCrossing([("data", 8)], cd_from=cd,    cd_to="sys")
+                self.comb += self.rx_cdc.source.connect(rx)
+                self.comb += tx.connect(self.tx_cdc.sink)
+                rx = self.rx_cdc.sink
+                tx = self.tx_cdc.source
+            self.comb += self.phy.source.connect(rx)
+            self.comb += tx.connect(self.phy.sink)
 
 class UARTWishboneBridge(UARTBone):
     def __init__(self, pads, clk_freq, baudrate=115200, cd="sys"):
@@ -474,8 +494,13 @@ class UARTCrossover(UART):
 
     Creates a fully compatible UART that can be used by the CPU as a regular UART and adds a second
     UART, cross-connected to the main one to allow terminal emulation over a Wishbone bridge.
+
+    With ``with_levels``, a ``xover_levels`` CSR reports in a single access the number of bytes
+    available in the crossover RX FIFO and the number of bytes that can be written to the crossover
+    (free space of the main RX FIFO), allowing the host to transfer data in bursts. Fields are sized
+    from the FIFO depths; ``rx`` is at offset 0 and ``tx`` at offset 16.
     """
-    def __init__(self, **kwargs):
+    def __init__(self, with_levels=False, **kwargs):
         assert kwargs.get("phy", None) == None
         UART.__init__(self, **kwargs)
         self.xover = UART(tx_fifo_depth=1, rx_fifo_depth=16, rx_fifo_rx_we=True)
@@ -483,3 +508,21 @@ class UARTCrossover(UART):
             self.source.connect(self.xover.sink),
             self.xover.source.connect(self.sink)
         ]
+
+        # Levels.
+        if with_levels:
+            rx_fifo_depth       = self.rx_fifo.depth
+            xover_rx_fifo_depth = self.xover.rx_fifo.depth
+            assert rx_fifo_depth < 2**16
+            self._xover_levels = CSRStatus(fields=[
+                CSRField("rx", size=bits_for(xover_rx_fifo_depth), offset=0,  description="Bytes available in crossover RX FIFO."),
+                CSRField("tx", size=bits_for(rx_fifo_depth),       offset=16, description="Bytes that can be written to crossover."),
+            ])
+            tx_used = Signal(max=rx_fifo_depth + 2)
+            self.comb += [
+                self._xover_levels.fields.rx.eq(self.xover.rx_fifo.level),
+                tx_used.eq(self.rx_fifo.level + self.xover.tx_fifo.source.valid),
+                If(tx_used < rx_fifo_depth,
+                    self._xover_levels.fields.tx.eq(rx_fifo_depth - tx_used)
+                )
+            ]
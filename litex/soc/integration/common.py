@@ -5,10 +5,11 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import os
+import sys
 import math
 import json
 import time
-import struct
+import array
 import datetime
 
 from migen import *
@@ -40,6 +41,11 @@ def get_mem_regions(filename_or_regions, offset):
     return regions
 
 def get_mem_data(filename_or_regions, data_width=32, endianness="big", mem_size=None, offset=0):
+    """Load memory content files as data words.
+
+    Files are read directly into a single zero-filled buffer and decoded in bulk (through ``array``
+    for 32/64-bit ``data_width``). Data is returned as a list of ints, as callers may pad/extend it.
+    """
     assert data_width % 32 == 0
     assert endianness in ["big", "little"]
 
@@ -62,30 +68,40 @@ def get_mem_data(filename_or_regions, data_width=32, endianness="big", mem_size=
             "file is too big: {}/{} bytes".format(
              data_size, mem_size))
 
-    # Fill data.
+    # Fill buffer.
     bytes_per_data = data_width//8
-    data           = [0]*math.ceil(data_size/bytes_per_data)
+    data_length    = math.ceil(data_size/bytes_per_data)
+    buf            = bytearray(data_length*bytes_per_data)
+    view           = memoryview(buf)
     for filename, base in regions.items():
-        base = int(base, 16)
+        start = ((int(base, 16) - offset)//bytes_per_data)*bytes_per_data
+        size  = os.path.getsize(filename)
         with open(filename, "rb") as f:
-            i = 0
-            while True:
-                w = f.read(bytes_per_data)
-                if not w:
-                    break
-                if len(w) != bytes_per_data:
-                    for _ in range(len(w), bytes_per_data):
-                        w += b'\x00'
-                unpack_order = {
-                    "little": "<I",
-                    "big":    ">I"
-                }[endianness]
-                data[(base - offset)//bytes_per_data + i] = 0
-                for filled_data_width in range(0, data_width, 32):
-                    cur_byte = filled_data_width//8
-                    data[(base - offset)//bytes_per_data + i] |= (struct.unpack(unpack_order, w[cur_byte:cur_byte+4])[0] << filled_data_width)
-                i += 1
-    return data
+            f.readinto(view[start:start + size])
+        # Zero-pad last data word of the region.
+        end = start + math.ceil(size/bytes_per_data)*bytes_per_data
+        view[start + size:end] = bytes(end - (start + size))
+    view.release()
+
+    # Decode 32-bit words (stored in little-endian order when combined in wider data).
+    words = array.array("I")
+    assert words.itemsize == 4
+    words.frombytes(buf)
+    if endianness != sys.byteorder:
+        words.byteswap()
+    if data_width == 32:
+        return words.tolist()
+    if sys.byteorder == "big":
+        words.byteswap()
+    buf = words.tobytes()
+    if data_width == 64:
+        data = array.array("Q")
+        data.frombytes(buf)
+        if sys.byteorder == "big":
+            data.byteswap()
+        return data.tolist()
+    return [int.from_bytes(buf[i:i + bytes_per_data], "little")
+        for i in range(0, len(buf), bytes_per_data)]
 
 def get_boot_address(filename_or_regions, offset=0):
     # Create memory regions.
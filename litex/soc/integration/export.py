@@ -383,6 +383,31 @@ def _generate_csr_fields_access_functions_c(name, region, origin, alignment, csr
                 region_defs += _generate_csr_field_functions_c(csr, name)
     return region_defs
 
+# DMA Descriptors.
+
+def _generate_dma_descriptors_c():
+    from litex.soc.cores import dma
+    ctypes = {32: "uint32_t", 64: "uint64_t"}
+    r  = "\n"
+    r += f"#define DMA_DESCRIPTOR_SIZE {dma.dma_descriptor_size}\n"
+    offset = 0
+    for name, width in dma.dma_descriptor_layout:
+        r += f"#define DMA_DESCRIPTOR_{name.upper()}_OFFSET {offset//8}\n"
+        r += f"#define DMA_DESCRIPTOR_{name.upper()}_SIZE {width//8}\n"
+        offset += width
+    for name in ["LAST", "END", "IRQ"]:
+        r += f"#define DMA_DESCRIPTOR_{name} {hex(getattr(dma, 'DMA_DESCRIPTOR_' + name))}\n"
+    for name in ["DONE", "LAST", "LENGTH_MASK"]:
+        r += f"#define DMA_STATUS_{name} {hex(getattr(dma, 'DMA_STATUS_' + name))}\n"
+    r += "#ifndef __ASSEMBLER__\n"
+    r += "#include <stdint.h>\n"
+    r += "struct dma_descriptor {\n"
+    for name, width in dma.dma_descriptor_layout:
+        r += f"\t{ctypes[width]} {name};\n"
+    r += "} __attribute__((packed));\n"
+    r += "#endif /* ! __ASSEMBLER__ */\n"
+    return r
+
 # CSR Header.
 
 def get_csr_header(regions, constants, csr_base=None, with_csr_base_define=True, with_access_functions=True, with_fields_access_functions=False):
@@ -439,6 +464,12 @@ def get_csr_header(regions, constants, csr_base=None, with_csr_base_define=True,
             r += _generate_csr_fields_access_functions_c(name, region, origin, alignment, csr_base, with_csr_base_define)
         r += "#endif /* LITEX_CSR_FIELDS_ACCESS_FUNCTIONS */\n"
 
+    # DMA Descriptors (when a CSR region exposes DMA descriptors, see cores/dma).
+    if any(name.endswith("_DMA_DESCRIPTORS") for name in constants.keys()):
+        r += "\n"
+        r += generated_separator("//", "DMA Descriptors.")
+        r += _generate_dma_descriptors_c()
+
     r += "\n#endif /* ! __GENERATED_CSR_H */\n"
     return r
 
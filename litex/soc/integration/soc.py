@@ -132,6 +132,7 @@ class SoCBusHandler(LiteXModule):
         timeout          = 1e6,
         bursting         = False,
         interconnect     = "shared", interconnect_register=True,
+        connectivity     = None,
         reserved_regions = {}
     ):
         self.logger = logging.getLogger(name)
@@ -173,6 +174,7 @@ class SoCBusHandler(LiteXModule):
         self.bursting              = bursting
         self.interconnect          = interconnect
         self.interconnect_register = interconnect_register
+        self.connectivity          = connectivity # {master_name: [slave_name, ...]}, optional.
         self.masters               = {}
         self.slaves                = {}
         self.regions               = {}
@@ -559,6 +561,26 @@ class SoCBusHandler(LiteXModule):
         # Else just return address_width:
         return self.address_width
 
+    def get_connectivity(self):
+        # Only supported on Crossbar Interconnects of Wishbone Bus.
+        if not (self.standard == "wishbone" and self.interconnect in ["crossbar", "pipelined"]):
+            self.logger.error("Bus connectivity only supported with {} Interconnect on {} Bus.".format(
+                colorer("crossbar/pipelined", color="red"),
+                colorer("wishbone")))
+            raise SoCError()
+
+        # Check Masters/Slaves names.
+        for master, slaves in self.connectivity.items():
+            for name, names in [(master, self.masters)] + [(slave, self.slaves) for slave in slaves]:
+                if name not in names:
+                    self.logger.error("{} in Bus connectivity is not a Bus Master/Slave.".format(
+                        colorer(name, color="red")))
+                    raise SoCError()
+
+        # Masters -> Slaves matrix (Masters not specified can reach all Slaves).
+        return [[(m not in self.connectivity) or (s in self.connectivity[m]) for s in self.slaves.keys()]
+            for m in self.masters.keys()]
+
     def do_finalize(self):
         interconnect_p2p_cls = {
             "wishbone": wishbone.InterconnectPointToPoint,
@@ -575,6 +597,9 @@ class SoCBusHandler(LiteXModule):
             "axi-lite": axi.AXILiteCrossbar,
             "axi"     : axi.AXICrossbar,
         }[self.standard]
+        interconnect_pipelined_cls = {
+            "wishbone": wishbone.PipelinedCrossbar,
+        }.get(self.standard, None)
 
         self._interconnect = None
         if len(self.masters) and len(self.slaves):
@@ -599,14 +624,24 @@ class SoCBusHandler(LiteXModule):
                             raise SoCError()
                 # Interconnect Logic.
                 interconnect_cls = {
-                    "shared"  : interconnect_shared_cls,
-                    "crossbar": interconnect_crossbar_cls,
+                    "shared"   : interconnect_shared_cls,
+                    "crossbar" : interconnect_crossbar_cls,
+                    "pipelined": interconnect_pipelined_cls,
                 }[self.interconnect]
+                if interconnect_cls is None:
+                    self.logger.error("{} Interconnect not supported with {} Bus.".format(
+                        colorer(self.interconnect, color="red"),
+                        colorer(self.standard)))
+                    raise SoCError()
+                interconnect_kwargs = {}
+                if self.connectivity is not None:
+                    interconnect_kwargs["connectivity"] = self.get_connectivity()
                 self._interconnect = interconnect_cls(
                     masters        = list(self.masters.values()),
                     slaves         = [(self.regions[n].decoder(self), s) for n, s in self.slaves.items()],
                     register       = self.interconnect_register,
-                    timeout_cycles = self.timeout
+                    timeout_cycles = self.timeout,
+                    **interconnect_kwargs
                 )
             self.logger.info("Interconnect: {} ({} <-> {}).".format(
                 colorer(self._interconnect.__class__.__name__),
@@ -1078,7 +1113,7 @@ class SoC(LiteXModule, SoCCoreCompat):
             colorer("added", color="green"),
             self.bus.regions[name]))
         self.add_module(name=name, module=ram)
-        if contents != []:
+        if len(contents) != 0:
             self.add_config(f"{name}_INIT", 1)
 
     def init_ram(self, name, contents=[], auto_size=False):
@@ -1512,7 +1547,7 @@ class LiteXSoC(SoC):
         self.add_config(name, identifier)
 
     # Add UART -------------------------------------------------------------------------------------
-    def add_uart(self, name="uart", uart_name="serial", uart_pads=None, baudrate=115200, fifo_depth=16, with_dynamic_baudrate=False):
+    def add_uart(self, name="uart", uart_name="serial", uart_pads=None, baudrate=115200, fifo_depth=16, with_dynamic_baudrate=False, with_crossover_levels=False):
         # Imports.
         from litex.soc.cores.uart import UART, UARTCrossover
 
@@ -1547,12 +1582,12 @@ class LiteXSoC(SoC):
 
         # Crossover.
         if uart_name in ["crossover"]:
-            uart = UARTCrossover(**uart_kwargs)
+            uart = UARTCrossover(with_levels=with_crossover_levels, **uart_kwargs)
 
         # Crossover + UARTBone.
         elif uart_name in ["crossover+uartbone"]:
             self.add_uartbone(baudrate=baudrate, with_dynamic_baudrate=with_dynamic_baudrate)
-            uart = UARTCrossover(**uart_kwargs)
+            uart = UARTCrossover(with_levels=with_crossover_levels, **uart_kwargs)
 
         # JTAG UART.
         elif uart_name in ["jtag_uart"]:
@@ -1605,7 +1640,7 @@ class LiteXSoC(SoC):
             self.add_constant("UART_POLLING", check_duplicate=False)
 
     # Add UARTbone ---------------------------------------------------------------------------------
-    def add_uartbone(self, name="uartbone", uart_name="serial", clk_freq=None, baudrate=115200, cd="sys", with_dynamic_baudrate=False):
+    def add_uartbone(self, name="uartbone", uart_name="serial", clk_freq=None, baudrate=115200, cd="sys", with_dynamic_baudrate=False, rx_fifo_depth=0):
         # Imports.
         from litex.soc.cores import uart
 
@@ -1618,7 +1653,8 @@ class LiteXSoC(SoC):
             phy           = uartbone_phy,
             clk_freq      = clk_freq,
             cd            = cd,
-            address_width = self.bus.address_width)
+            address_width = self.bus.address_width,
+            rx_fifo_depth = rx_fifo_depth)
         self.add_module(name=f"{name}_phy", module=uartbone_phy)
         self.add_module(name=name,          module=uartbone)
         self.bus.add_master(name=name, master=uartbone.wishbone)
@@ -1658,6 +1694,8 @@ class LiteXSoC(SoC):
         l2_cache_min_data_width = 128,
         l2_cache_reverse        = False,
         l2_cache_full_memory_we = True,
+        l2_cache_ways           = 1,
+        l2_cache_csr            = False,
         **kwargs):
 
         # Imports.
@@ -1816,14 +1854,27 @@ class LiteXSoC(SoC):
                 l2_cache_size = max(l2_cache_size, int(2*port.data_width/8)) # Use minimal size if lower
                 l2_cache_size = 2**int(math.log2(l2_cache_size))                  # Round to nearest power of 2
                 l2_cache_data_width = max(port.data_width, l2_cache_min_data_width)
-                l2_cache = wishbone.Cache(
-                    cachesize = l2_cache_size//4,
-                    master    = wb_sdram,
-                    slave     = wishbone.Interface(data_width=l2_cache_data_width, address_width=32, addressing="word"),
-                    reverse   = l2_cache_reverse)
+                l2_cache_slave      = wishbone.Interface(data_width=l2_cache_data_width, address_width=32, addressing="word")
+                if (l2_cache_ways > 1) or l2_cache_csr:
+                    # N-way Set-Associative L2 Cache (at least one line per way), with hits/misses/
+                    # evictions CSRs when l2_cache_csr is set.
+                    l2_cache_size = max(l2_cache_size, l2_cache_ways*l2_cache_data_width//8)
+                    l2_cache = wishbone.SetAssociativeCache(
+                        cachesize = l2_cache_size//4,
+                        master    = wb_sdram,
+                        slave     = l2_cache_slave,
+                        ways      = l2_cache_ways,
+                        reverse   = l2_cache_reverse,
+                        with_csr  = l2_cache_csr)
+                else:
+                    l2_cache = wishbone.Cache(
+                        cachesize = l2_cache_size//4,
+                        master    = wb_sdram,
+                        slave     = l2_cache_slave,
+                        reverse   = l2_cache_reverse)
                 if l2_cache_full_memory_we:
                     l2_cache = FullMemoryWE()(l2_cache)
-                self.l2_cache = l2_cache
+                self.add_module(name="l2_cache", module=l2_cache)
                 litedram_wb = self.l2_cache.slave
                 self.add_config("L2_SIZE", l2_cache_size)
             else:
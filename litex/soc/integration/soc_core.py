@@ -173,7 +173,7 @@ class SoCCore(LiteXSoC):
             integrated_rom_init = []
             integrated_rom_size = 0
         self.integrated_rom_size        = integrated_rom_size
-        self.integrated_rom_initialized = integrated_rom_init != []
+        self.integrated_rom_initialized = len(integrated_rom_init) != 0
 
         # SRAM.
         self.integrated_sram_size = integrated_sram_size
@@ -300,7 +300,7 @@ def soc_core_args(parser):
     soc_group.add_argument("--bus-address-width", default=32,         type=auto_int, help="Bus address-width.")
     soc_group.add_argument("--bus-timeout",       default=int(1e6),   type=float,    help="Bus timeout in cycles.")
     soc_group.add_argument("--bus-bursting",      action="store_true",               help="Enable burst cycles on the bus if supported.")
-    soc_group.add_argument("--bus-interconnect",  default="shared",                  help="Select bus interconnect: shared (default) or crossbar.")
+    soc_group.add_argument("--bus-interconnect",  default="shared",                  help="Select bus interconnect: shared (default), crossbar or pipelined (Wishbone only).")
 
     # CPU parameters.
     soc_group.add_argument("--cpu-type",          default="vexriscv",               help="Select CPU: {}.".format(", ".join(iter(cpu.CPUS.keys()))))
@@ -608,6 +608,317 @@ class AXIDecoder(LiteXModule):
                     masked.append(src & mask)
                 self.comb += dst.eq(reduce(or_, masked))
 
+# AXI ID-Based Interconnect Components -------------------------------------------------------------
+
+def _axi_channel_fields(endpoint):
+    return ["first", "last"] + [name for name, _ in
+        endpoint.description.payload_layout + endpoint.description.param_layout]
+
+def _axi_channel_mux(sel, sources, sink, omit=set()):
+    """Connect ``sources[sel]`` to ``sink`` (valid/ready and payload)."""
+    r = []
+    for name in _axi_channel_fields(sink):
+        if name not in omit:
+            r.append(getattr(sink, name).eq(Array(getattr(s, name) for s in sources)[sel]))
+    r.append(sink.valid.eq(Array(s.valid for s in sources)[sel]))
+    for i, source in enumerate(sources):
+        r.append(source.ready.eq(sink.ready & (sel == i)))
+    return r
+
+def _axi_channel_demux(sel, source, sinks, omit=set()):
+    """Connect ``source`` to ``sinks[sel]`` (valid/ready), payload is broadcasted."""
+    r = []
+    for i, sink in enumerate(sinks):
+        for name in _axi_channel_fields(source):
+            if name not in omit:
+                r.append(getattr(sink, name).eq(getattr(source, name)))
+        r.append(sink.valid.eq(source.valid & (sel == i)))
+    r.append(source.ready.eq(Array(s.ready for s in sinks)[sel]))
+    return r
+
+class _AXIIDTracker(LiteXModule):
+    """Outstanding requests tracker
+
+    Count the outstanding requests of each ID along with the slave they target. A new request is
+    only allowed when no request with the same ID is outstanding or when they target the same
+    slave, so the responses of an ID are returned in order. IDs are tracked on their ``id_width``
+    LSBs: aliased IDs are just ordered more conservatively.
+    """
+    def __init__(self, request_id, request_sel, request, response_id, response, max_outstanding=8, id_width=4):
+        self.allow = Signal()
+
+        # # #
+
+        id_width = min(id_width, len(request_id))
+        counters = [Signal(max=max_outstanding + 1) for _ in range(2**id_width)]
+        sels     = [Signal(len(request_sel))        for _ in range(2**id_width)]
+        counter  = Array(counters)[request_id[:id_width]]
+        sel      = Array(sels)[request_id[:id_width]]
+
+        # Allow request when ID is idle or already targets the same slave.
+        self.comb += self.allow.eq(((counter == 0) | (sel == request_sel)) & (counter != max_outstanding))
+
+        # Update counters/selections.
+        for i in range(2**id_width):
+            inc = request  & (request_id[:id_width]  == i)
+            dec = response & (response_id[:id_width] == i)
+            self.sync += [
+                If(inc & ~dec,
+                    counters[i].eq(counters[i] + 1)
+                ).Elif(dec & ~inc,
+                    counters[i].eq(counters[i] - 1)
+                ),
+                If(inc, sels[i].eq(request_sel)),
+            ]
+
+class AXIIDArbiter(LiteXModule):
+    """AXI ID-based arbiter
+
+    Arbitrate between master interfaces and connect them to the target without waiting for the
+    responses: the index of the master is prepended to the ID of the requests (target's ID has to
+    be ``id_width`` + log2(len(masters)) bits wide) and responses are routed back with it. Write data
+    is forwarded in the order of the granted write requests.
+    """
+    def __init__(self, masters, target, id_width=1, max_outstanding=8):
+        index_width = bits_for(len(masters) - 1) if len(masters) > 1 else 0
+        if target.id_width < (id_width + index_width):
+            raise ValueError("AXIIDArbiter target requires {} ID bits ({} provided).".format(
+                id_width + index_width, target.id_width))
+        self.rr_write = rr_write = roundrobin.RoundRobin(len(masters), roundrobin.SP_CE)
+        self.rr_read  = rr_read  = roundrobin.RoundRobin(len(masters), roundrobin.SP_CE)
+
+        # # #
+
+        def prepend_index(ids):
+            if index_width == 0:
+                return Array(ids)
+            return Array(Cat(_id[:id_width], C(i, index_width)) for i, _id in enumerate(ids))
+
+        def response_index(response):
+            if index_width == 0:
+                return 0
+            return response.id[id_width:id_width + index_width]
+
+        # Write Requests: Grant a new master on each request, store grant for the write data.
+        self.w_fifo = w_fifo = stream.SyncFIFO([("grant", len(rr_write.grant))], max_outstanding)
+        self.comb += [
+            rr_write.request.eq(Cat(*[m.aw.valid for m in masters])),
+            rr_write.ce.eq(~target.aw.valid | target.aw.ready),
+            _axi_channel_mux(rr_write.grant, [m.aw for m in masters], target.aw, omit={"id"}),
+            target.aw.id.eq(prepend_index([m.aw.id for m in masters])[rr_write.grant]),
+            # Stall requests when write data FIFO is full.
+            If(~w_fifo.sink.ready,
+                target.aw.valid.eq(0),
+                *[m.aw.ready.eq(0) for m in masters]
+            ),
+            w_fifo.sink.valid.eq(target.aw.valid & target.aw.ready),
+            w_fifo.sink.grant.eq(rr_write.grant),
+        ]
+
+        # Write Data: Forward data of the granted masters in order.
+        self.comb += [
+            _axi_channel_mux(w_fifo.source.grant, [m.w for m in masters], target.w),
+            If(~w_fifo.source.valid,
+                target.w.valid.eq(0),
+                *[m.w.ready.eq(0) for m in masters]
+            ),
+            w_fifo.source.ready.eq(target.w.valid & target.w.ready & target.w.last),
+        ]
+
+        # Write Responses: Route back to the master with the ID index.
+        self.comb += _axi_channel_demux(response_index(target.b), target.b, [m.b for m in masters])
+
+        # Read Requests: Grant a new master on each request.
+        self.comb += [
+            rr_read.request.eq(Cat(*[m.ar.valid for m in masters])),
+            rr_read.ce.eq(~target.ar.valid | target.ar.ready),
+            _axi_channel_mux(rr_read.grant, [m.ar for m in masters], target.ar, omit={"id"}),
+            target.ar.id.eq(prepend_index([m.ar.id for m in masters])[rr_read.grant]),
+        ]
+
+        # Read Responses: Route back to the master with the ID index.
+        self.comb += _axi_channel_demux(response_index(target.r), target.r, [m.r for m in masters])
+
+class _AXIDecodeError(LiteXModule):
+    """Respond to the accesses with DECERR (accesses not targeting any slave)."""
+    def __init__(self, bus):
+        self.bus = bus
+
+        # # #
+
+        # Writes: accept the request and its data, then respond.
+        wr_id = Signal(len(bus.aw.id))
+        self.wr_fsm = wr_fsm = FSM(reset_state="IDLE")
+        wr_fsm.act("IDLE",
+            bus.aw.ready.eq(1),
+            If(bus.aw.valid,
+                NextValue(wr_id, bus.aw.id),
+                NextState("DATA")
+            )
+        )
+        wr_fsm.act("DATA",
+            bus.w.ready.eq(1),
+            If(bus.w.valid & bus.w.last,
+                NextState("RESPONSE")
+            )
+        )
+        wr_fsm.act("RESPONSE",
+            bus.b.valid.eq(1),
+            bus.b.id.eq(wr_id),
+            bus.b.resp.eq(RESP_DECERR),
+            If(bus.b.ready,
+                NextState("IDLE")
+            )
+        )
+
+        # Reads: accept the request, then return its len + 1 beats.
+        rd_id    = Signal(len(bus.ar.id))
+        rd_count = Signal(len(bus.ar.len))
+        self.rd_fsm = rd_fsm = FSM(reset_state="IDLE")
+        rd_fsm.act("IDLE",
+            bus.ar.ready.eq(1),
+            If(bus.ar.valid,
+                NextValue(rd_id,    bus.ar.id),
+                NextValue(rd_count, bus.ar.len),
+                NextState("RESPONSE")
+            )
+        )
+        rd_fsm.act("RESPONSE",
+            bus.r.valid.eq(1),
+            bus.r.id.eq(rd_id),
+            bus.r.last.eq(rd_count == 0),
+            bus.r.resp.eq(RESP_DECERR),
+            bus.r.data.eq(2**len(bus.r.data) - 1),
+            If(bus.r.ready,
+                NextValue(rd_count, rd_count - 1),
+                If(bus.r.last,
+                    NextState("IDLE")
+                )
+            )
+        )
+
+class AXIIDDecoder(LiteXModule):
+    """AXI ID-based decoder
+
+    Decode master access to particular slave based on its decoder function (see ``AXIDecoder``)
+    without waiting for the responses before switching slaves:
+
+    - Requests of an ID can only target one slave at a time (``_AXIIDTracker``), responses of each
+      ID are then returned in order.
+    - Write requests can only switch slaves once all the write data of the previous ones has been
+      forwarded (required to avoid W channel deadlocks between masters).
+    - Read responses from the slaves are arbitrated per burst, write responses per beat.
+    - Accesses not targeting any slave are completed with a DECERR response.
+    """
+    def __init__(self, master, slaves, max_outstanding=8, tracked_id_width=4):
+        addr_shift = log2_int(master.data_width//8)
+
+        # # #
+
+        # Decode errors: route accesses not targeting any slave to a DECERR responder (lowest priority).
+        self.decode_error = _AXIDecodeError(AXIInterface(
+            data_width    = master.data_width,
+            address_width = master.address_width,
+            id_width      = len(master.aw.id),
+        ))
+        slaves    = list(slaves) + [(lambda a: 1, self.decode_error.bus)]
+        sel_width = bits_for(len(slaves) - 1)
+
+        # Decode slave addresses (lowest index has priority).
+        sel = {"aw": Signal(sel_width), "ar": Signal(sel_width)}
+        for channel in ["aw", "ar"]:
+            ax = getattr(master, channel)
+            for i, (decoder, bus) in reversed(list(enumerate(slaves))):
+                self.comb += If(decoder(ax.addr[addr_shift:]),
+                    sel[channel].eq(i),
+                )
+
+        # Outstanding requests trackers.
+        self.wr_tracker = wr_tracker = _AXIIDTracker(
+            request_id      = master.aw.id,
+            request_sel     = sel["aw"],
+            request         = master.aw.valid & master.aw.ready,
+            response_id     = master.b.id,
+            response        = master.b.valid & master.b.ready,
+            max_outstanding = max_outstanding,
+            id_width        = tracked_id_width,
+        )
+        self.rd_tracker = rd_tracker = _AXIIDTracker(
+            request_id      = master.ar.id,
+            request_sel     = sel["ar"],
+            request         = master.ar.valid & master.ar.ready,
+            response_id     = master.r.id,
+            response        = master.r.valid & master.r.ready & master.r.last,
+            max_outstanding = max_outstanding,
+            id_width        = tracked_id_width,
+        )
+
+        # Write data tracking: count write requests with pending data and their slave.
+        w_count = Signal(max=max_outstanding + 1)
+        w_sel   = Signal(sel_width)
+        aw_done = Signal()
+        w_done  = Signal()
+        self.comb += [
+            aw_done.eq(master.aw.valid & master.aw.ready),
+            w_done.eq(master.w.valid & master.w.ready & master.w.last),
+        ]
+        self.sync += [
+            If(aw_done & ~w_done,
+                w_count.eq(w_count + 1)
+            ).Elif(w_done & ~aw_done,
+                w_count.eq(w_count - 1)
+            ),
+            If(aw_done, w_sel.eq(sel["aw"])),
+        ]
+
+        # Write Requests.
+        aw_allow = Signal()
+        self.comb += [
+            aw_allow.eq(wr_tracker.allow &
+                ((w_count == 0) | (w_sel == sel["aw"])) & (w_count != max_outstanding)),
+            _axi_channel_demux(sel["aw"], master.aw, [s.aw for _, s in slaves]),
+            If(~aw_allow,
+                master.aw.ready.eq(0),
+                *[s.aw.valid.eq(0) for _, s in slaves]
+            ),
+        ]
+
+        # Write Data: Forward to the slave of the pending write requests.
+        self.comb += [
+            _axi_channel_demux(w_sel, master.w, [s.w for _, s in slaves]),
+            If(w_count == 0,
+                master.w.ready.eq(0),
+                *[s.w.valid.eq(0) for _, s in slaves]
+            ),
+        ]
+
+        # Write Responses: Arbitrate per beat.
+        self.rr_b = rr_b = roundrobin.RoundRobin(len(slaves), roundrobin.SP_CE)
+        self.comb += [
+            rr_b.request.eq(Cat(*[s.b.valid for _, s in slaves])),
+            rr_b.ce.eq(~master.b.valid | master.b.ready),
+            _axi_channel_mux(rr_b.grant, [s.b for _, s in slaves], master.b),
+        ]
+
+        # Read Requests.
+        ar_allow = Signal()
+        self.comb += [
+            ar_allow.eq(rd_tracker.allow),
+            _axi_channel_demux(sel["ar"], master.ar, [s.ar for _, s in slaves]),
+            If(~ar_allow,
+                master.ar.ready.eq(0),
+                *[s.ar.valid.eq(0) for _, s in slaves]
+            ),
+        ]
+
+        # Read Responses: Arbitrate per burst (no interleaving).
+        self.rr_r = rr_r = roundrobin.RoundRobin(len(slaves), roundrobin.SP_CE)
+        self.comb += [
+            rr_r.request.eq(Cat(*[s.r.valid for _, s in slaves])),
+            rr_r.ce.eq(~master.r.valid | (master.r.ready & master.r.last)),
+            _axi_channel_mux(rr_r.grant, [s.r for _, s in slaves], master.r),
+        ]
+
 # AXI Interconnect ---------------------------------------------------------------------------------
 
 def get_check_parameters(ports):
@@ -655,3 +966,29 @@ class AXICrossbar(LiteXModule):
         # Arbitrate each access column onto its slave.
         for masters, bus in zip(access_s_m, busses):
             self.submodules += AXIArbiter(masters, bus)
+
+class AXIIDCrossbar(LiteXModule):
+    """AXI ID-based crossbar
+
+    MxN crossbar for M masters and N slaves that does not wait for the responses before switching
+    masters/slaves: multiple masters can have transactions in flight to the same or to different
+    slaves. Masters' IDs are extended with the master index, so slaves' IDs have to be
+    max(masters ID width) + log2(M) bits wide and slaves have to return the request ID in their
+    responses. Responses of each master ID are returned in order. Accesses not targeting any slave
+    are completed with a DECERR response.
+    """
+    def __init__(self, masters, slaves, max_outstanding=8, tracked_id_width=4):
+        data_width = get_check_parameters(ports=masters + [s for _, s in slaves])
+        adr_width  = max([m.address_width for m in masters])
+        id_width   = max([m.id_width for m in masters])
+        matches, busses = zip(*slaves)
+        access_m_s = [[AXIInterface(data_width=data_width, address_width=adr_width, id_width=id_width)
+            for j in slaves] for i in masters]  # a[master][slave]
+        access_s_m = list(zip(*access_m_s))  # a[slave][master]
+        # Decode each master into its access row.
+        for slaves, master in zip(access_m_s, masters):
+            slaves = list(zip(matches, slaves))
+            self.submodules += AXIIDDecoder(master, slaves, max_outstanding, tracked_id_width)
+        # Arbitrate each access column onto its slave.
+        for masters, bus in zip(access_s_m, busses):
+            self.submodules += AXIIDArbiter(masters, bus, id_width, max_outstanding)
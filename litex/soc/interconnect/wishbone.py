@@ -20,7 +20,7 @@ from litex.gen.genlib.misc import split, displacer, chooser, WaitTimer
 
 from litex.build.generic_platform import *
 
-from litex.soc.interconnect import csr, csr_bus
+from litex.soc.interconnect import csr, csr_bus, stream
 
 # Wishbone Definition ------------------------------------------------------------------------------
 
@@ -302,19 +302,307 @@ class InterconnectShared(LiteXModule):
             self.timeout = Timeout(shared, timeout_cycles)
 
 
+def get_connectivity(masters, slaves, connectivity=None):
+    # Master -> Slave reachability matrix (connectivity[master][slave]), full when not specified.
+    if connectivity is None:
+        return [[True for j in slaves] for i in masters]
+    if (len(connectivity) != len(masters)) or any(len(row) != len(slaves) for row in connectivity):
+        raise ValueError("Connectivity matrix must be {}x{} (masters x slaves).".format(
+            len(masters), len(slaves)))
+    for i, row in enumerate(connectivity):
+        if not any(row):
+            raise ValueError("Master {} can't reach any slave.".format(i))
+    return [[bool(c) for c in row] for row in connectivity]
+
+
 class Crossbar(LiteXModule):
-    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6):
+    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6, connectivity=None):
         data_width = get_check_parameters(ports=masters + [s for _, s in slaves])
         matches, busses = zip(*slaves)
         adr_width = max([m.adr_width for m in masters])
-        access = [[Interface(data_width=data_width, adr_width=adr_width) for j in slaves] for i in masters]
-        # decode each master into its access row
+        connectivity = get_connectivity(masters, slaves, connectivity)
+        access = [[Interface(data_width=data_width, adr_width=adr_width) if connectivity[i][j] else None
+            for j in range(len(slaves))] for i in range(len(masters))]
+        # decode each master into its (reachable) access row
         for row, master in zip(access, masters):
-            row = list(zip(matches, row))
+            row = [(match, bus) for match, bus in zip(matches, row) if bus is not None]
             self.submodules += Decoder(master, row, register)
-        # arbitrate each access column onto its slave
+        # arbitrate each (reachable) access column onto its slave
         for column, bus in zip(zip(*access), busses):
-            self.submodules += Arbiter(column, bus)
+            column = [m for m in column if m is not None]
+            if len(column):
+                self.submodules += Arbiter(column, bus)
+
+
+class RegisterSlice(LiteXModule):
+    """Wishbone register slice
+
+    Cuts the combinatorial paths between ``master`` and ``slave``: accesses go through a request
+    FIFO to the slave and responses through a response FIFO to the master, so the slave only sees
+    registered signals and master acks only depend on the master signals and the slice state.
+
+    Classic accesses have a single access in flight. Incrementing bursts (``cti``/``bte``) are
+    pipelined, up to ``depth`` accesses in flight:
+
+    - Reads are issued ahead of the master on the burst addresses, responses are acked when the
+      master presents their address; unused reads (burst end, address mismatch) are discarded.
+    - Writes are posted (acked once queued), the last write of the burst (``CTI_BURST_END``) is
+      acked on its response and reports errors of the posted writes.
+
+    When the master deasserts ``cyc``, reads in flight are discarded and posted writes are completed;
+    the slave ``cyc`` is then released for a cycle to terminate the unfinished burst.
+
+    LiteX Wishbone interfaces are Classic (no ``stall`` signal), so Wishbone B4 pipelined ``stall``
+    semantics are not used: flow control on both sides is done with ``ack``, and pipelining is
+    obtained from Registered Feedback bursts (``cti``/``bte``) as described above.
+    """
+    def __init__(self, master, slave, depth=4):
+        assert depth >= 2
+        request_layout  = [
+            ("adr",   len(master.adr)),
+            ("dat_w", len(master.dat_w)),
+            ("sel",   len(master.sel)),
+            ("we",    1),
+            ("cti",   3),
+            ("bte",   2),
+            ("posted", 1), # No response to the master (posted write).
+            ("epoch",  1), # Reads of older epochs are discarded.
+        ]
+        response_layout = [
+            ("adr",   len(master.adr)),
+            ("dat_r", len(master.dat_r)),
+            ("err",   1),
+            ("we",    1),
+            ("epoch", 1),
+        ]
+
+        # # #
+
+        # FIFOs.
+        self.request  = request  = stream.SyncFIFO(request_layout,  depth)
+        self.response = response = stream.SyncFIFO(response_layout, depth)
+
+        epoch    = Signal()                # Responses of older epochs are discarded.
+        inflight = Signal(max=depth + 1)   # Accesses with a response (in FIFOs or at the slave).
+        error    = Signal()                # Errors on posted writes.
+        inc      = Signal()
+        dec      = Signal(2)
+        cyc      = Signal()
+        abort    = Signal()
+        self.sync += [
+            cyc.eq(master.cyc),
+            inflight.eq(inflight + inc - dec),
+        ]
+        self.comb += abort.eq(cyc & ~master.cyc)
+
+        # Master Side.
+        # ------------
+        request_cyc = master.cyc & master.stb
+        master_inc  = (master.cti == CTI_BURST_INCREMENTING)
+        fresh       = response.source.valid & (response.source.epoch == epoch)
+        flush       = Signal()
+
+        # Reads (issued ahead on incrementing bursts).
+        rd_active = Signal()
+        rd_more   = Signal()
+        rd_adr    = Signal(len(master.adr))
+        rd_cti    = Signal(3)
+        rd_bte    = Signal(2)
+        rd_issue  = Signal()
+        rd_mask   = Signal(4)
+        self.comb += rd_mask.eq(Array([0b0000, 0b0011, 0b0111, 0b1111])[rd_bte])
+        self.sync += [
+            If(rd_issue,
+                # Next address of the burst (wrapped with bte).
+                If(rd_bte == 0b00,
+                    rd_adr.eq(rd_adr + 1)
+                ).Else(
+                    rd_adr[:4].eq((rd_adr[:4] & ~rd_mask) | ((rd_adr[:4] + 1) & rd_mask))
+                ),
+                If(rd_cti != CTI_BURST_INCREMENTING,
+                    rd_more.eq(0)
+                )
+            ),
+            If(request_cyc & ~master.we & ~rd_active & ~flush,
+                rd_active.eq(1),
+                rd_more.eq(1),
+                rd_adr.eq(master.adr),
+                rd_cti.eq(Mux(master_inc, CTI_BURST_INCREMENTING, CTI_BURST_NONE)),
+                rd_bte.eq(master.bte),
+            ),
+            If(flush | abort,
+                epoch.eq(~epoch),
+                rd_active.eq(0),
+                rd_more.eq(0),
+            )
+        ]
+
+        # Writes (posted on incrementing bursts).
+        wr_waiting = Signal()
+        wr_posted  = Signal()
+        wr_issue   = Signal()
+        wr_done    = Signal()
+        self.comb += wr_posted.eq(master_inc)
+        self.sync += [
+            If(wr_issue & ~wr_posted,
+                wr_waiting.eq(1)
+            ),
+            If(master.ack | master.err | ~master.cyc,
+                wr_waiting.eq(0)
+            )
+        ]
+
+        # Requests.
+        self.comb += [
+            If(request_cyc & master.we & ~wr_waiting,
+                # Writes have priority on reads issued ahead (that are then discarded).
+                wr_issue.eq(request.sink.ready & (wr_posted | (inflight != depth))),
+                request.sink.valid.eq(wr_issue),
+                request.sink.adr.eq(master.adr),
+                request.sink.dat_w.eq(master.dat_w),
+                request.sink.sel.eq(master.sel),
+                request.sink.we.eq(1),
+                request.sink.cti.eq(master.cti),
+                request.sink.bte.eq(master.bte),
+                request.sink.posted.eq(wr_posted),
+                request.sink.epoch.eq(epoch ^ rd_active),
+                inc.eq(wr_issue & ~wr_posted),
+                flush.eq(rd_active),
+            ).Elif(rd_active & rd_more & ~flush,
+                rd_issue.eq(request.sink.ready & (inflight != depth)),
+                request.sink.valid.eq(rd_issue),
+                request.sink.adr.eq(rd_adr),
+                request.sink.sel.eq(2**len(master.sel) - 1),
+                request.sink.we.eq(0),
+                request.sink.cti.eq(rd_cti),
+                request.sink.bte.eq(rd_bte),
+                request.sink.epoch.eq(epoch),
+                inc.eq(rd_issue),
+            )
+        ]
+
+        # Responses.
+        self.comb += [
+            master.dat_r.eq(response.source.dat_r),
+            If(response.source.valid & ~fresh,
+                # Discard responses of older epochs.
+                response.source.ready.eq(1),
+            ).Elif(fresh & request_cyc & (response.source.we == master.we),
+                If(master.we,
+                    # Response to the last (non-posted) write.
+                    wr_done.eq(1),
+                    master.ack.eq(~response.source.err & ~error),
+                    master.err.eq( response.source.err |  error),
+                    response.source.ready.eq(1),
+                ).Elif(response.source.adr == master.adr,
+                    # Response to the read presented by the master, burst continues on incrementing reads.
+                    master.ack.eq(~response.source.err),
+                    master.err.eq( response.source.err),
+                    response.source.ready.eq(1),
+                    flush.eq(~master_inc | ~rd_active),
+                ).Else(
+                    # Master does not follow the reads issued ahead.
+                    flush.eq(1),
+                )
+            ),
+            If(wr_issue & wr_posted,
+                master.ack.eq(1),
+            ),
+        ]
+
+        # Slave Side.
+        # -----------
+        stale      = Signal()
+        gap        = Signal()
+        last_inc   = Signal()
+        last_epoch = Signal()
+        self.comb += [
+            stale.eq(~request.source.we & (request.source.epoch != epoch)),
+            # Terminate incrementing bursts not ended by the master (aborts) before the next access.
+            gap.eq(last_inc & (request.source.epoch != last_epoch)),
+        ]
+        self.sync += [
+            If(slave.stb & (slave.ack | slave.err),
+                last_inc.eq(request.source.cti == CTI_BURST_INCREMENTING),
+                last_epoch.eq(request.source.epoch),
+            ).Elif(gap,
+                last_inc.eq(0)
+            )
+        ]
+        self.comb += [
+            # Keep cyc until posted writes are completed, release it to terminate aborted bursts.
+            slave.cyc.eq((cyc | request.source.valid) & ~gap),
+            slave.stb.eq(request.source.valid & ~stale & ~gap),
+            slave.adr.eq(request.source.adr),
+            slave.dat_w.eq(request.source.dat_w),
+            slave.sel.eq(request.source.sel),
+            slave.we.eq(request.source.we),
+            slave.cti.eq(request.source.cti),
+            slave.bte.eq(request.source.bte),
+            If(request.source.valid & stale,
+                # Discard reads of older epochs (never presented to the slave).
+                request.source.ready.eq(1),
+            ).Elif(slave.stb & (slave.ack | slave.err),
+                request.source.ready.eq(1),
+                response.sink.valid.eq(~request.source.posted),
+            ),
+            response.sink.adr.eq(request.source.adr),
+            response.sink.dat_r.eq(slave.dat_r),
+            response.sink.err.eq(slave.err),
+            response.sink.we.eq(request.source.we),
+            response.sink.epoch.eq(request.source.epoch),
+            dec.eq((response.source.valid & response.source.ready) + (request.source.valid & stale)),
+        ]
+        self.sync += [
+            If(abort | wr_done,
+                error.eq(0)
+            ),
+            If(slave.stb & slave.err & request.source.posted,
+                error.eq(1)
+            )
+        ]
+
+
+class PipelinedCrossbar(LiteXModule):
+    """Pipelined Wishbone crossbar
+
+    MxN ``Crossbar`` with ``RegisterSlice`` between the masters and the decoders and between the
+    arbiters and the slaves (``register_masters``/``register_slaves``), so that the decoding and
+    arbitration logic is isolated from masters/slaves logic. Incrementing bursts are pipelined
+    through the slices (up to ``depth`` accesses in flight). ``connectivity`` optionally restricts
+    the masters to a subset of the slaves (``connectivity[master][slave]``).
+    """
+    def __init__(self, masters, slaves, register=False, timeout_cycles=1e6, connectivity=None,
+        register_masters = True,
+        register_slaves  = True,
+        depth            = 4):
+        data_width = get_check_parameters(ports=masters + [s for _, s in slaves])
+        adr_width  = max([m.adr_width for m in masters])
+
+        # Master Slices.
+        _masters = []
+        for master in masters:
+            if register_masters:
+                _master = Interface(data_width=data_width, adr_width=adr_width)
+                self.submodules += RegisterSlice(master, _master, depth)
+                master = _master
+            _masters.append(master)
+
+        # Slave Slices.
+        _slaves = []
+        for decoder, slave in slaves:
+            if register_slaves:
+                _slave = Interface(data_width=data_width, adr_width=adr_width)
+                self.submodules += RegisterSlice(_slave, slave, depth)
+                slave = _slave
+            _slaves.append((decoder, slave))
+
+        # Crossbar.
+        self.crossbar = Crossbar(_masters, _slaves,
+            register       = register,
+            timeout_cycles = timeout_cycles,
+            connectivity   = connectivity,
+        )
 
 # Wishbone Data Width Converter --------------------------------------------------------------------
 
@@ -807,3 +1095,416 @@ class Cache(LiteXModule):
                 )
             )
         )
+
+# Set-Associative Cache ----------------------------------------------------------------------------
+
+class SetAssociativeCache(LiteXModule):
+    """Set-Associative Cache
+
+    This module is a N-way set-associative wishbone cache that can be used as a L2 cache. Cachesize
+    (in 32-bit words) is the size of the data store and must be a power of 2, lines are
+    ``line_words`` slave words (default: one master/slave word, as ``Cache``).
+
+    Replacement (``replacement``) is "lru", "plru" (tree pseudo-LRU) or "random", invalid ways being
+    always used first. The cache is write-back/write-allocate or, with ``write_through``, forwards
+    writes to the slave (updating the cache on hits) without allocating on write misses.
+
+    Refills start with the slave word holding the requested word (critical word first, wrapping
+    bursts, or linear bursts restarted at the line wrap for 2 or >16 words lines) and reads are
+    acked as soon as this word is received. Hits, misses and evictions are
+    pulsed on ``hit``/``miss``/``eviction`` and counted in CSRs with ``with_csr``.
+    """
+    def __init__(self, cachesize, master, slave, ways=2, line_words=None, replacement="lru",
+        write_through=False, reverse=True, with_csr=False):
+        self.master   = master
+        self.slave    = slave
+        self.hit      = Signal()
+        self.miss     = Signal()
+        self.eviction = Signal()
+
+        # # #
+
+        # Parameters.
+        # -----------
+        dw_from = len(master.dat_r)
+        dw_to   = len(slave.dat_r)
+        if dw_to > dw_from and (dw_to % dw_from) != 0:
+            raise ValueError("Slave data width must be a multiple of {dw}".format(dw=dw_from))
+        if dw_to < dw_from and (dw_from % dw_to) != 0:
+            raise ValueError("Master data width must be a multiple of {dw}".format(dw=dw_to))
+        if ways not in [2**n for n in range(8)]:
+            raise ValueError("Ways must be a power of 2 (up to 128), not {}".format(ways))
+        if replacement not in ["lru", "plru", "random"]:
+            raise ValueError("Unsupported {} replacement, supported: lru, plru, random".format(replacement))
+        if line_words is None:
+            line_words = max(dw_from//dw_to, 1)
+        if (line_words not in [2**n for n in range(8)]) or (line_words*dw_to < dw_from):
+            raise ValueError("Line words must be a power of 2 (up to 128) and cover a master word")
+        if write_through and (dw_to < dw_from):
+            raise ValueError("Write-through requires a slave data width >= {dw}".format(dw=dw_from))
+        linewidth = dw_to*line_words
+        sets      = (cachesize*32)//(linewidth*ways)
+        if sets < 1:
+            raise ValueError("Cachesize too small for {} ways of {}-bit lines".format(ways, linewidth))
+
+        # Address Split.
+        # --------------
+        # TAG | SET | LINE OFFSET (in master words).
+        mwords     = linewidth//dw_from
+        ratio      = max(dw_to//dw_from, 1)
+        offsetbits = log2_int(mwords)
+        setbits    = log2_int(sets)
+        tagbits    = len(master.adr) - offsetbits - setbits
+        wordbits   = log2_int(line_words)
+        waybits    = log2_int(ways)
+        adr_offset, adr_set, adr_tag = split(master.adr, offsetbits, setbits, tagbits)
+
+        # Request, latched since master is acked before the end of the refills (critical word first).
+        idle     = Signal()
+        offset_r = Signal(max(offsetbits, 1))
+        set_r    = Signal(max(setbits,    1))
+        tag_r    = Signal(tagbits)
+        self.sync += If(idle,
+            *[r.eq(v) for r, v in [(offset_r, adr_offset), (set_r, adr_set), (tag_r, adr_tag)] if v is not None]
+        )
+
+        # Slave Word.
+        # -----------
+        # Evictions start from word 0, refills from the word holding the requested master word.
+        count      = Signal(max(wordbits, 1))
+        count_clr  = Signal()
+        count_inc  = Signal()
+        count_last = Signal()
+        word       = Signal(max(wordbits, 1))
+        evict      = Signal()
+        self.sync += [
+            If(count_clr,
+                count.eq(0),
+            ).Elif(count_inc,
+                count.eq(count + 1)
+            )
+        ]
+        if wordbits:
+            critical = Signal(wordbits)
+            if dw_to >= dw_from:
+                self.comb += critical.eq(offset_r[log2_int(ratio):])
+            else:
+                self.comb += critical.eq(offset_r << log2_int(dw_from//dw_to))
+            self.comb += [
+                count_last.eq(count == (line_words - 1)),
+                word.eq(Mux(evict, count, critical + count)),
+            ]
+        else:
+            self.comb += count_last.eq(1)
+
+        # Data/Tag Memories.
+        # ------------------
+        tag_layout = [("tag", tagbits), ("valid", 1), ("dirty", 1)]
+        mem_adr    = Signal(max(setbits, 1))
+        data_we    = [Signal(linewidth//8) for way in range(ways)]
+        data_dat_w = Signal(linewidth)
+        data_dat_r = []
+        tag_we     = Signal(ways)
+        tag_di     = Record(tag_layout)
+        tag_do     = []
+        if adr_set is not None:
+            self.comb += mem_adr.eq(Mux(idle, adr_set, set_r))
+        for way in range(ways):
+            data_mem  = Memory(linewidth, sets)
+            data_port = data_mem.get_port(write_capable=True, we_granularity=8)
+            tag_mem   = Memory(layout_len(tag_layout), sets)
+            tag_port  = tag_mem.get_port(write_capable=True)
+            self.specials += data_mem, data_port, tag_mem, tag_port
+            way_tag_do = Record(tag_layout)
+            self.comb += [
+                data_port.adr.eq(mem_adr),
+                data_port.we.eq(data_we[way]),
+                data_port.dat_w.eq(data_dat_w),
+                tag_port.adr.eq(mem_adr),
+                tag_port.we.eq(tag_we[way]),
+                tag_port.dat_w.eq(tag_di.raw_bits()),
+                way_tag_do.raw_bits().eq(tag_port.dat_r),
+            ]
+            data_dat_r.append(data_port.dat_r)
+            tag_do.append(way_tag_do)
+        self.comb += tag_di.tag.eq(tag_r)
+
+        # Hit.
+        hit     = Signal()
+        hit_way = Signal(max(waybits, 1))
+        hits    = [tag_do[way].valid & (tag_do[way].tag == tag_r) for way in range(ways)]
+        self.comb += hit.eq(Reduce("OR", hits))
+        for way in reversed(range(ways)):
+            self.comb += If(hits[way], hit_way.eq(way))
+
+        # Replacement.
+        # ------------
+        access      = Signal()
+        access_way  = Signal(max(waybits, 1))
+        invalid     = Signal()
+        victim      = Signal(max(waybits, 1))
+        victim_r    = Signal(max(waybits, 1))
+        victim_tag  = Signal(tagbits)
+        victim_lru  = Signal(max(waybits, 1))
+        self.comb += invalid.eq(Reduce("OR", [~tag_do[way].valid for way in range(ways)]))
+        if ways > 1:
+            # Random: Free-running counter.
+            if replacement == "random":
+                self.sync += victim_lru.eq(victim_lru + 1)
+            # LRU/PLRU: State per set, updated on accesses.
+            else:
+                if replacement == "lru":
+                    # Ways ordered from Most to Least Recently Used.
+                    state_width = ways*waybits
+                    state_init  = sum(way << (way*waybits) for way in range(ways))
+                else:
+                    # Tree nodes (heap order) pointing to the Least Recently Used side.
+                    state_width = ways - 1
+                    state_init  = 0
+                state_mem  = Memory(state_width, sets, init=[state_init]*sets)
+                state_port = state_mem.get_port(write_capable=True)
+                self.specials += state_mem, state_port
+                state = state_port.dat_r
+                self.comb += [
+                    state_port.adr.eq(mem_adr),
+                    state_port.we.eq(access),
+                ]
+                if replacement == "lru":
+                    # Accessed way moved to the front.
+                    order     = [state[i*waybits:(i + 1)*waybits] for i in range(ways)]
+                    new_order = [access_way]
+                    for i in range(1, ways):
+                        moved = Reduce("OR", [order[j] == access_way for j in range(i)])
+                        new_order.append(Mux(moved, order[i - 1], order[i]))
+                    self.comb += [
+                        victim_lru.eq(order[ways - 1]),
+                        state_port.dat_w.eq(Cat(*new_order)),
+                    ]
+                else:
+                    # Follow the nodes from the root.
+                    nodes = Array(state[i] for i in range(ways - 1))
+                    path  = []
+                    for level in range(waybits):
+                        node = Signal(level + 1)
+                        self.comb += node.eq(Cat(*reversed(path), C(1, 1)) - 1)
+                        path.append(nodes[node])
+                    # Nodes on the path of the accessed way point to the other side.
+                    new_state = []
+                    for n in range(1, ways):
+                        level = n.bit_length() - 1
+                        point = ~access_way[waybits - 1 - level]
+                        if level == 0:
+                            new_state.append(point)
+                        else:
+                            on_path = (access_way[waybits - level:] == (n - (1 << level)))
+                            new_state.append(Mux(on_path, point, state[n - 1]))
+                    self.comb += [
+                        victim_lru.eq(Cat(*reversed(path))),
+                        state_port.dat_w.eq(Cat(*new_state)),
+                    ]
+            # Invalid ways first.
+            self.comb += victim.eq(victim_lru)
+            for way in reversed(range(ways)):
+                self.comb += If(~tag_do[way].valid, victim.eq(way))
+
+        # Data Path.
+        # ----------
+        # Master words in lines (reversed in slave words with reverse, as Cache).
+        slots = [(m//ratio)*ratio + ((ratio - 1 - m%ratio) if reverse else m%ratio) for m in range(mwords)]
+        refill      = Signal()
+        master_we   = Signal()
+        master_sel  = Signal(linewidth//8)
+        way_data    = Signal(linewidth)
+        victim_data = Signal(linewidth)
+        cache_dat_r = Signal(dw_from)
+        self.comb += [
+            way_data.eq(Array(data_dat_r)[hit_way]),
+            victim_data.eq(Array(data_dat_r)[victim_r]),
+            Case(offset_r, {m: [
+                master_sel[s*dw_from//8:(s + 1)*dw_from//8].eq(master.sel),
+                cache_dat_r.eq(way_data[s*dw_from:(s + 1)*dw_from]),
+            ] for m, s in enumerate(slots)}),
+        ]
+
+        # Cache writes (from slave on refills, from master on write hits).
+        refill_we = Signal(linewidth//8)
+        self.comb += [
+            displacer(Replicate(1, dw_to//8), word if wordbits else None, refill_we),
+            If(refill,
+                data_dat_w.eq(Replicate(slave.dat_r, line_words)),
+            ).Else(
+                data_dat_w.eq(Replicate(master.dat_w, mwords)),
+            ),
+        ]
+        for way in range(ways):
+            self.comb += If(refill & slave.ack & (victim_r == way),
+                data_we[way].eq(refill_we)
+            ).Elif(master_we & (hit_way == way),
+                data_we[way].eq(master_sel)
+            )
+
+        # Master reads (from slave on critical word first refills).
+        early       = Signal()
+        slave_dat_r = Signal(dw_from)
+        if dw_to >= dw_from:
+            self.comb += chooser(slave.dat_r, offset_r[:log2_int(ratio)] if ratio > 1 else None,
+                slave_dat_r, reverse=reverse)
+        self.comb += If(early,
+            master.dat_r.eq(slave_dat_r)
+        ).Else(
+            master.dat_r.eq(cache_dat_r)
+        )
+
+        # Slave accesses (evictions/refills of lines, write-through of master words).
+        slave_tag   = Signal(tagbits)
+        evict_dat_w = Signal(dw_to)
+        write_sel   = Signal(dw_to//8)
+        self.comb += [
+            slave.adr.eq(Cat(*[s for s, n in [(word, wordbits), (set_r, setbits), (slave_tag, tagbits)] if n])),
+            chooser(victim_data, word if wordbits else None, evict_dat_w),
+            If(evict,
+                slave.dat_w.eq(evict_dat_w)
+            ).Else(
+                slave.dat_w.eq(Replicate(master.dat_w, ratio))
+            ),
+            displacer(master.sel, offset_r[:log2_int(ratio)] if ratio > 1 else None, write_sel, ratio, reverse=reverse),
+        ]
+        burst_cti = [slave.cti.eq(Mux(count_last, CTI_BURST_END, CTI_BURST_INCREMENTING))]
+        wrap_bte  = {4: 0b01, 8: 0b10, 16: 0b11}
+        if line_words in wrap_bte:
+            # Wrapping burst (critical word first).
+            refill_cti = burst_cti + [slave.bte.eq(wrap_bte[line_words])]
+        elif line_words > 1:
+            # No wrapping burst of this size: linear bursts, restarted on the line wrap.
+            refill_cti = [slave.cti.eq(Mux(count_last | (word == (line_words - 1)),
+                CTI_BURST_END, CTI_BURST_INCREMENTING))]
+        else:
+            refill_cti = []
+
+        # FSM.
+        # ----
+        retry = Signal()
+        acked = Signal()
+        self.fsm = fsm = FSM(reset_state="IDLE")
+        self.comb += idle.eq(fsm.ongoing("IDLE"))
+        fsm.act("IDLE",
+            NextValue(retry, 0),
+            If(master.cyc & master.stb,
+                NextState("TEST_HIT")
+            )
+        )
+        fsm.act("TEST_HIT",
+            count_clr.eq(1),
+            If(hit,
+                self.hit.eq(~retry),
+                access.eq(1),
+                access_way.eq(hit_way),
+                If(master.we,
+                    master_we.eq(1),
+                    *([NextState("WRITE")] if write_through else [
+                        master.ack.eq(1),
+                        tag_di.valid.eq(1),
+                        tag_di.dirty.eq(1),
+                        tag_we.eq(1 << hit_way),
+                        NextState("IDLE")
+                    ])
+                ).Else(
+                    master.ack.eq(1),
+                    NextState("IDLE")
+                )
+            ).Else(
+                self.miss.eq(1),
+                *([If(master.we,
+                    # Write miss (no allocate).
+                    NextState("WRITE")
+                ).Else(
+                    NextState("ALLOCATE")
+                )] if write_through else [NextState("ALLOCATE")])
+            )
+        )
+        fsm.act("ALLOCATE",
+            self.eviction.eq(~invalid),
+            access.eq(1),
+            access_way.eq(victim),
+            NextValue(victim_r, victim),
+            NextValue(victim_tag, Array(tag_do[way].tag for way in range(ways))[victim]),
+            NextValue(acked, 0),
+            If(~invalid & Array(tag_do[way].dirty for way in range(ways))[victim],
+                NextState("EVICT")
+            ).Else(
+                NextState("REFILL")
+            )
+        )
+        fsm.act("EVICT",
+            evict.eq(1),
+            slave_tag.eq(victim_tag),
+            slave.stb.eq(1),
+            slave.cyc.eq(1),
+            slave.we.eq(1),
+            slave.sel.eq(2**(dw_to//8)-1),
+            *(burst_cti if line_words > 1 else []),
+            If(slave.ack,
+                count_inc.eq(1),
+                If(count_last,
+                    count_clr.eq(1),
+                    NextState("REFILL")
+                )
+            )
+        )
+        fsm.act("REFILL",
+            refill.eq(1),
+            slave_tag.eq(tag_r),
+            slave.stb.eq(1),
+            slave.cyc.eq(1),
+            slave.we.eq(0),
+            slave.sel.eq(2**(dw_to//8)-1),
+            *refill_cti,
+            If(slave.ack,
+                count_inc.eq(1),
+                # Critical word first: Ack master reads on the first word.
+                *([If((count == 0) & ~master.we,
+                    early.eq(1),
+                    master.ack.eq(1),
+                    NextValue(acked, 1),
+                )] if dw_to >= dw_from else []),
+                If(count_last,
+                    tag_di.valid.eq(1),
+                    tag_we.eq(1 << victim_r),
+                    If(acked | early,
+                        NextState("IDLE")
+                    ).Else(
+                        NextValue(retry, 1),
+                        NextState("TEST_HIT")
+                    )
+                )
+            )
+        )
+        if write_through:
+            fsm.act("WRITE",
+                slave_tag.eq(tag_r),
+                slave.stb.eq(1),
+                slave.cyc.eq(1),
+                slave.we.eq(1),
+                slave.sel.eq(write_sel),
+                If(slave.ack,
+                    master.ack.eq(1),
+                    NextState("IDLE")
+                )
+            )
+
+        # CSRs.
+        if with_csr:
+            self.add_csr()
+
+    def add_csr(self):
+        self._hits      = csr.CSRStatus(32, description="Cache hits.")
+        self._misses    = csr.CSRStatus(32, description="Cache misses.")
+        self._evictions = csr.CSRStatus(32, description="Cache evictions (valid lines replaced).")
+
+        # # #
+
+        self.sync += [
+            If(self.hit,      self._hits.status.eq(self._hits.status + 1)),
+            If(self.miss,     self._misses.status.eq(self._misses.status + 1)),
+            If(self.eviction, self._evictions.status.eq(self._evictions.status + 1)),
+        ]
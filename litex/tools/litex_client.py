@@ -8,21 +8,58 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import os
+import zlib
 import time
+import struct
 import threading
 import argparse
 import socket
+import collections
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
 from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
-from litex.tools.remote.etherbone import EtherboneIPC
+from litex.tools.remote.etherbone import EtherboneIPC, etherbone_max_packet_size
 from litex.tools.remote.csr_builder import CSRBuilder
 
+# Constants ----------------------------------------------------------------------------------------
+
+# Maximum burst length (in words): Etherbone records are limited to 255 reads/writes, which also fits
+# CommUART bursts (256 words) and CommUDP packets (1036 bytes).
+max_burst_length = 255
+
+# Remote Read --------------------------------------------------------------------------------------
+
+class RemoteRead:
+    """Outstanding read request of a RemoteClient, identified by its tag (base_ret_addr)."""
+    def __init__(self, client, tag, addr, length):
+        self.client     = client
+        self.tag        = tag
+        self.addr       = addr
+        self.length     = length
+        self.length_int = 1 if length is None else length
+        self.datas      = None
+        self.error      = None
+
+    def done(self):
+        return (self.datas is not None) or (self.error is not None)
+
+    def result(self):
+        while not self.done():
+            self.client._receive_read()
+        if self.error is not None:
+            raise self.error
+        return self.datas[0] if self.length is None else self.datas
+
 # Remote Client ------------------------------------------------------------------------------------
 
 class RemoteClient(EtherboneIPC, CSRBuilder):
+    """Etherbone client of litex_server.
+
+    On read timeouts, reads return default values (0) unless ``timeout_error`` is set: a
+    ``TimeoutError`` is then raised for all the outstanding reads.
+    """
     def __init__(self, host="localhost", port=1234, base_address=0, csr_csv=None, csr_data_width=None,
-        csr_bus_address_width=None, debug=False):
+        csr_bus_address_width=None, debug=False, window=16, timeout_error=False):
         # If csr_csv set to None and local csr.csv file exists, use it.
         if csr_csv is None and os.path.exists("csr.csv"):
             csr_csv = "csr.csv"
@@ -41,9 +78,18 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
         self.debug        = debug
         self.binded       = False
         self.base_address = base_address if base_address is not None else 0
+        self.window        = window
+        self.timeout_error = timeout_error
+        self.tag           = 0
+        self.tagged       = False
+        self.pending      = collections.deque()
+        self.send_buffer  = bytearray(etherbone_max_packet_size)
 
     def _receive_server_info(self):
-        info = str(self.socket.recv(128))
+        info = self.socket.recv(128).decode("UTF-8", errors="replace")
+
+        # Servers returning the read tags (base_ret_addr) advertise it, legacy ones reply with 0.
+        self.tagged = "tags" in info.split(":")
 
         # With LitePCIe, CSRs are translated to 0 to limit BAR0 size, so also translate base address.
         if "CommPCIe" in info:
@@ -53,6 +99,7 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
         if self.binded:
             return
         self.socket = socket.create_connection((self.host, self.port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.socket.settimeout(2.0)
         self._receive_server_info()
         self.binded = True
@@ -60,7 +107,12 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
     def close(self):
         if not self.binded:
             return
-        self.socket.close()
+        # Complete outstanding reads.
+        try:
+            while self.pending:
+                self._receive_read()
+        finally:
+            self.socket.close()
         del self.socket
         self.binded = False
 
@@ -73,48 +125,110 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
         except (TimeoutError, socket.error):
             pass
 
-    def read(self, addr, length=None, burst="incr"):
-        length_int = 1 if length is None else length
-        addr_size  = self.csr_bus_address_width // 8
+    def _send_read(self, addr, length_int, burst, tag):
+        addr_size = self.csr_bus_address_width // 8
         # Prepare packet
         record = EtherboneRecord(addr_size)
         incr = (burst == "incr")
         record.reads  = EtherboneReads(
-            addr_size = addr_size,
-            addrs     = [self.base_address + addr + 4*incr*j for j in range(length_int)]
+            addr_size     = addr_size,
+            base_ret_addr = tag,
+            addrs         = [self.base_address + addr + 4*incr*j for j in range(length_int)]
         )
         record.rcount = len(record.reads)
 
         # Send packet
         packet = EtherbonePacket(self.csr_bus_address_width)
         packet.records = [record]
-        packet.encode()
+        packet.encode(self.send_buffer)
         self.send_packet(self.socket, packet)
 
+    def _receive_read(self):
+        addr_size = self.csr_bus_address_width // 8
+        request   = self.pending.popleft()
+
         # Receive response
         response = self.receive_packet(self.socket, addr_size)
         if response == 0:
-            # Handle error by returning default values
+            # Complete all outstanding requests (late responses are flushed): with default values or
+            # with a TimeoutError.
+            error = TimeoutError("Read timeout @ 0x{:08x} ({} outstanding read(s)).".format(
+                self.base_address + request.addr, 1 + len(self.pending)))
+            for request in [request] + list(self.pending):
+                if self.timeout_error:
+                    request.error = error
+                else:
+                    request.datas = [0]*request.length_int
+            self.pending.clear()
+            self.clear_socket_buffer()
+            if self.timeout_error:
+                raise error
             if self.debug:
                 print("Timeout occurred during read. Returning default values.")
-            self.clear_socket_buffer()
-            return 0 if length is None else [0] * length_int
+            return
 
         packet = EtherbonePacket(
             addr_width = self.csr_bus_address_width,
             init       = response
         )
         packet.decode()
-        datas = packet.records.pop().writes.get_datas()
+        writes = packet.records.pop().writes
+        # Legacy servers not returning the tag (base_ret_addr) reply with 0.
+        if writes.base_addr != request.tag and (self.tagged or writes.base_addr != 0):
+            raise ValueError(f"Read response tag mismatch: 0x{writes.base_addr:08x} != 0x{request.tag:08x}.")
+        request.datas = writes.get_datas()
         if self.debug:
-            for i, data in enumerate(datas):
-                print("read 0x{:08x} @ 0x{:08x}".format(data, self.base_address + addr + 4*i))
-        return datas[0] if length is None else datas
+            for i, data in enumerate(request.datas):
+                print("read 0x{:08x} @ 0x{:08x}".format(data, self.base_address + request.addr + 4*i))
+
+    def read_async(self, addr, length=None, burst="incr"):
+        """Send a read request without waiting for its response.
 
-    def write(self, addr, datas):
+        Up to ``window`` requests are kept in flight; returns a ``RemoteRead`` whose ``result()``
+        returns the read data (same format as ``read``).
+        """
+        # Non-zero tags, wrapped on the address width (of base_ret_addr).
+        self.tag = (self.tag % (2**self.csr_bus_address_width - 1)) + 1
+        request  = RemoteRead(self, self.tag, addr, length)
+        self._send_read(addr, request.length_int, burst, request.tag)
+        self.pending.append(request)
+        # Limit outstanding requests.
+        while len(self.pending) > self.window:
+            self._receive_read()
+        return request
+
+    def read_many(self, reads):
+        """Read a list of addresses or (addr, length[, burst]) tuples with pipelined requests."""
+        requests = []
+        for read in reads:
+            read = read if isinstance(read, tuple) else (read,)
+            requests.append(self.read_async(*read))
+        return [request.result() for request in requests]
+
+    def read(self, addr, length=None, burst="incr"):
+        return self.read_async(addr, length, burst).result()
+
+    def read_bursts(self, addr, length):
+        """Read ``length`` words from ``addr`` with pipelined bursts, yielding the datas of each burst."""
+        requests = collections.deque()
+        for offset in range(0, length, max_burst_length):
+            requests.append(self.read_async(addr + 4*offset, min(max_burst_length, length - offset)))
+            if len(requests) > self.window:
+                yield requests.popleft().result()
+        while requests:
+            yield requests.popleft().result()
+
+    def write_bursts(self, addr, datas):
+        """Write ``datas`` words to ``addr`` with bursts."""
+        for offset in range(0, len(datas), max_burst_length):
+            self.write(addr + 4*offset, list(datas[offset:offset + max_burst_length]))
+
+    def write(self, addr, datas, burst="incr"):
+        assert burst in ["incr", "fixed"]
         datas = datas if isinstance(datas, list) else [datas]
         addr_size = self.csr_bus_address_width // 8
         record = EtherboneRecord(addr_size)
+        record.wff = int(burst == "fixed") # Fixed burst: Etherbone FIFO writes.
         record.writes = EtherboneWrites(
             base_addr = self.base_address + addr,
             addr_size = addr_size,
@@ -124,12 +238,12 @@ class RemoteClient(EtherboneIPC, CSRBuilder):
 
         packet = EtherbonePacket(self.csr_bus_address_width)
         packet.records = [record]
-        packet.encode()
+        packet.encode(self.send_buffer)
         self.send_packet(self.socket, packet)
 
         if self.debug:
             for i, data in enumerate(datas):
-                print("write 0x{:08x} @ 0x{:08x}".format(data, self.base_address + addr + 4*i))
+                print("write 0x{:08x} @ 0x{:08x}".format(data, self.base_address + addr + 4*i*(burst == "incr")))
 
 # Utils --------------------------------------------------------------------------------------------
 
@@ -160,52 +274,110 @@ def dump_registers(host, csr_csv, port, filter=None, binary=False):
     bus = RemoteClient(host=host, csr_csv=csr_csv, port=port)
     bus.open()
 
+    # Read registers with batched/pipelined requests.
+    values = bus.snapshot(filter=filter)
+
     for name, register in bus.regs.__dict__.items():
-        if (filter is None) or filter in name:
-            register_value = {
-                True  : f"0b{register.read():032b}",
-                False : f"0x{register.read():08x}",
-            }[binary]
-            print("0x{:08x} : {} {}".format(register.addr, register_value, name))
+        if name not in values:
+            continue
+        value = values[name]
+        register_value = {
+            True  : f"0b{value:032b}",
+            False : f"0x{value:08x}",
+        }[binary]
+        print("0x{:08x} : {} {}".format(register.addr, register_value, name))
 
     bus.close()
 
-def read_memory(host, csr_csv, port, addr, length, binary=False, file=None, endianness="little"):
+def _report_throughput(name, length, duration, crc=None):
+    duration = max(duration, 1e-9)
+    r = f"{name} {length} bytes in {duration:.3f}s ({length/duration/1e3:.2f} KB/s)"
+    if crc is not None:
+        r += f", CRC32: 0x{crc:08x}"
+    print(r + ".")
+
+def _words_to_bytes(datas, endianness):
+    return struct.pack({"little": "<", "big": ">"}[endianness] + f"{len(datas)}I", *datas)
+
+def _read_memory_chunks(bus, addr, length, endianness):
+    # Exact length bytes (a partial last word is truncated).
+    for datas in bus.read_bursts(addr, (length + 3) // 4):
+        data    = _words_to_bytes(datas, endianness)[:length]
+        length -= len(data)
+        yield data
+
+def _read_memory_crc(bus, addr, length, endianness):
+    crc = 0
+    for data in _read_memory_chunks(bus, addr, length, endianness):
+        crc = zlib.crc32(data, crc)
+    return crc
+
+def read_memory(host, csr_csv, port, addr, length, binary=False, file=None, endianness="little",
+    verify=False):
     bus = RemoteClient(host=host, csr_csv=csr_csv, port=port)
     bus.open()
 
     if file:
-        # Read from memory and write to file in binary mode
+        # Read from memory (with bursts) and stream to file in binary mode
+        start = time.time()
+        crc   = 0
         with open(file, 'wb') as f:
-            for offset in range(length // 4):
-                data = bus.read(addr + 4 * offset)
-                f.write(data.to_bytes(4, byteorder=endianness))
+            for data in _read_memory_chunks(bus, addr, length, endianness):
+                crc = zlib.crc32(data, crc)
+                f.write(data)
+        _report_throughput("Read", length, time.time() - start, crc)
+
+        # Verify by reading memory again and comparing CRCs.
+        if verify:
+            if _read_memory_crc(bus, addr, length, endianness) != crc:
+                raise ValueError("Read verification failed: CRC mismatch.")
+            print("Read verification: OK.")
     else:
         # Print to console
-        for offset in range(length // 4):
-            register_value = {
-                True  : f"0b{bus.read(addr + 4 * offset):032b}",
-                False : f"0x{bus.read(addr + 4 * offset):08x}",
-            }[binary]
-            print(f"0x{addr + 4 * offset:08x} : {register_value}")
+        offset = 0
+        for datas in bus.read_bursts(addr, length // 4):
+            for data in datas:
+                register_value = {
+                    True  : f"0b{data:032b}",
+                    False : f"0x{data:08x}",
+                }[binary]
+                print(f"0x{addr + 4 * offset:08x} : {register_value}")
+                offset += 1
 
     bus.close()
 
-def write_memory(host, csr_csv, port, addr, data, file=None, length=None, endianness="little"):
+def write_memory(host, csr_csv, port, addr, data, file=None, length=None, endianness="little",
+    verify=False):
     bus = RemoteClient(host=host, csr_csv=csr_csv, port=port)
     bus.open()
 
     if file:
-        # Read from file and write to memory
+        # Read from file (by chunks) and write to memory with bursts
+        start   = time.time()
+        crc     = 0
+        written = 0
+        chunk   = 4*max_burst_length*bus.window
+        fmt     = {"little": "<", "big": ">"}[endianness]
         with open(file, 'rb') as f:
-            if length:
-                data = f.read(length)
-            else:
-                data = f.read()
-            # Write data in 32-bit chunks
-            for i in range(0, len(data), 4):
-                word = int.from_bytes(data[i:i + 4], byteorder=endianness)
-                bus.write(addr + i, word)
+            while (length is None) or (written < length):
+                data = f.read(chunk if length is None else min(chunk, length - written))
+                if not data:
+                    break
+                # 32-bit words, partial last word zero-padded (CRC is computed on the exact data).
+                padded = data + bytes(-len(data) % 4)
+                words  = list(struct.unpack(fmt + f"{len(padded)//4}I", padded))
+                bus.write_bursts(addr + written, words)
+                crc      = zlib.crc32(data, crc)
+                written += len(data)
+        # Writes are not acknowledged: synchronize with a read before reporting throughput.
+        bus.read(addr)
+        _report_throughput("Wrote", written, time.time() - start, crc)
+
+        # Verify by reading back memory and comparing CRCs.
+        if verify:
+            if _read_memory_crc(bus, addr, written, endianness) != crc:
+                raise ValueError("Write verification failed: CRC mismatch.")
+            print("Write verification: OK.")
     else:
         # Write single data value to memory
         bus.write(addr, data)
@@ -301,7 +473,7 @@ def run_gui(host, csr_csv, port):
             return []
 
         aligned_len = (length + 3) & ~3  # Round up to nearest multiple of 4
-        words       = bus.read(base, aligned_len // 4, burst="incr")
+        words       = [word for datas in bus.read_bursts(base, aligned_len // 4) for word in datas]
         out         = []
 
         for word in words:
@@ -650,6 +822,7 @@ def main():
     parser.add_argument("--read",       default=None,            help="Do a MMAP Read to SoC bus (--read addr/reg).")
     parser.add_argument("--write",      default=None, nargs="*", help="Do a MMAP Write to SoC bus (--write addr/reg [data]).")
     parser.add_argument("--length",     default="4",             help="MMAP access length.")
+    parser.add_argument("--verify",     action="store_true",     help="Verify MMAP file Read/Write by CRC (with a second read).")
 
     # GUI.
     parser.add_argument("--gui",        action="store_true",     help="Run GUI.")
@@ -694,6 +867,7 @@ def main():
             binary     = args.binary,
             file       = args.file,
             endianness = args.endianness,
+            verify     = args.verify,
         )
 
     # Memory Write.
@@ -720,6 +894,7 @@ def main():
             file       = args.file,
             length     = int(args.length, 0) if args.length else None,
             endianness = args.endianness,
+            verify     = args.verify,
         )
 
     # GUI.
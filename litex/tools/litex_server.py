@@ -14,10 +14,15 @@ import os
 import sys
 import socket
 import time
+import warnings
+import selectors
 import threading
+import collections
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord, EtherboneWrites
-from litex.tools.remote.etherbone import EtherboneIPC
+from litex.tools.remote.etherbone import EtherboneIPC, get_packet_size
+from litex.tools.remote.etherbone import etherbone_packet_header_length, etherbone_record_header_length
+from litex.tools.remote.etherbone import etherbone_magic, etherbone_max_packet_size
 
 # Read Merger --------------------------------------------------------------------------------------
 
@@ -69,13 +74,51 @@ def _read_merger(addrs, max_length=256, bursts=["incr", "fixed"]):
 
 # Remote Server ------------------------------------------------------------------------------------
 
+class _RemoteServerClient:
+    """Client connection: socket, receive buffer and queue of pending Etherbone records."""
+    def __init__(self, socket, addr):
+        self.socket  = socket
+        self.addr    = addr
+        self.buffer  = bytearray()
+        self.records = collections.deque()
+        self.closed  = False
+
+    def send(self, data):
+        if self.closed:
+            return
+        try:
+            self.socket.sendall(data)
+        except OSError:
+            self.closed = True
+
+    def close(self):
+        # Shutdown only, socket is unregistered/closed by the I/O thread on the resulting EOF.
+        self.closed = True
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
 class RemoteServer(EtherboneIPC):
-    def __init__(self, comm, bind_ip, bind_port=1234, addr_width=32):
-        self.comm       = comm
-        self.bind_ip    = bind_ip
-        self.bind_port  = bind_port
-        self.lock       = False
-        self.addr_width = addr_width
+    """Etherbone TCP server sharing a Comm (UART, JTAG, UDP, PCIe, USB) between several clients.
+
+    A single I/O thread accepts clients and decodes their Etherbone packets (with a selector) to
+    queue them per client; a single hardware worker drains the queues in round-robin, so clients
+    are served fairly and never compete for the Comm. With ``coalesce`` enabled, pending reads from
+    the different clients are executed together, allowing the read merger to group them in bursts.
+    """
+    def __init__(self, comm, bind_ip, bind_port=1234, addr_width=32, coalesce=False):
+        self.comm        = comm
+        self.bind_ip     = bind_ip
+        self.bind_port   = bind_port
+        self.addr_width  = addr_width
+        self.coalesce    = coalesce
+        self.clients     = collections.deque()
+        self.condition   = threading.Condition()
+        self.running     = False
+        self.threads     = []
+        self.send_buffer = bytearray(etherbone_max_packet_size)
 
     def open(self):
         if hasattr(self, "socket"):
@@ -87,10 +130,11 @@ class RemoteServer(EtherboneIPC):
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind((self.bind_ip, self.bind_port))
         print("tcp port: {:d}".format(self.bind_port))
-        self.socket.listen(1)
+        self.socket.listen()
         self.comm.open()
 
     def close(self):
+        self.stop()
         self.comm.close()
         if not hasattr(self, "socket"):
             return
@@ -103,77 +147,202 @@ class RemoteServer(EtherboneIPC):
         info.append(f"{self.comm.__class__.__name__}")
         info.append(f"{self.bind_ip}")
         info.append(f"{self.bind_port}")
+        info.append("tags") # Read responses return the request tag (base_ret_addr).
         info = ":".join(info)
         client_socket.sendall(bytes(info, "UTF-8"))
 
+    # Clients (I/O thread) -------------------------------------------------------------------------
+
+    def _accept(self, selector):
+        client_socket, addr = self.socket.accept()
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._send_server_info(client_socket)
+        print("Connected with " + addr[0] + ":" + str(addr[1]))
+        client = _RemoteServerClient(client_socket, addr)
+        selector.register(client_socket, selectors.EVENT_READ, client)
+        with self.condition:
+            self.clients.append(client)
+
+    def _disconnect(self, selector, client):
+        print("Disconnect")
+        selector.unregister(client.socket)
+        with self.condition:
+            client.closed = True
+            client.records.clear()
+            self.clients.remove(client)
+        client.socket.close()
+
+    def _receive(self, selector, client):
+        try:
+            data = client.socket.recv(65536)
+        except OSError:
+            data = b""
+        if len(data) == 0:
+            self._disconnect(selector, client)
+            return
+
+        # Extract complete Etherbone packets and queue their record.
+        addr_size     = self.addr_width // 8
+        header_length = etherbone_packet_header_length + etherbone_record_header_length
+        client.buffer += data
+        records = []
+        try:
+            while len(client.buffer) >= header_length:
+                packet_size = get_packet_size(client.buffer, addr_size)
+                if len(client.buffer) < packet_size:
+                    break
+                packet = EtherbonePacket(self.addr_width, bytes(client.buffer[:packet_size]))
+                packet.decode()
+                if packet.magic != etherbone_magic:
+                    raise ValueError("Invalid magic 0x{:04x}.".format(packet.magic))
+                records.append(packet.records.pop())
+                del client.buffer[:packet_size]
+        # Malformed packet: only disconnect this client.
+        except Exception as e:
+            print("Invalid packet from {}:{} ({}).".format(client.addr[0], client.addr[1], repr(e)))
+            self._disconnect(selector, client)
+            return
+        if records:
+            with self.condition:
+                client.records.extend(records)
+                self.condition.notify()
+
     def _serve_thread(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.socket, selectors.EVENT_READ, None)
+            while self.running:
+                for key, events in selector.select(timeout=0.1):
+                    if key.data is None:
+                        self._accept(selector)
+                    else:
+                        self._receive(selector, key.data)
+            for key in list(selector.get_map().values()):
+                if key.data is not None:
+                    self._disconnect(selector, key.data)
+
+    # Hardware (worker thread) ---------------------------------------------------------------------
+
+    def _next_requests(self):
+        """Return the next (client, record) requests to execute, in round-robin over the clients.
+
+        One record is returned unless coalescing is enabled: the reads-only records at the head of
+        each client queue are then returned together.
+        """
+        requests = []
+        for n in range(len(self.clients)):
+            client = self.clients[0]
+            if client.records:
+                record = client.records[0]
+                # Records with writes are executed alone, client will be served first next time.
+                if requests and (record.writes is not None):
+                    break
+                requests.append((client, client.records.popleft()))
+            self.clients.rotate(-1)
+            if requests and ((not self.coalesce) or (requests[-1][1].writes is not None)):
+                break
+        return requests
+
+    def _read(self, addrs):
+        max_length = {
+            "CommUART": 256,
+            "CommUDP":    1,
+        }.get(self.comm.__class__.__name__, 1)
+        bursts = {
+            "CommUART": ["incr", "fixed"]
+        }.get(self.comm.__class__.__name__, ["incr"])
+        reads  = []
+        merged = list(_read_merger(addrs,
+            max_length  = max_length,
+            bursts      = bursts))
+        # Batch bursts when supported by the Comm.
+        if hasattr(self.comm, "read_many"):
+            for datas in self.comm.read_many(merged):
+                reads += datas
+        else:
+            for addr, length, burst in merged:
+                reads += self.comm.read(addr, length, burst)
+        return reads
+
+    def _write(self, addr, datas, fifo=False):
+        # FIFO (fixed address) writes.
+        if fifo:
+            if self.comm.__class__.__name__ in ["CommUART"]:
+                self.comm.write(addr, datas, burst="fixed")
+            else:
+                for data in datas:
+                    self.comm.write(addr, data)
+        # Incrementing writes.
+        else:
+            self.comm.write(addr, datas)
+
+    def _reply(self, client, tag, reads):
+        addr_size = self.addr_width // 8
+        record = EtherboneRecord(addr_size)
+        record.writes = EtherboneWrites(addr_size=addr_size, base_addr=tag, datas=reads)
+        record.wcount = len(record.writes)
+
+        packet = EtherbonePacket(self.addr_width)
+        packet.records = [record]
+        packet.encode(self.send_buffer)
+        client.send(packet.bytes)
+
+    def _worker_thread(self):
         while True:
-            client_socket, addr = self.socket.accept()
-            self._send_server_info(client_socket)
-            print("Connected with " + addr[0] + ":" + str(addr[1]))
+            with self.condition:
+                requests = self._next_requests()
+                while self.running and not requests:
+                    self.condition.wait()
+                    requests = self._next_requests()
+                if not self.running:
+                    return
+
             try:
-                # Serve Etherbone reads/writes.
-                while True:
-                    # Receive packet.
-                    try:
-                        packet = self.receive_packet(client_socket, self.addr_width // 8)
-                        if packet == 0:
-                            break
-                    except:
-                        break
-                    # Decode Packet.
-                    packet = EtherbonePacket(self.addr_width, packet)
-                    packet.decode()
-
-                    # Get Packet's Record.
-                    record = packet.records.pop()
-
-                    # Hardware lock/reservation.
-                    while self.lock:
-                        time.sleep(0.01)
-                    self.lock = True
-
-                    # Handle Etherbone writes.
-                    if record.writes != None:
-                        self.comm.write(record.writes.base_addr, record.writes.get_datas())
-
-                    # Handle Etherbone reads.
-                    if record.reads != None:
-                        max_length = {
-                            "CommUART": 256,
-                            "CommUDP":    1,
-                        }.get(self.comm.__class__.__name__, 1)
-                        bursts = {
-                            "CommUART": ["incr", "fixed"]
-                        }.get(self.comm.__class__.__name__, ["incr"])
-                        reads = []
-                        for addr, length, burst in _read_merger(record.reads.get_addrs(),
-                            max_length  = max_length,
-                            bursts      = bursts):
-                            reads += self.comm.read(addr, length, burst)
-
-                        addr_size = self.addr_width // 8
-                        record = EtherboneRecord(addr_size)
-                        record.writes = EtherboneWrites(addr_size=addr_size, datas=reads)
-                        record.wcount = len(record.writes)
-
-                        packet = EtherbonePacket(self.addr_width)
-                        packet.records = [record]
-                        packet.encode()
-                        self.send_packet(client_socket, packet)
-
-                    # Release hardware lock.
-                    self.lock = False
-
-            finally:
-                print("Disconnect")
-                client_socket.close()
-
-    def start(self, nthreads):
-        for i in range(nthreads):
-            self.serve_thread = threading.Thread(target=self._serve_thread)
-            self.serve_thread.setDaemon(True)
-            self.serve_thread.start()
+                self._execute(requests)
+            # Comm error: close the clients of the failed requests (instead of leaving them waiting
+            # for their responses) and continue serving the others.
+            except Exception as e:
+                print("Comm error ({}), closing {} client(s).".format(repr(e), len(requests)))
+                for client, record in requests:
+                    client.close()
+
+    def _execute(self, requests):
+        # Handle Etherbone writes.
+        for client, record in requests:
+            if record.writes != None:
+                self._write(record.writes.base_addr, record.writes.get_datas(), record.wff)
+
+        # Handle Etherbone reads (of all requests at once when coalesced).
+        requests = [(client, record) for client, record in requests if record.reads != None]
+        if not requests:
+            return
+        addrs = []
+        for client, record in requests:
+            addrs += record.reads.get_addrs()
+        reads = self._read(addrs)
+        for client, record in requests:
+            self._reply(client, record.reads.base_ret_addr, reads[:record.rcount])
+            reads = reads[record.rcount:]
+
+    def start(self, nthreads=None):
+        if nthreads is not None:
+            warnings.warn("RemoteServer.start: nthreads is deprecated and ignored, clients are "
+                "served by a single I/O thread.", DeprecationWarning, stacklevel=2)
+        self.running = True
+        for target in [self._serve_thread, self._worker_thread]:
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        if not self.running:
+            return
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
 
 # Run ----------------------------------------------------------------------------------------------
 
@@ -184,11 +353,13 @@ def main():
     parser.add_argument("--bind-port",       default=1234,           help="Host bind port.")
     parser.add_argument("--addr-width",      default=32,             help="bus address width.")
     parser.add_argument("--debug",           action="store_true",    help="Enable debug.")
+    parser.add_argument("--coalesce",        action="store_true",    help="Coalesce reads from the different clients.")
 
     # UART arguments
     parser.add_argument("--uart",            action="store_true",    help="Select UART interface.")
     parser.add_argument("--uart-port",       default=None,           help="Set UART port.")
     parser.add_argument("--uart-baudrate",   default=115200,         help="Set UART baudrate.")
+    parser.add_argument("--uart-rx-fifo-depth", default=0,           help="UARTBone RX FIFO depth (allows pipelining commands).")
 
     # JTAG arguments
     parser.add_argument("--jtag",            action="store_true",             help="Select JTAG interface.")
@@ -204,6 +375,10 @@ def main():
     # PCIe arguments
     parser.add_argument("--pcie",            action="store_true",    help="Select PCIe interface.")
     parser.add_argument("--pcie-bar",        default=None,           help="Set PCIe BAR.")
+    parser.add_argument("--pcie-bench",      action="store_true",    help="Run PCIe BAR throughput benchmark and exit.")
+    parser.add_argument("--pcie-bench-addr", default="0",            help="PCIe benchmark BAR offset.")
+    parser.add_argument("--pcie-bench-size", default="16384",        help="PCIe benchmark size (in bytes).")
+    parser.add_argument("--pcie-bench-write", action="store_true",   help="Also benchmark writes (writes back read data).")
 
     # USB arguments
     parser.add_argument("--usb",             action="store_true",    help="Select USB interface.")
@@ -222,7 +397,11 @@ def main():
         uart_port = args.uart_port
         uart_baudrate = int(float(args.uart_baudrate))
         print("[CommUART] port: {} / baudrate: {} / ".format(uart_port, uart_baudrate), end="")
-        comm = CommUART(uart_port, uart_baudrate, debug=args.debug, addr_width=int(args.addr_width))
+        comm = CommUART(uart_port, uart_baudrate,
+            debug         = args.debug,
+            addr_width    = int(args.addr_width),
+            rx_fifo_depth = int(args.uart_rx_fifo_depth),
+        )
 
     # JTAG mode
     elif args.jtag:
@@ -261,6 +440,18 @@ def main():
             exit()
         print("[CommPCIe] bar: {} / ".format(pcie_bar), end="")
         comm = CommPCIe(pcie_bar, debug=args.debug)
+        if args.pcie_bench:
+            print("")
+            comm.open()
+            results = comm.benchmark(
+                addr   = int(args.pcie_bench_addr, 0),
+                length = int(args.pcie_bench_size, 0)//4,
+                write  = args.pcie_bench_write,
+            )
+            comm.close()
+            for name, throughput in results.items():
+                print("[CommPCIe] {:5s}: {:.2f} MB/s".format(name, throughput))
+            exit()
 
     # USB mode
     elif args.usb:
@@ -281,9 +472,12 @@ def main():
         parser.print_help()
         exit()
 
-    server = RemoteServer(comm, args.bind_ip, int(args.bind_port), addr_width=int(args.addr_width))
+    server = RemoteServer(comm, args.bind_ip, int(args.bind_port),
+        addr_width = int(args.addr_width),
+        coalesce   = args.coalesce,
+    )
     server.open()
-    server.start(4)
+    server.start()
     try:
         import time
         while True: time.sleep(100)
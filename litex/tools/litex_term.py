@@ -17,6 +17,11 @@ import threading
 import argparse
 import json
 import socket
+import array
+import collections
+import queue
+import binascii
+import select
 
 # Console ------------------------------------------------------------------------------------------
 
@@ -86,7 +91,16 @@ else:
 from litex import RemoteClient
 
 class CrossoverUART:
-    def __init__(self, name="uart_xover", host="localhost", base_address=None, csr_csv=None):
+    """Crossover UART bridge to a pty.
+
+    A single thread bridges the pty and the crossover UART: each poll reads the levels (``levels``
+    CSR when present, else the status CSRs in a single burst), writes the pending pty data and reads
+    the available crossover data with fixed bursts. Polling interval is adapted: immediate while
+    data is transferred, then increased up to ``max_poll_interval`` when idle.
+    """
+    def __init__(self, name="uart_xover", host="localhost", base_address=None, csr_csv=None,
+        max_poll_interval = 10e-3,
+        max_buffer_size   = 4096):
         self.bus = RemoteClient(host=host, base_address=base_address, csr_csv=csr_csv)
         present = False
         for k, v in self.bus.regs.d.items():
@@ -95,39 +109,66 @@ class CrossoverUART:
                 present = True
         if not present:
             raise ValueError(f"CrossoverUART {name} not present in design.")
+        self.max_poll_interval = max_poll_interval
+        self.max_buffer_size   = max_buffer_size
 
     def open(self):
         self.bus.open()
         self.file, self.name = pty.openpty()
         self.alive = True
-        self.pty2crossover_thread = threading.Thread(target=self.pty2crossover, daemon=True)
-        self.crossover2pty_thread = threading.Thread(target=self.crossover2pty, daemon=True)
-        self.pty2crossover_thread.start()
-        self.crossover2pty_thread.start()
+        self.bridge_thread = threading.Thread(target=self.bridge, daemon=True)
+        self.bridge_thread.start()
 
     def close(self):
-        self.bus.close()
         self.alive = False
-        self.pty2crossover_thread.join(timeout=0.1)
-        self.crossover2pty_thread.join(timeout=0.1)
-
-    def pty2crossover(self):
-        while self.alive:
-            r = os.read(self.file, 1)
-            self.rxtx.write(ord(r))
+        self.bridge_thread.join(timeout=0.1)
+        self.bus.close()
 
-    def crossover2pty(self):
+    def get_levels(self):
+        # Return number of bytes that can be read from/written to the crossover.
+        if hasattr(self, "levels"):
+            levels = self.levels.read()
+            return (levels >> 0) & 0xffff, (levels >> 16) & 0xffff
+        # No levels CSR: read status registers in a single burst.
+        registers = [self.txfull, self.rxempty, self.rxfull]
+        base   = min(r.addr for r in registers)
+        length = (max(r.addr for r in registers) - base)//4 + 1
+        datas  = self.bus.read(base, length=length)
+        txfull, rxempty, rxfull = [r.decode(datas[(r.addr - base)//4:][:r.length]) for r in registers]
+        rx = 16 if rxfull else (0 if rxempty else 1)
+        tx = 0 if txfull else 1
+        return rx, tx
+
+    def bridge(self):
+        buffer   = bytearray()
+        interval = 0
         while self.alive:
-            if self.rxfull.read():
-                length = 16
-            elif not self.rxempty.read():
-                length = 1
+            # Get pty data (waiting up to polling interval).
+            if len(buffer) < self.max_buffer_size:
+                r, w, x = select.select([self.file], [], [], interval)
+                if r:
+                    buffer += os.read(self.file, self.max_buffer_size - len(buffer))
+            elif interval:
+                time.sleep(interval)
+
+            rx, tx = self.get_levels()
+
+            # pty --> Crossover.
+            tx = min(tx, len(buffer))
+            if tx:
+                self.bus.write(self.rxtx.addr, list(buffer[:tx]), burst="fixed")
+                del buffer[:tx]
+
+            # Crossover --> pty.
+            if rx:
+                datas = self.bus.read(self.rxtx.addr, length=rx, burst="fixed")
+                os.write(self.file, bytes(datas))
+
+            # Adapt polling interval.
+            if rx or tx:
+                interval = 0
             else:
-                time.sleep(1e-3)
-                continue
-            r = self.bus.read(self.rxtx.addr, length=length, burst="fixed")
-            for v in r:
-                os.write(self.file, bytes(chr(v).encode("utf-8")))
+                interval = min(max(2*interval, 100e-6), self.max_poll_interval)
 
 # JTAG UART ----------------------------------------------------------------------------------------
 
@@ -242,47 +283,29 @@ class SFLFrame:
 
 # CRC16 --------------------------------------------------------------------------------------------
 
-crc16_table = [
-    0x0000, 0x1021, 0x2042, 0x3063, 0x4084, 0x50A5, 0x60C6, 0x70E7,
-    0x8108, 0x9129, 0xA14A, 0xB16B, 0xC18C, 0xD1AD, 0xE1CE, 0xF1EF,
-    0x1231, 0x0210, 0x3273, 0x2252, 0x52B5, 0x4294, 0x72F7, 0x62D6,
-    0x9339, 0x8318, 0xB37B, 0xA35A, 0xD3BD, 0xC39C, 0xF3FF, 0xE3DE,
-    0x2462, 0x3443, 0x0420, 0x1401, 0x64E6, 0x74C7, 0x44A4, 0x5485,
-    0xA56A, 0xB54B, 0x8528, 0x9509, 0xE5EE, 0xF5CF, 0xC5AC, 0xD58D,
-    0x3653, 0x2672, 0x1611, 0x0630, 0x76D7, 0x66F6, 0x5695, 0x46B4,
-    0xB75B, 0xA77A, 0x9719, 0x8738, 0xF7DF, 0xE7FE, 0xD79D, 0xC7BC,
-    0x48C4, 0x58E5, 0x6886, 0x78A7, 0x0840, 0x1861, 0x2802, 0x3823,
-    0xC9CC, 0xD9ED, 0xE98E, 0xF9AF, 0x8948, 0x9969, 0xA90A, 0xB92B,
-    0x5AF5, 0x4AD4, 0x7AB7, 0x6A96, 0x1A71, 0x0A50, 0x3A33, 0x2A12,
-    0xDBFD, 0xCBDC, 0xFBBF, 0xEB9E, 0x9B79, 0x8B58, 0xBB3B, 0xAB1A,
-    0x6CA6, 0x7C87, 0x4CE4, 0x5CC5, 0x2C22, 0x3C03, 0x0C60, 0x1C41,
-    0xEDAE, 0xFD8F, 0xCDEC, 0xDDCD, 0xAD2A, 0xBD0B, 0x8D68, 0x9D49,
-    0x7E97, 0x6EB6, 0x5ED5, 0x4EF4, 0x3E13, 0x2E32, 0x1E51, 0x0E70,
-    0xFF9F, 0xEFBE, 0xDFDD, 0xCFFC, 0xBF1B, 0xAF3A, 0x9F59, 0x8F78,
-    0x9188, 0x81A9, 0xB1CA, 0xA1EB, 0xD10C, 0xC12D, 0xF14E, 0xE16F,
-    0x1080, 0x00A1, 0x30C2, 0x20E3, 0x5004, 0x4025, 0x7046, 0x6067,
-    0x83B9, 0x9398, 0xA3FB, 0xB3DA, 0xC33D, 0xD31C, 0xE37F, 0xF35E,
-    0x02B1, 0x1290, 0x22F3, 0x32D2, 0x4235, 0x5214, 0x6277, 0x7256,
-    0xB5EA, 0xA5CB, 0x95A8, 0x8589, 0xF56E, 0xE54F, 0xD52C, 0xC50D,
-    0x34E2, 0x24C3, 0x14A0, 0x0481, 0x7466, 0x6447, 0x5424, 0x4405,
-    0xA7DB, 0xB7FA, 0x8799, 0x97B8, 0xE75F, 0xF77E, 0xC71D, 0xD73C,
-    0x26D3, 0x36F2, 0x0691, 0x16B0, 0x6657, 0x7676, 0x4615, 0x5634,
-    0xD94C, 0xC96D, 0xF90E, 0xE92F, 0x99C8, 0x89E9, 0xB98A, 0xA9AB,
-    0x5844, 0x4865, 0x7806, 0x6827, 0x18C0, 0x08E1, 0x3882, 0x28A3,
-    0xCB7D, 0xDB5C, 0xEB3F, 0xFB1E, 0x8BF9, 0x9BD8, 0xABBB, 0xBB9A,
-    0x4A75, 0x5A54, 0x6A37, 0x7A16, 0x0AF1, 0x1AD0, 0x2AB3, 0x3A92,
-    0xFD2E, 0xED0F, 0xDD6C, 0xCD4D, 0xBDAA, 0xAD8B, 0x9DE8, 0x8DC9,
-    0x7C26, 0x6C07, 0x5C64, 0x4C45, 0x3CA2, 0x2C83, 0x1CE0, 0x0CC1,
-    0xEF1F, 0xFF3E, 0xCF5D, 0xDF7C, 0xAF9B, 0xBFBA, 0x8FD9, 0x9FF8,
-    0x6E17, 0x7E36, 0x4E55, 0x5E74, 0x2E93, 0x3EB2, 0x0ED1, 0x1EF0
-]
-
-
 def crc16(l):
-    crc = 0
-    for d in l:
-        crc = crc16_table[((crc >> 8) ^ d) & 0xff] ^ (crc << 8)
-    return crc & 0xffff
+    # CRC-16/XMODEM (CCITT polynomial 0x1021, zero init), as computed by the BIOS.
+    return binascii.crc_hqx(bytes(l), 0)
+
+# SFL Load Frames ----------------------------------------------------------------------------------
+
+def sfl_encode_load_frames(data, address, length=sfl_payload_length - 4):
+    """Encode SFL load frames of ``data`` (to ``address``, ``length`` bytes per frame) in a single
+    buffer; returns the buffer and the frames offsets (frame n is buffer[offsets[n]:offsets[n+1]])."""
+    nframes = (len(data) + length - 1)//length
+    buffer  = bytearray(len(data) + 8*nframes)
+    offsets = array.array("Q", [0])
+    offset  = 0
+    for position in range(0, len(data), length):
+        chunk = data[position:position + length]
+        # Header: payload length, CRC, cmd, address.
+        payload = (address + position).to_bytes(4, "big")
+        crc     = binascii.crc_hqx(chunk, binascii.crc_hqx(sfl_cmd_load + payload, 0))
+        buffer[offset:offset + 8] = bytes([len(chunk) + 4]) + crc.to_bytes(2, "big") + sfl_cmd_load + payload
+        buffer[offset + 8:offset + 8 + len(chunk)] = chunk
+        offset += 8 + len(chunk)
+        offsets.append(offset)
+    return buffer, offsets
 
 # LiteXTerm ----------------------------------------------------------------------------------------
 
@@ -356,15 +379,20 @@ class LiteXTerm:
                 return 0
         return 1
 
-    def receive_upload_response(self):
-        reply = self.port.read()
-        if reply == sfl_ack_success:
-            return True
-        elif reply == sfl_ack_crcerror:
-            print("[LITEX-TERM] Upload to device failed due to data corruption (CRC error)")
-        else:
-            print(f"[LITEX-TERM] Got unexpected response from device '{reply}'")
-        sys.exit(1)
+    def port_in_waiting(self):
+        # Port wrappers (Crossover/JTAG/Nios2) may not expose pySerial's in_waiting property.
+        in_waiting = getattr(self.port, "in_waiting", 0)
+        if callable(in_waiting):
+            in_waiting = in_waiting()
+        return int(in_waiting or 0)
+
+    def port_set_timeout(self, timeout):
+        # Port wrappers without a timeout attribute keep their (blocking) behaviour.
+        if not hasattr(self.port, "timeout"):
+            return None
+        previous = self.port.timeout
+        self.port.timeout = timeout
+        return previous
 
     def upload_calibration(self, address):
 
@@ -400,7 +428,7 @@ class LiteXTerm:
                 # Wait and get acks.
                 working = True
                 time.sleep(0.2)
-                while self.port.in_waiting:
+                while self.port_in_waiting():
                     ack = self.port.read()
                     #print(ack)
                     if ack in [sfl_ack_error, sfl_ack_crcerror]:
@@ -431,10 +459,9 @@ class LiteXTerm:
             self.outstanding = 0
 
     def upload(self, filename, address):
-        f = open(filename, "rb")
-        f.seek(0, 2)
-        length = f.tell()
-        f.seek(0, 0)
+        with open(filename, "rb") as f:
+            data = f.read()
+        length = len(data)
 
         print(f"[LITEX-TERM] Uploading {filename} to 0x{address:08x} ({length} bytes)...")
 
@@ -447,59 +474,122 @@ class LiteXTerm:
                 self.length      = 64
                 self.outstanding = 0
 
-        # Prepare parameters
-        current_address = address
-        position        = 0
-        start           = time.time()
-        remaining       = length
-        outstanding     = 0
-        while remaining:
-            # Show progress
-            sys.stdout.write("|{}>{}| {}%\r".format(
-                "=" * (20*position//length),
-                " " * (20-20*position//length),
-                100*position//length))
-            sys.stdout.flush()
-
-            # Send frame if max outstanding not reached.
-            if outstanding <= self.outstanding:
-                # Prepare frame.
-                frame      = SFLFrame()
-                frame.cmd  = sfl_cmd_load
-                frame_data = f.read(min(remaining, self.length-4))
-                frame.payload = current_address.to_bytes(4, "big")
-                frame.payload += frame_data
-
-                # Encode frame and send it.
-                self.port.write(frame.encode())
-
-                # Update parameters
-                current_address += len(frame_data)
-                position        += len(frame_data)
-                remaining       -= len(frame_data)
-                outstanding     += 1
-
-                # Inter-frame delay.
-                time.sleep(self.delay)
-
-            # Read response if available.
-            while self.port.in_waiting:
-                ack = self.receive_upload_response()
-                if ack:
-                    outstanding -= 1
-                    break
-
-        # Get remaining responses.
-        for _ in range(outstanding):
-            self.receive_upload_response()
+        # Encode frames.
+        frames, offsets = sfl_encode_load_frames(data, address, self.length - 4)
+        frames  = memoryview(frames)
+        nframes = len(offsets) - 1
+
+        # Start ack reader.
+        acks    = queue.Queue()
+        timeout = self.port_set_timeout(50e-3)
+        self.ack_reader_alive = True
+        ack_reader_thread = threading.Thread(target=self.ack_reader, args=(acks,), daemon=True)
+        ack_reader_thread.start()
+
+        # Send frames with a sliding window on acks (acks are received in frames order), window is
+        # halved on errors and increased again after a window of successful frames.
+        max_window = self.outstanding + 1
+        window     = max_window
+        successes  = 0
+        failures   = 0
+        inflight   = collections.deque() # Frames sent, waiting for an ack.
+        retransmit = collections.deque() # Frames to retransmit.
+        current    = 0                   # Next new frame to send.
+        done       = 0                   # Acknowledged frames.
+        stats      = {"retransmissions": 0, "crc_errors": 0, "errors": 0}
+        progress   = -1
+        start      = time.time()
+        try:
+            while done < nframes:
+                # Send frames (consecutive frames with a single write when no inter-frame delay).
+                sends = []
+                while (len(inflight) + len(sends) < window) and (retransmit or current < nframes):
+                    if retransmit:
+                        sends.append(retransmit.popleft())
+                        stats["retransmissions"] += 1
+                    else:
+                        sends.append(current)
+                        current += 1
+                while sends:
+                    n = 1
+                    while (not self.delay) and (n < len(sends)) and (sends[n] == sends[0] + n):
+                        n += 1
+                    self.port.write(frames[offsets[sends[0]]:offsets[sends[0] + n]])
+                    inflight.extend(sends[:n])
+                    sends = sends[n:]
+                    if self.delay:
+                        time.sleep(self.delay)
+
+                # Get ack.
+                try:
+                    ack = acks.get(timeout=1.0)
+                except queue.Empty:
+                    ack = None
+                frame = inflight.popleft() if inflight else None
+                if ack == sfl_ack_success:
+                    done      += 1
+                    successes += 1
+                    failures   = 0
+                    if successes >= window:
+                        successes = 0
+                        window    = min(window + 1, max_window)
+                # Error (CRC error, timeout, unexpected reply): acks can't be associated to frames
+                # anymore (frames boundaries lost), wait for the device to resynchronize and
+                # retransmit all frames in flight.
+                else:
+                    stats["crc_errors" if ack == sfl_ack_crcerror else "errors"] += 1
+                    failures += 1
+                    if failures > 16:
+                        print(f"[LITEX-TERM] Upload failed, got unexpected response from device '{ack}'.")
+                        sys.exit(1)
+                    successes = 0
+                    window    = max(window//2, 1)
+                    self.ack_resync(acks)
+                    if frame is not None:
+                        inflight.appendleft(frame)
+                    retransmit.extendleft(reversed(inflight))
+                    inflight.clear()
+
+                # Show progress.
+                if (100*done//nframes) != progress:
+                    progress = 100*done//nframes
+                    sys.stdout.write("|{}>{}| {}%\r".format(
+                        "=" * (20*progress//100),
+                        " " * (20-20*progress//100),
+                        progress))
+                    sys.stdout.flush()
+        finally:
+            self.ack_reader_alive = False
+            ack_reader_thread.join()
+            self.port_set_timeout(timeout)
 
         # Compute speed.
         end     = time.time()
         elapsed = end - start
-        print("[LITEX-TERM] Upload complete ({0:.1f}KB/s).".format(length/(elapsed*1024)))
-        f.close()
+        print("[LITEX-TERM] Upload complete ({0:.1f}KB/s, {1} frames, {2} retransmissions).".format(
+            length/(elapsed*1024), nframes, stats["retransmissions"]))
         return length
 
+    def ack_reader(self, acks):
+        # Without port timeout, only read available bytes: the reader then always stops (and does
+        # not consume console bytes once the upload is done).
+        blocking = not hasattr(self.port, "timeout")
+        while self.ack_reader_alive:
+            in_waiting = self.port_in_waiting()
+            if blocking and (in_waiting == 0):
+                time.sleep(1e-3)
+                continue
+            for ack in self.port.read(max(in_waiting, 1)):
+                acks.put(bytes([ack]))
+
+    def ack_resync(self, acks, quiet=0.3):
+        # Discard acks until quiet (longer than the device's frame timeout: 250ms).
+        while True:
+            try:
+                acks.get(timeout=quiet)
+            except queue.Empty:
+                return
+
     def boot(self):
         print("[LITEX-TERM] Booting the device.")
         frame = SFLFrame()
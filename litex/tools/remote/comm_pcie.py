@@ -5,17 +5,24 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 import os
-import ctypes
 import mmap
+import time
+import array
 
 from litex.tools.remote.csr_builder import CSRBuilder
 
 # CommPCIe -----------------------------------------------------------------------------------------
 
 class CommPCIe(CSRBuilder):
+    """PCIe BAR Comm.
+
+    The BAR is accessed through a 32-bit memoryview of its mmap: ranges are read/written with 32-bit
+    accesses (bursts are converted in a single pass, without per-word ctypes objects). ``bar`` can
+    also be a regular file (ex on a tmpfs) standing in for the BAR.
+    """
     def __init__(self, bar, csr_csv=None, debug=False):
         CSRBuilder.__init__(self, comm=self, csr_csv=csr_csv)
-        if "/sys/bus/pci/devices" not in bar:
+        if not os.path.isfile(bar) and "/sys/bus/pci/devices" not in bar:
             bar = f"/sys/bus/pci/devices/0000:{bar}/resource0"
         self.bar   = bar
         self.debug = debug
@@ -24,7 +31,10 @@ class CommPCIe(CSRBuilder):
 
     def enable(self):
         # Enable PCIe device is not already enabled.
-        enable = open(self.bar.replace("resource0", "enable"), "r+")
+        enable_file = self.bar.replace("resource0", "enable")
+        if not os.path.exists(enable_file):
+            return
+        enable = open(enable_file, "r+")
         if enable.read(1) == "0":
             enable.seek(0)
             enable.write("1")
@@ -33,33 +43,64 @@ class CommPCIe(CSRBuilder):
     def open(self):
         if hasattr(self, "file"):
             return
-        self.file = os.open(self.bar, os.O_RDWR | os.O_SYNC)
-        self.mmap = mmap.mmap(self.file, 0)
+        self.file  = os.open(self.bar, os.O_RDWR | os.O_SYNC)
+        self.mmap  = mmap.mmap(self.file, 0)
+        self.words = memoryview(self.mmap).cast("I")
 
     def close(self):
         if not hasattr(self, "file"):
             return
-        self.file.close()
-        del self.file
+        self.words.release()
         self.mmap.close()
+        os.close(self.file)
+        del self.file
 
     def read(self, addr, length=None, burst="incr"):
-        assert burst == "incr"
-        data = []
+        assert addr % 4 == 0
         length_int = 1 if length is None else length
-        for i in range(length_int):
-            value = ctypes.c_uint32.from_buffer(self.mmap, addr + 4*i).value
-            if self.debug:
-                print("read 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
-            if length is None:
-                return value
-            data.append(value)
-        return data
+        if burst == "incr":
+            data = self.words[addr//4:addr//4 + length_int].tolist()
+        else:
+            data = [self.words[addr//4] for i in range(length_int)]
+        if self.debug:
+            for i, value in enumerate(data):
+                print("read 0x{:08x} @ 0x{:08x}".format(value, addr + 4*(burst == "incr")*i))
+        return data[0] if length is None else data
+
+    def read_bulk(self, addr, length):
+        """Read ``length`` 32-bit words from ``addr``, returned as an ``array("I")``."""
+        return array.array("I", self.read(addr, length))
 
     def write(self, addr, data):
-        data = data if isinstance(data, list) else [data]
-        length = len(data)
+        assert addr % 4 == 0
+        # Data can be a value, a list/array of 32-bit words or bytes.
+        if isinstance(data, int):
+            data = [data]
+        elif isinstance(data, (bytes, bytearray, memoryview)):
+            data = memoryview(data).cast("B").cast("I")
+        # Write words one by one (memoryview slice assignments can be done with wider accesses).
+        words = self.words
+        base  = addr//4
         for i, value in enumerate(data):
-            ctypes.c_uint32.from_buffer(self.mmap, addr + 4*i).value = value
-            if self.debug:
+            words[base + i] = value
+        if self.debug:
+            for i, value in enumerate(data):
                 print("write 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
+
+    def benchmark(self, addr=0, length=4096, duration=1.0, write=False):
+        """Measure read (and optionally write) throughput over ``length`` words at ``addr``.
+
+        Writes write back the data previously read; returns a dict of throughputs in MB/s.
+        """
+        results = {}
+        data    = self.read_bulk(addr, length)
+        for name, access in [("read", lambda: self.read(addr, length)), ("write", lambda: self.write(addr, data))]:
+            if name == "write" and not write:
+                continue
+            count = 0
+            start = time.time()
+            while (time.time() - start) < duration:
+                access()
+                count += 1
+            results[name] = 4*length*count/(time.time() - start)/1e6
+        return results
@@ -4,8 +4,9 @@
 # Copyright (c) 2015-2020 Florent Kermarrec <florent@enjoy-digital.fr>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import sys
+import array
 import serial
-import struct
 
 from litex.tools.remote.csr_builder import CSRBuilder
 
@@ -19,12 +20,25 @@ CMD_READ_BURST_FIXED  = 0x04
 # CommUART -----------------------------------------------------------------------------------------
 
 class CommUART(CSRBuilder):
-    def __init__(self, port, baudrate=115200, csr_csv=None, debug=False, addr_width=32):
+    """UARTBone/JTAGBone Comm.
+
+    Commands are assembled in a single buffer and responses read in bulk. Bursts are limited to
+    ``max_burst_length`` words so that a command completes within the UARTBone timeout (100ms);
+    without RX FIFO, write bursts are limited to 8 words.
+
+    With ``rx_fifo_depth`` set to the depth of the UARTBone RX FIFO (UARTBone ``rx_fifo_depth``),
+    read commands are pipelined: next commands are sent while the previous responses are still
+    being returned (without RX FIFO, bytes received while UARTBone is sending data are lost).
+    """
+    def __init__(self, port, baudrate=115200, csr_csv=None, debug=False, addr_width=32, rx_fifo_depth=0):
         CSRBuilder.__init__(self, comm=self, csr_csv=csr_csv)
-        self.port       = serial.serial_for_url(port, baudrate)
-        self.baudrate   = str(baudrate)
-        self.debug      = debug
-        self.addr_bytes = addr_width // 8
+        self.port          = serial.serial_for_url(port, baudrate)
+        self.baudrate      = str(baudrate)
+        self.debug         = debug
+        self.addr_bytes    = addr_width // 8
+        self.rx_fifo_depth = rx_fifo_depth
+        # Limit bursts to ~50ms of transfer (10-bit per byte, 4-byte per word).
+        self.max_burst_length = min(255, max(8, int(baudrate*50e-3/10/4)))
 
     def open(self):
         if hasattr(self, "port"):
@@ -55,41 +69,90 @@ class CommUART(CSRBuilder):
         if self.port.inWaiting() > 0:
             self.port.read(self.port.inWaiting())
 
-    def read(self, addr, length=None, burst="incr"):
+    def _command(self, cmd, addr, length):
+        # Length of 256 is encoded as 0 by UARTBone.
+        return bytes([cmd, length & 0xff]) + (addr//4).to_bytes(self.addr_bytes, byteorder="big")
+
+    def _bursts(self, addr, length, burst, max_length=None):
+        # Split an access in bursts of up to max_length (default: max_burst_length) words.
+        incr       = (burst == "incr")
+        max_length = self.max_burst_length if max_length is None else max_length
+        for offset in range(0, length, max_length):
+            yield (addr + 4*incr*offset, min(max_length, length - offset))
+
+    def read_many(self, reads):
+        """Read a list of addresses or (addr, length[, burst]) tuples, with batched commands."""
+        # Split reads in bursts/commands.
+        requests = []
+        commands = []
+        for read in reads:
+            read = read if isinstance(read, tuple) else (read,)
+            addr, length, burst = read + (None, "incr")[len(read) - 1:]
+            length_int = 1 if length is None else length
+            cmd = {
+                "incr" : CMD_READ_BURST_INCR,
+                "fixed": CMD_READ_BURST_FIXED,
+            }[burst]
+            requests.append((addr, length, length_int))
+            for burst_addr, burst_length in self._bursts(addr, length_int, burst):
+                commands.append((self._command(cmd, burst_addr, burst_length), burst_length))
+
+        # Send commands and receive responses: commands sent after the first one of a batch are
+        # buffered by UARTBone (and must fit in its RX FIFO).
         self._flush()
-        data       = []
-        length_int = 1 if length is None else length
-        cmd        = {
-            "incr" : CMD_READ_BURST_INCR,
-            "fixed": CMD_READ_BURST_FIXED,
-        }[burst]
-        self._write([cmd, length_int])
-        self._write(list((addr//4).to_bytes(self.addr_bytes, byteorder="big")))
-        for i in range(length_int):
-            value = int.from_bytes(self._read(4), "big")
+        datas = array.array("I")
+        while commands:
+            batch    = bytearray(commands[0][0])
+            length   = commands[0][1]
+            buffered = 0
+            n        = 1
+            while (n < len(commands)) and (buffered + len(commands[n][0]) <= self.rx_fifo_depth):
+                batch    += commands[n][0]
+                length   += commands[n][1]
+                buffered += len(commands[n][0])
+                n        += 1
+            self._write(batch)
+            datas.frombytes(self._read(4*length))
+            commands = commands[n:]
+        if sys.byteorder == "little":
+            datas.byteswap()
+        datas = datas.tolist()
+
+        # Return datas of each read.
+        r = []
+        offset = 0
+        for addr, length, length_int in requests:
+            values = datas[offset:offset + length_int]
             if self.debug:
-                print("read 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
-            if length is None:
-                return value
-            data.append(value)
-        return data
+                for i, value in enumerate(values):
+                    print("read 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
+            r.append(values[0] if length is None else values)
+            offset += length_int
+        return r
+
+    def read(self, addr, length=None, burst="incr"):
+        return self.read_many([(addr, length, burst)])[0]
 
     def write(self, addr, data, burst="incr"):
         self._flush()
-        data   = data if isinstance(data, list) else [data]
-        length = len(data)
-        offset = 0
-        while length:
-            size = min(length, 8)
-            cmd = {
-                "incr" : CMD_WRITE_BURST_INCR,
-                "fixed": CMD_WRITE_BURST_FIXED,
-            }[burst]
-            self._write([cmd, size])
-            self._write(list(((addr//4 + offset).to_bytes(self.addr_bytes, byteorder="big"))))
-            for i, value in enumerate(data[offset:offset+size]):
-                self._write(list(value.to_bytes(4, byteorder="big")))
-                if self.debug:
-                    print("write 0x{:08x} @ 0x{:08x}".format(value, addr + offset, 4*i))
-            offset += size
-            length -= size
+        data = data if isinstance(data, list) else [data]
+        cmd  = {
+            "incr" : CMD_WRITE_BURST_INCR,
+            "fixed": CMD_WRITE_BURST_FIXED,
+        }[burst]
+        # Assemble all bursts in a single buffer. Without UARTBone RX FIFO, keep write bursts to 8
+        # words (as UARTBone has to drain each word to the bus before the next one is received).
+        buf        = bytearray()
+        offset     = 0
+        max_length = None if self.rx_fifo_depth else 8
+        for burst_addr, burst_length in self._bursts(addr, len(data), burst, max_length):
+            words = array.array("I", data[offset:offset + burst_length])
+            if sys.byteorder == "little":
+                words.byteswap()
+            buf    += self._command(cmd, burst_addr, burst_length)
+            buf    += words.tobytes()
+            offset += burst_length
+        self._write(buf)
+        if self.debug:
+            for i, value in enumerate(data):
+                print("write 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
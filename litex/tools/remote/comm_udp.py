@@ -5,18 +5,50 @@
 # Copyright (c) 2016 Tim 'mithro' Ansell <mithro@mithis.com>
 # SPDX-License-Identifier: BSD-2-Clause
 
-import socket
 import time
+import socket
+import selectors
+import collections
 
 from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
 from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
 
 from litex.tools.remote.csr_builder import CSRBuilder
 
+# UDP Request --------------------------------------------------------------------------------------
+
+class _UDPRequest:
+    """Tagged Etherbone read record in flight (tag is used as base_ret_addr)."""
+    def __init__(self, tag, addrs, retransmit=True):
+        self.tag        = tag
+        self.addrs      = addrs
+        self.retransmit = retransmit
+        self.sent       = None
+        self.retries    = 0
+        self.datas      = None
+
 # CommUDP ------------------------------------------------------------------------------------------
 
 class CommUDP(CSRBuilder):
-    def __init__(self, server="192.168.1.50", port=1234, csr_csv=None, debug=False, timeout=1.0, addr_width=32):
+    """Etherbone over UDP Comm.
+
+    Reads are split in tagged records (``base_ret_addr``) kept in flight in a sliding ``window``
+    of records; each record is retransmitted individually when its reply is not received before the
+    retransmission timeout (RTO, adapted from the measured round-trip time). ``records_per_packet``
+    records can be packed in each UDP packet (when supported by the Etherbone server/core).
+
+    A lost reply can not be distinguished from a lost request, so a retransmitted read may be
+    executed twice: only idempotent reads are retransmitted (with ``retransmit``). "fixed" bursts
+    (FIFOs) and reads declared non-idempotent (``read_many(..., idempotent=False)``, for example
+    clear-on-read registers) are never retransmitted and time out after ``timeout``.
+    """
+    def __init__(self, server="192.168.1.50", port=1234, csr_csv=None, debug=False, timeout=1.0, addr_width=32,
+        window             = 16,
+        records_per_packet = 1,
+        max_record_reads   = 255,
+        max_retries        = 10,
+        retransmit         = True,
+        local_port         = None):
         CSRBuilder.__init__(self, comm=self, csr_csv=csr_csv)
         self.server = server
         self.port   = port
@@ -24,12 +56,20 @@ class CommUDP(CSRBuilder):
         self.timeout= timeout
         self.read_counter = 0
         self.addr_width   = addr_width
+        self.window             = window
+        self.records_per_packet = records_per_packet
+        self.max_record_reads   = max_record_reads
+        self.max_retries        = max_retries
+        self.retransmit         = retransmit
+        self.local_port         = port if local_port is None else local_port
+        self.min_rto            = 5e-3
+        self.reset_stats()
 
     def open(self, probe=True):
         if hasattr(self, "socket"):
             return
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(("", self.port))
+        self.socket.bind(("", self.local_port))
         self.socket.settimeout(self.timeout)
         if probe:
             self.probe(self.server, self.port)
@@ -81,57 +121,172 @@ class CommUDP(CSRBuilder):
             if self.probe(ip=ip.format(str(i)), port=self.port, loose=True):
                 print("- {}".format(ip.format(i)))
 
-    def read(self, addr, length=None, burst="incr"):
-        assert burst == "incr"
-        length_int = 1 if length is None else length
+    # Statistics ---------------------------------------------------------------------------------
 
-        retries = 10
+    def reset_stats(self):
+        self.srtt   = None
+        self.rttvar = None
+        self.rto    = self.timeout
+        self.stats  = {
+            "requests"        : 0, # Read records sent (without retransmissions).
+            "packets"         : 0, # UDP packets sent (with retransmissions).
+            "retransmissions" : 0, # Read records retransmitted.
+            "stale"           : 0, # Replies received for already completed records.
+            "rtt_count"       : 0,
+            "rtt_min"         : None,
+            "rtt_max"         : None,
+            "rtt_sum"         : 0.0,
+        }
 
-        for r in range(retries):
-            self.read_counter += 1
+    def get_stats(self):
+        """Return statistics (counters, loss ratio and RTT min/avg/max in seconds)."""
+        stats = dict(self.stats)
+        stats["loss"]    = stats["retransmissions"]/max(stats["requests"], 1)
+        stats["rtt_avg"] = stats["rtt_sum"]/stats["rtt_count"] if stats["rtt_count"] else None
+        stats["rto"]     = self.rto
+        return stats
+
+    def _update_rtt(self, rtt):
+        # RTT statistics.
+        stats = self.stats
+        stats["rtt_count"] += 1
+        stats["rtt_sum"]   += rtt
+        stats["rtt_min"]    = rtt if stats["rtt_min"] is None else min(stats["rtt_min"], rtt)
+        stats["rtt_max"]    = rtt if stats["rtt_max"] is None else max(stats["rtt_max"], rtt)
+        # RTO estimation (RFC 6298), bounded by timeout.
+        if self.srtt is None:
+            self.srtt   = rtt
+            self.rttvar = rtt/2
+        else:
+            self.rttvar = 0.75*self.rttvar + 0.25*abs(self.srtt - rtt)
+            self.srtt   = 0.875*self.srtt  + 0.125*rtt
+        self.rto = min(max(self.srtt + 4*self.rttvar, self.min_rto), self.timeout)
 
+    # Reads ----------------------------------------------------------------------------------------
+
+    def _send_requests(self, requests):
+        packet = EtherbonePacket(addr_width=self.addr_width)
+        for request in requests:
             record = EtherboneRecord(addr_size=self.addr_width//8)
-            record.reads = EtherboneReads(addr_size=self.addr_width//8, addrs=[addr+4*j for j in range(length_int)])
+            record.reads = EtherboneReads(addr_size=self.addr_width//8,
+                base_ret_addr = request.tag,
+                addrs         = request.addrs)
             record.rcount = len(record.reads)
-            record.reads.base_ret_addr = self.read_counter
+            packet.records.append(record)
+        packet.encode()
+        self.socket.sendto(packet.bytes, (self.server, self.port))
+        self.stats["packets"] += 1
+        now = time.monotonic()
+        for request in requests:
+            request.sent = now
 
-            packet = EtherbonePacket(addr_width=self.addr_width)
-            packet.records = [record]
-            packet.encode()
+    def _receive_replies(self, pending):
+        # Receive all available replies.
+        while True:
+            try:
+                datas, dummy = self.socket.recvfrom(8192)
+            except (BlockingIOError, socket.timeout):
+                return
+            now    = time.monotonic()
+            packet = EtherbonePacket(self.addr_width, datas)
+            packet.decode()
+            for record in packet.records:
+                if record.writes is None:
+                    continue
+                request = pending.pop(record.writes.base_addr, None)
+                if request is None:
+                    self.stats["stale"] += 1
+                    if self.debug:
+                        print(f"WARNING: stale/unknown response id: 0x{record.writes.base_addr:08x}")
+                    continue
+                request.datas = record.writes.get_datas()
+                # Only sample RTT on records that have not been retransmitted (Karn's algorithm).
+                if request.retries == 0:
+                    self._update_rtt(now - request.sent)
 
-            self.socket.sendto(packet.bytes, (self.server, self.port))
+    def read_many(self, reads, idempotent=True):
+        """Read a list of addresses or (addr, length[, burst]) tuples, with pipelined records.
 
-            timed_out = False
-            while True:
-                try:
-                    datas, dummy = self.socket.recvfrom(8192)
-                except socket.timeout:
-                    if self.debug:
-                        print("socket timeout, retrying ({}/{})".format(r+1, retries))
-                    timed_out = True
-                    break
-
-                packet = EtherbonePacket(self.addr_width, datas)
-                packet.decode()
-                record = packet.records.pop()
-                datas = record.writes.get_datas()
-                if record.writes.base_addr == self.read_counter:
-                    break
-                else:
-                    if self.debug:
-                        print(f"WARNING: request/response id mismatch: 0x{self.read_counter:08x} != 0x{record.writes.base_addr:08x}")
+        Lost records are retransmitted when the reads are ``idempotent`` (and not "fixed" bursts).
+        """
+        # Split reads in records.
+        requests   = []
+        addrs      = []
+        retransmit = []
+        for read in reads:
+            read = read if isinstance(read, tuple) else (read,)
+            addr, length, burst = read + (None, "incr")[len(read) - 1:]
+            length_int = 1 if length is None else length
+            addrs      += [addr + 4*j*(burst == "incr") for j in range(length_int)]
+            retransmit += [self.retransmit and idempotent and (burst != "fixed")]*length_int
+            requests.append((addr, length, length_int))
+        records = collections.deque()
+        for n in range(0, len(addrs), self.max_record_reads):
+            self.read_counter = (self.read_counter + 1) % 2**self.addr_width
+            records.append(_UDPRequest(self.read_counter, addrs[n:n + self.max_record_reads],
+                retransmit = all(retransmit[n:n + self.max_record_reads])))
+        ordered = list(records)
 
-            if not timed_out:
-                break
+        # Send/Receive records.
+        pending  = collections.OrderedDict()
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        self.socket.setblocking(False)
+        try:
+            while records or pending:
+                # Fill window.
+                while records and (len(pending) < self.window):
+                    n     = min(self.records_per_packet, self.window - len(pending), len(records))
+                    batch = [records.popleft() for i in range(n)]
+                    for request in batch:
+                        pending[request.tag] = request
+                    self._send_requests(batch)
+                    self.stats["requests"] += n
 
-        else:
-            raise socket.timeout
+                # Wait for replies until next retransmission (or timeout) deadline.
+                def expiration(request):
+                    return request.sent + (self.rto if request.retransmit else self.timeout)
+                deadline = min(expiration(request) for request in pending.values())
+                if selector.select(max(deadline - time.monotonic(), 0)):
+                    self._receive_replies(pending)
 
-        if self.debug:
-            for i, value in enumerate(datas):
-                print("read 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
+                # Retransmit expired records (with exponential backoff of the RTO).
+                now     = time.monotonic()
+                expired = [request for request in pending.values() if now >= expiration(request)]
+                if expired:
+                    self.rto = min(2*self.rto, self.timeout)
+                for request in expired:
+                    if not request.retransmit:
+                        raise socket.timeout
+                    request.retries += 1
+                    if request.retries > self.max_retries:
+                        raise socket.timeout
+                    if self.debug:
+                        print("socket timeout, retrying ({}/{})".format(request.retries, self.max_retries))
+                    self.stats["retransmissions"] += 1
+                    # Move to the end of pending (oldest first).
+                    pending.move_to_end(request.tag)
+                for n in range(0, len(expired), self.records_per_packet):
+                    self._send_requests(expired[n:n + self.records_per_packet])
+        finally:
+            selector.close()
+            self.socket.settimeout(self.timeout)
+
+        # Return datas of each read.
+        datas  = [data for request in ordered for data in request.datas]
+        r      = []
+        offset = 0
+        for addr, length, length_int in requests:
+            values = datas[offset:offset + length_int]
+            if self.debug:
+                for i, value in enumerate(values):
+                    print("read 0x{:08x} @ 0x{:08x}".format(value, addr + 4*i))
+            r.append(values[0] if length is None else values)
+            offset += length_int
+        return r
 
-        return datas[0] if length is None else datas
+    def read(self, addr, length=None, burst="incr"):
+        return self.read_many([(addr, length, burst)])[0]
 
     def write(self, addr, datas):
         datas = datas if isinstance(datas, list) else [datas]
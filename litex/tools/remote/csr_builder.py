@@ -5,7 +5,13 @@
 # Copyright (c) 2016 Tim 'mithro' Ansell <mithro@mithis.com>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import os
 import csv
+import json
+import pickle
+import hashlib
+import tempfile
+from array import array
 
 # CSR Elements -------------------------------------------------------------------------------------
 
@@ -37,7 +43,9 @@ class CSRRegister:
     def read(self):
         if self.mode not in ["rw", "ro"]:
             raise KeyError(self.name + "register not readable")
-        datas = self.readfn(self.addr, length=self.length)
+        return self.decode(self.readfn(self.addr, length=self.length))
+
+    def decode(self, datas):
         if isinstance(datas, int):
             return datas
         else:
@@ -61,12 +69,140 @@ class CSRMemoryRegion:
         self.size = size
         self.type = type
 
+# CSR Map ------------------------------------------------------------------------------------------
+
+# Version of the CSR map cache format, to increase when CSRMap is modified.
+csr_map_cache_version = 1
+
+class CSRMap:
+    """Compiled CSR map of a csr.csv/csr.json file.
+
+    Registers are stored as address/length arrays and modes list, indexed by ``index`` (name to
+    register index); bases/constants/memories are stored as dicts.
+    """
+    def __init__(self):
+        self.bases     = {}
+        self.constants = {}
+        self.memories  = {}
+        self.names     = []
+        self.addrs     = array("Q")
+        self.lengths   = array("I")
+        self.modes     = []
+        self.index     = {}
+
+    def add_register(self, name, addr, length, mode):
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.addrs.append(addr)
+        self.lengths.append(length)
+        self.modes.append(mode)
+
+    @classmethod
+    def from_csv(cls, csr_csv):
+        csr_map = cls()
+        for group, name, value, length, mode in CSRBuilder.get_csr_items(csr_csv):
+            if group == "csr_base":
+                csr_map.bases[name] = int(value, 16)
+            elif group == "csr_register":
+                csr_map.add_register(name, int(value, 16), int(length), mode)
+            elif group == "constant":
+                try:
+                    csr_map.constants[name] = int(value)
+                except ValueError:
+                    csr_map.constants[name] = value
+            elif group == "memory_region":
+                csr_map.memories[name] = (int(value, 16), int(length), mode)
+        return csr_map
+
+    @classmethod
+    def from_json(cls, csr_json):
+        csr_map = cls()
+        with open(csr_json) as f:
+            d = json.load(f)
+        csr_map.bases.update(d["csr_bases"])
+        for name, register in d["csr_registers"].items():
+            csr_map.add_register(name, register["addr"], register["size"], register["type"])
+        csr_map.constants.update(d["constants"])
+        for name, memory in d["memories"].items():
+            csr_map.memories[name] = (memory["base"], memory["size"], memory["type"])
+        return csr_map
+
+    @classmethod
+    def from_file(cls, filename):
+        if filename.endswith(".json"):
+            return cls.from_json(filename)
+        return cls.from_csv(filename)
+
+
+def csr_map_cache_dir():
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "litex", "csr")
+
+def _file_sha256(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_csr_map(filename, cache_dir=None):
+    """Load the CSRMap of a csr.csv/csr.json file through a persistent cache.
+
+    Cache entries are keyed on the file path and validated against the file's mtime/size (and
+    content hash when these have changed); the file is only parsed on cache misses.
+    """
+    cache_dir = csr_map_cache_dir() if cache_dir is None else cache_dir
+    filename  = os.path.abspath(filename)
+    stat      = os.stat(filename)
+    cache     = os.path.join(cache_dir, hashlib.sha256(filename.encode()).hexdigest() + ".pickle")
+
+    # Load cache entry.
+    entry = None
+    try:
+        with open(cache, "rb") as f:
+            entry = pickle.load(f)
+        if (entry["version"], entry["filename"]) != (csr_map_cache_version, filename):
+            entry = None
+    except Exception:
+        entry = None
+
+    # Cache hit: same mtime/size (or same content), else parse file.
+    if (entry is not None) and ((entry["mtime"], entry["size"]) == (stat.st_mtime_ns, stat.st_size)):
+        return entry["csr_map"]
+    sha256 = _file_sha256(filename)
+    if (entry is not None) and (entry["sha256"] == sha256):
+        csr_map = entry["csr_map"]
+    else:
+        csr_map = CSRMap.from_file(filename)
+
+    # Update cache (atomically, caches are shared between concurrent clients).
+    entry = {
+        "version"  : csr_map_cache_version,
+        "filename" : filename,
+        "mtime"    : stat.st_mtime_ns,
+        "size"     : stat.st_size,
+        "sha256"   : sha256,
+        "csr_map"  : csr_map,
+    }
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError:
+        pass
+    return csr_map
+
 # CSR Builder --------------------------------------------------------------------------------------
 
 class CSRBuilder:
-    def __init__(self, comm, csr_csv, csr_data_width=None, csr_bus_address_width=None):
+    """CSRs access from a csr.csv/csr.json file.
+
+    The CSR map is loaded through ``load_csr_map`` (unless ``csr_cache`` is False); ``regs``,
+    ``bases`` and ``mems`` are built on first access.
+    """
+    def __init__(self, comm, csr_csv, csr_data_width=None, csr_bus_address_width=None, csr_cache=True):
         if csr_csv is not None:
-            self.items     = self.get_csr_items(csr_csv)
+            self.csr_csv   = csr_csv
+            self.csr_map   = load_csr_map(csr_csv) if csr_cache else CSRMap.from_file(csr_csv)
             self.constants = self.build_constants()
 
             # Load csr_data_width from the constants, otherwise it must be provided
@@ -91,47 +227,78 @@ class CSRBuilder:
 
             self.csr_data_width        = csr_data_width
             self.csr_bus_address_width = csr_bus_address_width
-            self.bases = self.build_bases()
-            self.regs  = self.build_registers(comm.read, comm.write)
-            self.mems  = self.build_memories()
+            self.csr_comm              = comm
+
+    def __getattr__(self, attr):
+        # Lazy build of the CSR elements.
+        builders = {
+            "items" : lambda: self.get_csr_items(self.csr_csv),
+            "bases" : self.build_bases,
+            "regs"  : lambda: self.build_registers(self.csr_comm.read, self.csr_comm.write),
+            "mems"  : self.build_memories,
+        }
+        if (attr in builders) and ("csr_map" in self.__dict__):
+            value = builders[attr]()
+            setattr(self, attr, value)
+            return value
+        raise AttributeError(f"{self.__class__.__name__!r} object has no attribute {attr!r}")
 
     @staticmethod
     def get_csr_items(csr_csv):
-        return list(csv.reader(filter(lambda row: row[0] != "#", open(csr_csv))))
+        with open(csr_csv) as f:
+            return list(csv.reader(filter(lambda row: row[0] != "#", f)))
 
     def build_bases(self):
-        d = {}
-        for item in self.items:
-            group, name, addr, dummy0, dummy1 = item
-            if group == "csr_base":
-                d[name] = int(addr.replace("0x", ""), 16)
-        return CSRElements(d)
+        return CSRElements(dict(self.csr_map.bases))
 
     def build_registers(self, readfn, writefn):
+        csr_map = self.csr_map
         d = {}
-        for item in self.items:
-            group, name, addr, length, mode = item
-            if group == "csr_register":
-                addr = int(addr.replace("0x", ""), 16)
-                length = int(length)
-                d[name] = CSRRegister(readfn, writefn, name, addr, length, self.csr_data_width, mode)
+        for name, addr, length, mode in zip(csr_map.names, csr_map.addrs, csr_map.lengths, csr_map.modes):
+            d[name] = CSRRegister(readfn, writefn, name, addr, length, self.csr_data_width, mode)
         return CSRElements(d)
 
     def build_constants(self):
-        d = {}
-        for item in self.items:
-            group, name, value, dummy0, dummy1 = item
-            if group == "constant":
-                try:
-                    d[name] = int(value)
-                except:
-                    d[name] = value
-        return CSRElements(d)
+        return CSRElements(dict(self.csr_map.constants))
 
     def build_memories(self):
         d = {}
-        for item in self.items:
-            group, name, base, size, type = item
-            if group == "memory_region":
-                d[name] = CSRMemoryRegion(int(base, 16), int(size), type)
+        for name, (base, size, type) in self.csr_map.memories.items():
+            d[name] = CSRMemoryRegion(base, size, type)
         return CSRElements(d)
+
+    def snapshot(self, filter=None, max_length=255):
+        """Read all readable registers (optionally filtered by name) in a minimum of transactions.
+
+        Registers are sorted by address and contiguous registers are merged in bursts of up to
+        ``max_length`` words (issued as pipelined requests when supported by the comm); returns a
+        dict of the register values.
+        """
+        registers = sorted([r for name, r in self.regs.d.items()
+            if ((filter is None) or (filter in name)) and (r.mode in ["rw", "ro"])],
+            key=lambda r: r.addr)
+
+        # Merge contiguous registers in bursts.
+        bursts = []
+        for register in registers:
+            if bursts:
+                base, length, burst_registers = bursts[-1]
+                if (register.addr == base + 4*length) and (length + register.length <= max_length):
+                    bursts[-1] = (base, length + register.length, burst_registers + [register])
+                    continue
+            bursts.append((register.addr, register.length, [register]))
+
+        # Read bursts.
+        reads = [(base, length) for base, length, burst_registers in bursts]
+        if hasattr(self.csr_comm, "read_many"):
+            datas = self.csr_comm.read_many(reads)
+        else:
+            datas = [self.csr_comm.read(base, length=length) for base, length in reads]
+
+        # Decode registers.
+        values = {}
+        for (base, length, burst_registers), burst_datas in zip(bursts, datas):
+            for register in burst_registers:
+                offset = (register.addr - base)//4
+                values[register.name] = register.decode(burst_datas[offset:offset + register.length])
+        return values
@@ -5,7 +5,9 @@
 # Copyright (c) 2017 Tim Ansell <mithro@mithis.com>
 # SPDX-License-Identifier: BSD-2-Clause
 
+import sys
 import math
+import array
 import struct
 
 from litex.soc.interconnect.packet import HeaderField, Header
@@ -52,6 +54,13 @@ etherbone_record_header = Header(
     length           = etherbone_record_header_length,
     swap_field_bytes = True)
 
+# Maximum size of a single record packet (255 writes/255 reads with 64-bit addresses).
+etherbone_max_packet_size = (
+    etherbone_packet_header_length +
+    etherbone_record_header_length +
+    (8 + 4*255) + # Writes.
+    (8 + 8*255))  # Reads.
+
 
 def get_field_data(field, datas):
     v = int.from_bytes(datas[field.byte:field.byte+math.ceil(field.width/8)], "big")
@@ -62,14 +71,65 @@ unpack_uint32_from = struct.Struct('>I').unpack
 pack_to_uint64 = struct.Struct('>Q').pack
 unpack_uint64_from = struct.Struct('>Q').unpack
 
+# Precompiled headers layouts (see etherbone_packet_header/etherbone_record_header).
+_packet_header_struct = struct.Struct(">HBB4x") # magic, version/nr/pr/pf, addr_size/port_size.
+_record_header_struct = struct.Struct(">BBBB")  # flags, byte_enable, wcount, rcount.
+_addr_structs         = {n: struct.Struct(">" + t) for n, t in [(1, "B"), (2, "H"), (4, "I"), (8, "Q")]}
+
+def _array_typecode(size):
+    for typecode in "BHILQ":
+        if array.array(typecode).itemsize == size:
+            return typecode
+
+_array_typecodes = {n: _array_typecode(n) for n in [1, 2, 4, 8]}
+
+def _pack_words_into(buffer, offset, words, size):
+    # Pack words as big-endian values of size bytes in buffer at offset, return end offset.
+    a = array.array(_array_typecodes[size], words)
+    if sys.byteorder == "little":
+        a.byteswap()
+    end = offset + len(a)*size
+    buffer[offset:end] = memoryview(a).cast("B")
+    return end
+
+def _unpack_words_from(buffer, offset, count, size):
+    # Unpack count big-endian values of size bytes from buffer at offset.
+    a = array.array(_array_typecodes[size])
+    a.frombytes(buffer[offset:offset + count*size])
+    if sys.byteorder == "little":
+        a.byteswap()
+    return a.tolist()
+
 # Packet -------------------------------------------------------------------------------------------
 
-class Packet(list):
+class Packet:
+    """Encoded/decoded packet base.
+
+    ``bytes`` holds the encoded packet. When encoded in a provided ``buffer``, ``bytes`` is the
+    buffer itself or a ``memoryview`` on it: it aliases the buffer and is only valid until the
+    buffer is reused (send it before encoding the next packet, or copy it with ``bytes()``).
+    Without ``buffer``, ``bytes`` is a new ``bytearray`` owned by the packet.
+    """
     def __init__(self, init=[]):
         self.ongoing = False
         self.done    = False
         self.bytes   = init
 
+    def _encode(self, buffer=None):
+        # Encode in a new bytearray, or in the provided (preallocated) buffer.
+        size = self.get_size()
+        if buffer is None:
+            buffer = bytearray(size)
+        elif len(buffer) < size:
+            raise ValueError(f"Buffer of {len(buffer)} bytes too small for {size} bytes packet.")
+        self.pack_into(buffer, 0)
+        self.bytes   = buffer if len(buffer) == size else memoryview(buffer)[:size]
+        self.encoded = True
+
+    def _decode(self):
+        self.unpack_from(self.bytes, 0)
+        self.encoded = False
+
 # Etherbone Write / Read ---------------------------------------------------------------------------
 
 class EtherboneWrite:
@@ -90,56 +150,61 @@ class EtherboneRead:
 # Etherbone Writes ---------------------------------------------------------------------------------
 
 class EtherboneWrites(Packet):
+    """Etherbone writes: base address and datas (stored as a flat list of ints, ``datas``; iteration
+    and ``writes`` return ``EtherboneWrite`` objects)."""
     def __init__(self, addr_size=4, init=[], base_addr=0, datas=[]):
         if isinstance(datas, list) and len(datas) > 255:
             raise ValueError(f"Burst size of {len(datas)} exceeds maximum of 255 allowed by Etherbone.")
         assert addr_size in [1, 2, 4, 8]
         Packet.__init__(self, init)
         self.base_addr = base_addr
-        self.writes    = []
-        self.encoded   = init != []
+        self.datas     = list(datas)
+        self.encoded   = len(init) != 0
         self.addr_size = addr_size
-        for data in datas:
-            self.add(EtherboneWrite(data))
+
+    def __len__(self):
+        return len(self.datas)
+
+    def __iter__(self):
+        return iter(self.writes)
+
+    @property
+    def writes(self):
+        return [EtherboneWrite(data) for data in self.datas]
+
+    @writes.setter
+    def writes(self, writes):
+        self.datas = [write.data for write in writes]
 
     def add(self, write):
-        self.writes.append(write)
+        self.datas.append(write.data)
 
     def get_datas(self):
-        datas = []
-        for write in self.writes:
-            datas.append(write.data)
-        return datas
+        return self.datas
+
+    def get_size(self):
+        return self.addr_size + 4*len(self.datas)
+
+    def pack_into(self, buffer, offset):
+        _addr_structs[self.addr_size].pack_into(buffer, offset, self.base_addr)
+        return _pack_words_into(buffer, offset + self.addr_size, self.datas, 4)
 
-    def encode(self):
+    def unpack_from(self, buffer, offset, count=None):
+        if count is None:
+            count = (len(buffer) - offset - self.addr_size)//4
+        self.base_addr = _addr_structs[self.addr_size].unpack_from(buffer, offset)[0]
+        self.datas     = _unpack_words_from(buffer, offset + self.addr_size, count, 4)
+        return offset + self.addr_size + 4*count
+
+    def encode(self, buffer=None):
         if self.encoded:
             raise ValueError
-        ba = bytearray()
-        if self.addr_size == 4:
-            ba += pack_to_uint32(self.base_addr)
-        else:
-            ba += pack_to_uint64(self.base_addr)
-        for write in self.writes:
-            ba += pack_to_uint32(write.data)
-        self.bytes   = ba
-        self.encoded = True
+        self._encode(buffer)
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        ba = self.bytes
-        if self.addr_size == 4:
-            self.base_addr = unpack_uint32_from(ba[:self.addr_size])[0]
-        else:
-            self.base_addr = unpack_uint64_from(ba[:self.addr_size])[0]
-        writes = []
-        offset = self.addr_size
-        length = len(ba)
-        while length > offset:
-            writes.append(EtherboneWrite(unpack_uint32_from(ba[offset:offset+4])[0]))
-            offset += 4
-        self.writes  = writes
-        self.encoded = False
+        self._decode()
 
     def __repr__(self):
         r = "Writes\n"
@@ -152,63 +217,61 @@ class EtherboneWrites(Packet):
 # Etherbone Reads ----------------------------------------------------------------------------------
 
 class EtherboneReads(Packet):
+    """Etherbone reads: base return address and addresses (stored as a flat list of ints, ``addrs``;
+    iteration and ``reads`` return ``EtherboneRead`` objects)."""
     def __init__(self, addr_size=4, init=[], base_ret_addr=0, addrs=[]):
         if isinstance(addrs, list) and len(addrs) > 255:
             raise ValueError(f"Burst size of {len(addrs)} exceeds maximum of 255 allowed by Etherbone.")
         assert addr_size in [1, 2, 4, 8]
         Packet.__init__(self, init)
         self.base_ret_addr = base_ret_addr
-        self.reads     = []
-        self.encoded   = init != []
+        self.addrs     = list(addrs)
+        self.encoded   = len(init) != 0
         self.addr_size = addr_size
-        for addr in addrs:
-            self.add(EtherboneRead(addr))
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def __iter__(self):
+        return iter(self.reads)
+
+    @property
+    def reads(self):
+        return [EtherboneRead(addr) for addr in self.addrs]
+
+    @reads.setter
+    def reads(self, reads):
+        self.addrs = [read.addr for read in reads]
 
     def add(self, read):
-        self.reads.append(read)
+        self.addrs.append(read.addr)
 
     def get_addrs(self):
-        addrs = []
-        for read in self.reads:
-            addrs.append(read.addr)
-        return addrs
+        return self.addrs
+
+    def get_size(self):
+        return self.addr_size*(1 + len(self.addrs))
+
+    def pack_into(self, buffer, offset):
+        _addr_structs[self.addr_size].pack_into(buffer, offset, self.base_ret_addr)
+        return _pack_words_into(buffer, offset + self.addr_size, self.addrs, self.addr_size)
 
-    def encode(self):
+    def unpack_from(self, buffer, offset, count=None):
+        if count is None:
+            count = (len(buffer) - offset)//self.addr_size - 1
+        self.base_ret_addr = _addr_structs[self.addr_size].unpack_from(buffer, offset)[0]
+        self.addrs         = _unpack_words_from(buffer, offset + self.addr_size, count, self.addr_size)
+        return offset + self.addr_size*(1 + count)
+
+    def encode(self, buffer=None):
         if self.encoded:
             raise ValueError
-        ba = bytearray()
-        if (self.addr_size == 4):
-            ba += pack_to_uint32(self.base_ret_addr)
-        else:
-            ba += pack_to_uint64(self.base_ret_addr)
-        for read in self.reads:
-            if self.addr_size == 4:
-                ba += pack_to_uint32(read.addr)
-            else:
-                ba += pack_to_uint64(read.addr)
-        self.bytes   = ba
-        self.encoded = True
+        self._encode(buffer)
 
     def decode(self):
         if not self.encoded:
             raise ValueError
-        ba = self.bytes
-        if self.addr_size == 4:
-            base_ret_addr = unpack_uint32_from(ba[:self.addr_size])[0]
-        else:
-            base_ret_addr = unpack_uint64_from(ba[:self.addr_size])[0]
-        reads  = []
-        offset = self.addr_size
-        length = len(ba)
-        while length > offset:
-            v = ba[offset:offset+self.addr_size]
-            if self.addr_size == 4:
-                reads.append(EtherboneRead(unpack_uint32_from(v)[0]))
-            else:
-                reads.append(EtherboneRead(unpack_uint64_from(v)[0]))
-            offset += self.addr_size
-        self.reads   = reads
-        self.encoded = False
+        self._decode()
 
     def __repr__(self):
         r = "Reads\n"
@@ -236,75 +299,79 @@ class EtherboneRecord(Packet):
         self.byte_enable = 0xf
         self.wcount      = 0
         self.rcount      = 0
-        self.encoded     = init != []
+        self.encoded     = len(init) != 0
         self.addr_size   = addr_size
 
-    def decode(self):
-        if not self.encoded:
-            raise ValueError
+    def get_size(self):
+        size = etherbone_record_header_length
+        if self.writes is not None and len(self.writes):
+            size += self.writes.get_size()
+        if self.reads is not None and len(self.reads):
+            size += self.reads.get_size()
+        return size
 
+    def pack_into(self, buffer, offset):
+        # Set writes/reads count
+        self.wcount = 0 if self.writes is None else len(self.writes)
+        self.rcount = 0 if self.reads  is None else len(self.reads)
+
+        # Encode header
+        flags = (
+            (self.bca << 0) |
+            (self.rca << 1) |
+            (self.rff << 2) |
+            (self.cyc << 4) |
+            (self.wca << 5) |
+            (self.wff << 6))
+        _record_header_struct.pack_into(buffer, offset, flags, self.byte_enable, self.wcount, self.rcount)
+        offset += etherbone_record_header_length
+
+        # Encode writes
+        if self.wcount:
+            offset = self.writes.pack_into(buffer, offset)
+
+        # Encode reads
+        if self.rcount:
+            offset = self.reads.pack_into(buffer, offset)
+        return offset
+
+    def unpack_from(self, buffer, offset):
         # Decode header
-        header = list(self.bytes[:etherbone_record_header.length])
-        for k, v in sorted(etherbone_record_header.fields.items()):
-            setattr(self, k, get_field_data(v, header))
-        offset = etherbone_record_header.length
+        flags, self.byte_enable, self.wcount, self.rcount = _record_header_struct.unpack_from(buffer, offset)
+        self.bca = (flags >> 0) & 0b1
+        self.rca = (flags >> 1) & 0b1
+        self.rff = (flags >> 2) & 0b1
+        self.cyc = (flags >> 4) & 0b1
+        self.wca = (flags >> 5) & 0b1
+        self.wff = (flags >> 6) & 0b1
+        offset += etherbone_record_header_length
 
         # Decode writes
         if self.wcount:
-            init_length = (4 * self.wcount) + (self.addr_size)
-            self.writes = EtherboneWrites(
-                addr_size = self.addr_size,
-                init      = self.bytes[offset:offset + init_length])
-            offset += init_length
-            self.writes.decode()
+            self.writes = EtherboneWrites(addr_size=self.addr_size)
+            offset = self.writes.unpack_from(buffer, offset, self.wcount)
 
         # Decode reads
         if self.rcount:
-            init_length = (self.rcount + 1) * self.addr_size
-            self.reads = EtherboneReads(
-                addr_size = self.addr_size,
-                init      = self.bytes[offset:offset + init_length])
-            offset += init_length
-            self.reads.decode()
+            self.reads = EtherboneReads(addr_size=self.addr_size)
+            offset = self.reads.unpack_from(buffer, offset, self.rcount)
+        return offset
 
-        self.encoded = False
+    def decode(self):
+        if not self.encoded:
+            raise ValueError
+        self._decode()
 
-    def encode(self):
+    def encode(self, buffer=None):
         if self.encoded:
             raise ValueError
-
-        # Set writes/reads count
-        self.wcount = 0 if self.writes is None else len(self.writes.writes)
-        self.rcount = 0 if self.reads  is None else len(self.reads.reads)
-
-        ba = bytearray()
-
-        # Encode header
-        header = 0
-        for k, v in sorted(etherbone_record_header.fields.items()):
-            value = int.from_bytes(getattr(self, k).to_bytes(math.ceil(v.width/8), "big"), "little")
-            header += (value << v.offset+(v.byte*8))
-        ba += header.to_bytes(etherbone_record_header.length, "little")
-
-        # Encode writes
-        if self.wcount:
-            self.writes.encode()
-            ba += self.writes.bytes
-
-        # Encode reads
-        if self.rcount:
-            self.reads.encode()
-            ba += self.reads.bytes
-
-        self.bytes   = ba
-        self.encoded = True
+        self._encode(buffer)
 
     def __repr__(self, n=0):
         r = "Record {}\n".format(n)
         r += "--------\n"
         if self.encoded:
-            for d in self.bytes:
-                r += "{:02x}".format(d)
+            r += bytes(self.bytes).hex()
         else:
             for k in sorted(etherbone_record_header.fields.keys()):
                 r += k + " : 0x{:0x}\n".format(getattr(self, k))
@@ -321,7 +388,7 @@ class EtherbonePacket(Packet):
         assert addr_width in [8, 16, 32, 64]
 
         Packet.__init__(self, init)
-        self.encoded = init != []
+        self.encoded = len(init) != 0
         self.records = []
 
         self.magic     = etherbone_magic
@@ -332,59 +399,57 @@ class EtherbonePacket(Packet):
         self.pr        = 0
         self.pf        = 0
 
-    def decode(self):
-        if not self.encoded:
-            raise ValueError
+    def get_size(self):
+        return etherbone_packet_header_length + sum(record.get_size() for record in self.records)
 
-        ba = self.bytes
+    def pack_into(self, buffer, offset):
+        # Encode header
+        _packet_header_struct.pack_into(buffer, offset,
+            self.magic,
+            (self.version << 4) | (self.nr << 2) | (self.pr << 1) | (self.pf << 0),
+            (self.addr_size << 4) | (self.port_size << 0))
+        offset += etherbone_packet_header_length
 
+        # Encode records
+        for record in self.records:
+            offset = record.pack_into(buffer, offset)
+        return offset
+
+    def unpack_from(self, buffer, offset):
         # Decode header
-        header = list(ba[:etherbone_packet_header.length])
-        for k, v in sorted(etherbone_packet_header.fields.items()):
-            setattr(self, k, get_field_data(v, header))
-        offset = etherbone_packet_header.length
+        self.magic, flags, sizes = _packet_header_struct.unpack_from(buffer, offset)
+        self.version   = (flags >> 4) & 0xf
+        self.nr        = (flags >> 2) & 0b1
+        self.pr        = (flags >> 1) & 0b1
+        self.pf        = (flags >> 0) & 0b1
+        self.addr_size = (sizes >> 4) & 0xf
+        self.port_size = (sizes >> 0) & 0xf
+        offset += etherbone_packet_header_length
 
         # Decode records
-        length = len(ba)
+        length = len(buffer)
         while length > offset:
-            record = EtherboneRecord(addr_size=self.addr_size, init=ba[offset:])
-            record.decode()
+            record = EtherboneRecord(addr_size=self.addr_size)
+            offset = record.unpack_from(buffer, offset)
             self.records.append(record)
-            offset += etherbone_record_header.length
-            if record.wcount:
-                offset += (4*record.wcount) + self.addr_size
-            if record.rcount:
-                offset += (record.rcount + 1) * self.addr_size
+        return offset
 
-        self.encoded = False
+    def decode(self):
+        if not self.encoded:
+            raise ValueError
+        self._decode()
 
-    def encode(self):
+    def encode(self, buffer=None):
+        """Encode packet, optionally in a preallocated (reusable) buffer (``bytes`` then aliases it)."""
         if self.encoded:
             raise ValueError
-
-        ba = bytearray()
-
-        # Encode header
-        header = 0
-        for k, v in sorted(etherbone_packet_header.fields.items()):
-            value = int.from_bytes(getattr(self, k).to_bytes(math.ceil(v.width/8), "big"), "little")
-            header += (value << v.offset+(v.byte*8))
-        ba += header.to_bytes(etherbone_packet_header.length, "little")
-
-        # Encode records
-        for record in self.records:
-            record.encode()
-            ba += record.bytes
-
-        self.bytes   = ba
-        self.encoded = True
+        self._encode(buffer)
 
     def __repr__(self):
         r = "Packet\n"
         r += "--------\n"
         if self.encoded:
-            for d in self.bytes:
-                r += "{:02x}".format(d)
+            r += bytes(self.bytes).hex()
         else:
             for k in sorted(etherbone_packet_header.fields.keys()):
                 r += k + " : 0x{:0x}\n".format(getattr(self, k))
@@ -394,6 +459,17 @@ class EtherbonePacket(Packet):
 
 # Etherbone IPC ------------------------------------------------------------------------------------
 
+def get_packet_size(header, addr_size):
+    """Return the size of a single record Etherbone packet from its packet/record headers."""
+    header_length  = etherbone_packet_header_length + etherbone_record_header_length
+    wcount, rcount = struct.unpack(">BB", header[header_length - 2:header_length])
+    packet_size    = header_length
+    if wcount != 0:
+        packet_size += 4 * (wcount) + addr_size
+    if rcount != 0:
+        packet_size += (rcount + 1) * addr_size
+    return packet_size
+
 class EtherboneIPC:
     def send_packet(self, socket, packet):
         socket.sendall(packet.bytes)
@@ -410,13 +486,7 @@ class EtherboneIPC:
                 else:
                     packet += chunk
 
-            wcount, rcount = struct.unpack(">BB", packet[header_length - 2:])
-            counts = wcount + rcount
-            packet_size = header_length
-            if wcount != 0:
-                packet_size += 4 * (wcount) + addr_size
-            if rcount != 0:
-                packet_size += (rcount + 1) * addr_size
+            packet_size = get_packet_size(packet, addr_size)
 
             while len(packet) < packet_size:
                 chunk = socket.recv(packet_size - len(packet))
@@ -405,3 +405,236 @@ class TestAXI(unittest.TestCase):
 
         dut = DUT(64, 32)
         run_simulation(dut, [read_generator(dut), write_generator(dut)], vcd_name="sim.vcd")
+
+# AXI Crossbar Models ------------------------------------------------------------------------------
+
+class AXISlaveModel:
+    """Cycle-based AXI memory slave: responds after ``latency`` cycles, in order, with up to
+    ``max_outstanding`` requests per direction."""
+    def __init__(self, axi, latency=8, max_outstanding=8):
+        self.axi             = axi
+        self.latency         = latency
+        self.max_outstanding = max_outstanding
+        self.mem             = {}
+
+    @passive
+    def generator(self):
+        axi = self.axi
+        ar_q, aw_q, b_q = [], [], []
+        cycle = 0
+        while True:
+            # Handshakes of the current cycle.
+            if (yield axi.ar.valid) and (yield axi.ar.ready):
+                ar_q.append([(yield axi.ar.id), (yield axi.ar.addr)//4, (yield axi.ar.len), 0, cycle + self.latency])
+            if (yield axi.r.valid) and (yield axi.r.ready):
+                ar_q[0][3] += 1
+                if ar_q[0][3] > ar_q[0][2]:
+                    ar_q.pop(0)
+            if (yield axi.aw.valid) and (yield axi.aw.ready):
+                aw_q.append([(yield axi.aw.id), (yield axi.aw.addr)//4, 0])
+            if (yield axi.w.valid) and (yield axi.w.ready):
+                self.mem[aw_q[0][1] + aw_q[0][2]] = (yield axi.w.data)
+                aw_q[0][2] += 1
+                if (yield axi.w.last):
+                    b_q.append([aw_q.pop(0)[0], cycle + self.latency])
+            if (yield axi.b.valid) and (yield axi.b.ready):
+                b_q.pop(0)
+
+            # Outputs of the next cycle.
+            r_valid = len(ar_q) and ar_q[0][4] <= cycle
+            b_valid = len(b_q)  and b_q[0][1]  <= cycle
+            yield axi.ar.ready.eq(len(ar_q) < self.max_outstanding)
+            yield axi.aw.ready.eq(len(aw_q) < self.max_outstanding)
+            yield axi.w.ready.eq(len(aw_q) > 0)
+            yield axi.r.valid.eq(r_valid)
+            yield axi.b.valid.eq(b_valid)
+            if r_valid:
+                _id, addr, _len, beat, _ = ar_q[0]
+                yield axi.r.id.eq(_id)
+                yield axi.r.data.eq(self.mem.get(addr + beat, 0))
+                yield axi.r.last.eq(beat == _len)
+            if b_valid:
+                yield axi.b.id.eq(b_q[0][0])
+            yield
+            cycle += 1
+
+class AXIMasterModel:
+    """Cycle-based AXI master: issues ``accesses`` (``Write``/``Read`` INCR bursts) with up to
+    ``max_outstanding`` requests per direction and checks responses ordering/data per ID."""
+    def __init__(self, axi, accesses, max_outstanding=8, ready_random=0):
+        self.axi             = axi
+        self.accesses        = accesses
+        self.max_outstanding = max_outstanding
+        self.ready_random    = ready_random
+        self.errors          = []
+        self.resps           = []
+        self.cycles          = 0
+
+    def generator(self):
+        axi      = self.axi
+        prng     = random.Random(42)
+        writes   = [a for a in self.accesses if isinstance(a, Write)]
+        reads    = [a for a in self.accesses if isinstance(a, Read)]
+        w_q      = []               # Write data to send (in AW order).
+        b_q      = {}               # Pending write responses per ID.
+        r_q      = {}               # Pending read responses per ID.
+        r_data   = []
+        w_beat   = 0
+        pending  = len(writes) + len(reads)
+        while pending:
+            # Handshakes of the current cycle.
+            if (yield axi.aw.valid) and (yield axi.aw.ready):
+                access = writes.pop(0)
+                w_q.append(access)
+                b_q.setdefault(access.id, []).append(access)
+            if (yield axi.w.valid) and (yield axi.w.ready):
+                w_beat += 1
+                if w_beat > w_q[0].len:
+                    w_q.pop(0)
+                    w_beat = 0
+            if (yield axi.b.valid) and (yield axi.b.ready):
+                _id = (yield axi.b.id)
+                self.resps.append(("b", (yield axi.b.resp)))
+                if not b_q.get(_id):
+                    self.errors.append("Unexpected write response for ID {}".format(_id))
+                else:
+                    b_q[_id].pop(0)
+                pending -= 1
+            if (yield axi.ar.valid) and (yield axi.ar.ready):
+                access = reads.pop(0)
+                r_q.setdefault(access.id, []).append(access)
+            if (yield axi.r.valid) and (yield axi.r.ready):
+                _id = (yield axi.r.id)
+                r_data.append((yield axi.r.data))
+                if (yield axi.r.last):
+                    self.resps.append(("r", (yield axi.r.resp)))
+                    if not r_q.get(_id):
+                        self.errors.append("Unexpected read response for ID {}".format(_id))
+                    else:
+                        access = r_q[_id].pop(0)
+                        if r_data != access.data:
+                            self.errors.append("Read error at 0x{:08x} for ID {}".format(access.addr, _id))
+                    r_data = []
+                    pending -= 1
+
+            # Outputs of the next cycle.
+            b_pending = sum(len(q) for q in b_q.values())
+            r_pending = sum(len(q) for q in r_q.values())
+            aw_valid  = len(writes) and (b_pending < self.max_outstanding)
+            ar_valid  = len(reads)  and (r_pending < self.max_outstanding)
+            for valid, channel, access in [(aw_valid, axi.aw, writes), (ar_valid, axi.ar, reads)]:
+                yield channel.valid.eq(valid)
+                if valid:
+                    yield channel.addr.eq(access[0].addr)
+                    yield channel.id.eq(access[0].id)
+                    yield channel.len.eq(access[0].len)
+                    yield channel.size.eq(access[0].size)
+                    yield channel.burst.eq(access[0].type)
+            yield axi.w.valid.eq(len(w_q) > 0)
+            if len(w_q):
+                yield axi.w.data.eq(w_q[0].data[w_beat])
+                yield axi.w.strb.eq(0xf)
+                yield axi.w.last.eq(w_beat == w_q[0].len)
+            yield axi.b.ready.eq(prng.randrange(100) >= self.ready_random)
+            yield axi.r.ready.eq(prng.randrange(100) >= self.ready_random)
+            yield
+            self.cycles += 1
+        yield axi.aw.valid.eq(0)
+        yield axi.w.valid.eq(0)
+        yield axi.ar.valid.eq(0)
+
+def axi_crossbar_accesses(master, n_slaves, n_accesses, id_width, writes=True, seed=0):
+    """Random INCR bursts of a master to its own area of each slave."""
+    prng     = random.Random(seed + master)
+    accesses = []
+    for n in range(n_accesses):
+        slave = prng.randrange(n_slaves)
+        _len  = prng.randrange(8)
+        addr  = (slave << 20) | (master << 16) | (n << 6)
+        data  = [prng.randrange(2**32) for _ in range(_len + 1)]
+        _id   = prng.randrange(2**id_width)
+        if writes:
+            accesses.append(Write(addr, data, _id, type=BURST_INCR, len=_len, size=2))
+        accesses.append(Read(addr, data if writes else [0]*(_len + 1), _id, type=BURST_INCR, len=_len, size=2))
+    return accesses
+
+def axi_crossbar_bench(crossbar_cls, masters_accesses, n_slaves=2, id_width=2, slave_id_width=None,
+    latency=8, ready_random=0, **kwargs):
+    """Run ``masters_accesses`` through ``crossbar_cls``, returns masters/slaves models."""
+    slave_id_width = slave_id_width or id_width
+    masters = [AXIInterface(id_width=id_width)       for _ in masters_accesses]
+    slaves  = [AXIInterface(id_width=slave_id_width) for _ in range(n_slaves)]
+    decoders = [lambda a, n=n: a[18:20] == n for n in range(n_slaves)]
+    dut = crossbar_cls(masters, list(zip(decoders, slaves)), **kwargs)
+    masters_models = [AXIMasterModel(m, accesses, ready_random=ready_random)
+        for m, accesses in zip(masters, masters_accesses)]
+    slaves_models = [AXISlaveModel(s, latency=latency) for s in slaves]
+    generators = [m.generator() for m in masters_models] + [s.generator() for s in slaves_models]
+    run_simulation(dut, generators)
+    return masters_models, slaves_models
+
+# TestAXICrossbar ----------------------------------------------------------------------------------
+
+class TestAXICrossbar(unittest.TestCase):
+    def check_models(self, masters):
+        for master in masters:
+            self.assertEqual(master.errors, [])
+
+    def test_id_crossbar_writes_reads(self):
+        # Per master: all writes, then read back (ordering between IDs is not guaranteed).
+        for ready_random in [0, 50]:
+            writes = [[a for a in axi_crossbar_accesses(m, 3, 32, 2) if isinstance(a, Write)] for m in range(3)]
+            reads  = [[a for a in axi_crossbar_accesses(m, 3, 32, 2) if isinstance(a, Read)]  for m in range(3)]
+            masters, slaves = axi_crossbar_bench(AXIIDCrossbar, writes, n_slaves=3, slave_id_width=4,
+                ready_random=ready_random)
+            self.check_models(masters)
+            # Write data.
+            for accesses in writes:
+                for access in accesses:
+                    s = access.addr >> 20
+                    self.assertEqual([slaves[s].mem.get(access.addr//4 + i) for i in range(access.len + 1)],
+                        access.data)
+
+    def test_id_crossbar_reads(self):
+        def accesses(m):
+            return [a for a in axi_crossbar_accesses(m, 2, 64, 2, writes=False)]
+        for ready_random in [0, 50]:
+            masters, slaves = axi_crossbar_bench(AXIIDCrossbar, [accesses(m) for m in range(2)],
+                slave_id_width=3, ready_random=ready_random)
+            self.check_models(masters)
+
+    def test_id_crossbar_id_width_check(self):
+        masters = [AXIInterface(id_width=2) for _ in range(2)]
+        slaves  = [(lambda a: 1, AXIInterface(id_width=2))]
+        with self.assertRaises(ValueError):
+            AXIIDCrossbar(masters, slaves)
+
+    def test_id_crossbar_decode_error(self):
+        # Accesses to an unmapped area (slave 3) are completed with DECERR, in order with the others.
+        accesses = [
+            Write(0x00000000, [0x01234567, 0x89abcdef], 0, type=BURST_INCR, len=1, size=2),
+            Write(0x00300000, [0x00000000, 0x00000000], 0, type=BURST_INCR, len=1, size=2),
+            Read( 0x00300000, [0xffffffff]*4,           1, type=BURST_INCR, len=3, size=2),
+            Read( 0x00000000, [0x01234567, 0x89abcdef], 1, type=BURST_INCR, len=1, size=2),
+        ]
+        masters, slaves = axi_crossbar_bench(AXIIDCrossbar, [accesses], slave_id_width=2)
+        self.check_models(masters)
+        resps = masters[0].resps
+        self.assertEqual([r for c, r in resps if c == "b"], [RESP_OKAY, RESP_DECERR])
+        self.assertEqual([r for c, r in resps if c == "r"], [RESP_DECERR, RESP_OKAY])
+
+    def test_id_crossbar_bandwidth(self):
+        # 2 masters reading bursts from 2 slaves (ID = slave): aggregate bandwidth vs AXICrossbar.
+        def accesses(m):
+            return [Read((s << 20) | (m << 16) | (n << 6), [0]*8, s, type=BURST_INCR, len=7, size=2)
+                for n in range(32) for s in range(2)]
+        beats = 2*64*8
+        legacy, _ = axi_crossbar_bench(AXICrossbar, [accesses(m) for m in range(2)], id_width=1)
+        ids, _    = axi_crossbar_bench(AXIIDCrossbar, [accesses(m) for m in range(2)], id_width=1, slave_id_width=2)
+        self.check_models(legacy)
+        self.check_models(ids)
+        legacy_bandwidth = beats/max(m.cycles for m in legacy)
+        ids_bandwidth    = beats/max(m.cycles for m in ids)
+        # Both slaves can return a beat per cycle: aggregate bandwidth is up to 2 beats/cycle.
+        self.assertGreater(ids_bandwidth, 1.5*legacy_bandwidth)
+        self.assertGreater(ids_bandwidth, 1.5)
@@ -0,0 +1,70 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import json
+import struct
+import tempfile
+import unittest
+
+from litex.soc.integration.common import get_mem_data
+
+# Test Common --------------------------------------------------------------------------------------
+
+class TestCommon(unittest.TestCase):
+    def mem_data_reference(self, data, data_width, endianness):
+        # Word by word decoding (original implementation).
+        fmt    = {"big": ">I", "little": "<I"}[endianness]
+        nbytes = data_width//8
+        data   = data + bytes(-len(data) % nbytes)
+        words  = []
+        for i in range(0, len(data), nbytes):
+            word = 0
+            for j in range(nbytes//4):
+                word |= struct.unpack(fmt, data[i + 4*j:i + 4*j + 4])[0] << (32*j)
+            words.append(word)
+        return words
+
+    def test_get_mem_data(self):
+        data = bytes((i*7 + 3) & 0xff for i in range(1003))
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "data.bin")
+            with open(filename, "wb") as f:
+                f.write(data)
+            for data_width in [32, 64, 128]:
+                for endianness in ["big", "little"]:
+                    mem_data = get_mem_data(filename, data_width=data_width, endianness=endianness)
+                    self.assertIsInstance(mem_data, list)
+                    self.assertEqual(mem_data, self.mem_data_reference(data, data_width, endianness))
+            self.assertEqual(get_mem_data(None), [])
+
+    def test_get_mem_data_empty(self):
+        self.assertEqual(len(get_mem_data(None)), 0)
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "data.bin")
+            with open(filename, "wb") as f:
+                f.write(bytes(4))
+            mem_data = get_mem_data(filename)
+            self.assertEqual(len(mem_data), 1)
+            # Callers pad the data with lists (ex NXLRAM.add_init).
+            mem_data += [0]*3
+            self.assertEqual(mem_data, [0]*4)
+            # Empty image file.
+            open(filename, "wb").close()
+            with self.assertRaises(AssertionError):
+                get_mem_data(filename)
+
+    def test_get_mem_data_regions(self):
+        with tempfile.TemporaryDirectory() as d:
+            for name, data in [("a.bin", b"\x01\x02\x03\x04\x05"), ("b.bin", b"\xaa\xbb")]:
+                with open(os.path.join(d, name), "wb") as f:
+                    f.write(data)
+            filename = os.path.join(d, "regions.json")
+            with open(filename, "w") as f:
+                json.dump({"a.bin": "0x40000000", "b.bin": "0x4000000c"}, f)
+            mem_data = get_mem_data(filename, endianness="little", offset=0x40000000)
+            self.assertEqual(list(mem_data), [0x04030201, 0x00000005, 0x00000000, 0x0000bbaa])
+            with self.assertRaises(AssertionError):
+                get_mem_data(filename, mem_size=8, offset=0x40000000)
@@ -0,0 +1,247 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+
+from migen import *
+
+from litex.gen import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.cores.dma import *
+
+# Helpers ------------------------------------------------------------------------------------------
+
+def descriptors_words(descriptors):
+    # Descriptors as list of (address, next, length, control) -> little-endian 32-bit words.
+    words = []
+    for address, next, length, control in descriptors:
+        words += [address & 0xffffffff, address >> 32, next & 0xffffffff, next >> 32, length, control, 0, 0]
+    return words
+
+class DMADUT(LiteXModule):
+    def __init__(self, dma_cls, init, bursting=True, **kwargs):
+        bus      = wishbone.Interface(data_width=32, adr_width=30, bursting=bursting)
+        self.dma = dma_cls(bus, endianness="big", **kwargs)
+        self.mem = wishbone.SRAM(4096, bus=bus, init=init)
+        if hasattr(self.dma, "add_ctrl"):
+            self.dma.add_ctrl()
+
+# TestDMA ------------------------------------------------------------------------------------------
+
+class TestDMA(unittest.TestCase):
+    def reader_test(self, n, descriptors=None, **kwargs):
+        init = [0x10000 + i for i in range(1024 - 64)]
+        dut  = DMADUT(WishboneDMABurstReader, init + descriptors_words(descriptors or []), **kwargs)
+        data = []
+        def generator(dut):
+            if descriptors is None:
+                yield dut.dma.base.eq(0x40)
+                yield dut.dma.length.eq(4*n)
+            else:
+                yield dut.dma.descriptor.eq(4*len(init))
+            yield dut.dma.enable.eq(1)
+            yield
+            cycles = 0
+            while not (yield dut.dma.done):
+                cycles += 1
+                yield
+            self.cycles = cycles
+
+        def reader(dut):
+            yield dut.dma.source.ready.eq(1)
+            while True:
+                if (yield dut.dma.source.valid):
+                    data.append(((yield dut.dma.source.data), (yield dut.dma.source.last)))
+                yield
+
+        run_simulation(dut, [generator(dut), passive(reader)(dut)])
+        return data
+
+    def test_burst_reader(self):
+        for kwargs in [{}, {"burst_length": 4, "fifo_depth": 4}, {"bursting": False}]:
+            data = self.reader_test(256, **kwargs)
+            self.assertEqual(data, [(0x10000 + 0x10 + i, int(i == 255)) for i in range(256)])
+        # Near 1 word/cycle with bursts and credits.
+        self.reader_test(256)
+        self.assertLess(self.cycles, 256*1.2)
+
+    def test_burst_reader_sg(self):
+        descriptors = [
+            # address, next,  length, control.
+            (0x100,    0xf20, 4*5,    0),
+            (0x300,    0xf40, 4*33,   DMA_DESCRIPTOR_LAST),
+            (0x008,    0x000, 4*3,    DMA_DESCRIPTOR_LAST | DMA_DESCRIPTOR_END),
+        ]
+        expected = []
+        for address, next, length, control in descriptors:
+            for i in range(length//4):
+                last = (i == length//4 - 1) and bool(control & DMA_DESCRIPTOR_LAST)
+                expected.append((0x10000 + address//4 + i, int(last)))
+        data = self.reader_test(0, descriptors=descriptors, with_sg=True)
+        self.assertEqual(data, expected)
+
+    def writer_test(self, packets, descriptors=None, **kwargs):
+        init = [0]*(1024 - 64)
+        dut  = DMADUT(WishboneDMABurstWriter, init + descriptors_words(descriptors or []), **kwargs)
+        def generator(dut):
+            if descriptors is None:
+                yield dut.dma.base.eq(0x40)
+                yield dut.dma.length.eq(4*sum(len(p) for p in packets))
+            else:
+                yield dut.dma.descriptor.eq(4*len(init))
+            yield dut.dma.enable.eq(1)
+            yield
+            while not (yield dut.dma.done):
+                yield
+            self.mem = []
+            for i in range(1024):
+                self.mem.append((yield dut.mem.mem[i]))
+
+        def writer(dut):
+            for packet in packets:
+                for i, data in enumerate(packet):
+                    yield dut.dma.sink.valid.eq(1)
+                    yield dut.dma.sink.data.eq(data)
+                    yield dut.dma.sink.last.eq(i == len(packet) - 1)
+                    yield
+                    while not (yield dut.dma.sink.ready):
+                        yield
+                yield dut.dma.sink.valid.eq(0)
+                for i in range(8):
+                    yield
+
+        run_simulation(dut, [generator(dut), passive(writer)(dut)])
+        return self.mem
+
+    def test_burst_writer(self):
+        for kwargs in [{}, {"burst_length": 4, "fifo_depth": 4}, {"bursting": False}]:
+            data = [0x20000 + i for i in range(128)]
+            mem  = self.writer_test([data], **kwargs)
+            self.assertEqual(mem[0x10:0x10 + 128], data)
+            self.assertEqual(mem[0x10 + 128], 0)
+
+    def test_burst_writer_sg(self):
+        # Packet 0 split over 2 buffers, packet 1 shorter than its buffer.
+        descriptors = [
+            # address, next,  length, control.
+            (0x100,    0xf20, 4*20,   0),
+            (0x400,    0xf40, 4*64,   0),
+            (0x800,    0x000, 4*64,   DMA_DESCRIPTOR_END),
+        ]
+        packets = [[0x30000 + i for i in range(50)], [0x40000 + i for i in range(7)]]
+        mem = self.writer_test(packets, descriptors=descriptors, with_sg=True)
+        self.assertEqual(mem[0x40:0x40 + 20],  packets[0][:20])
+        self.assertEqual(mem[0x100:0x100 + 31], packets[0][20:] + [0])
+        self.assertEqual(mem[0x200:0x200 + 8],  packets[1] + [0])
+
+    def ring_test(self, mode, descriptors, packets=[], size=4, irq_count=1, irq_timeout=0):
+        # Descriptors 0 to size - 1 are posted first, the others are then posted in the freed slots.
+        base = 4*(1024 - 64)
+        init = [0x10000 + i for i in range(1024 - 64)] if mode == "reader" else [0]*(1024 - 64)
+        dut  = DMADUT(WishboneDMARing, init + descriptors_words(descriptors[:size]),
+            mode=mode, with_csr=False)
+        data = []
+        irqs = []
+        def generator(dut):
+            yield dut.dma.base.eq(base)
+            yield dut.dma.size.eq(size)
+            yield dut.dma.irq_count.eq(irq_count)
+            yield dut.dma.irq_timeout.eq(irq_timeout)
+            yield dut.dma.tail.eq(size - 1)
+            yield dut.dma.enable.eq(1)
+            yield
+            for n in range(size - 1, len(descriptors)):
+                while (yield dut.dma.head) != n%size:
+                    yield
+                if n >= size:
+                    for i, word in enumerate(descriptors_words([descriptors[n]])):
+                        yield dut.mem.mem[base//4 + 8*(n%size) + i].eq(word)
+                yield dut.dma.tail.eq((n + 1)%size)
+            while (yield dut.dma.head) != len(descriptors)%size:
+                yield
+            for i in range(128):
+                yield
+            self.mem = []
+            for i in range(1024):
+                self.mem.append((yield dut.mem.mem[i]))
+
+        def irq(dut):
+            # Head index on IRQs (index of the completed descriptor, next descriptor on timeouts).
+            while True:
+                if (yield dut.dma.irq):
+                    irqs.append((yield dut.dma.head))
+                yield
+
+        def reader(dut):
+            yield dut.dma.source.ready.eq(1)
+            while True:
+                if (yield dut.dma.source.valid):
+                    data.append(((yield dut.dma.source.data), (yield dut.dma.source.last)))
+                yield
+
+        def writer(dut):
+            for packet in packets:
+                for i, word in enumerate(packet):
+                    yield dut.dma.sink.valid.eq(1)
+                    yield dut.dma.sink.data.eq(word)
+                    yield dut.dma.sink.last.eq(i == len(packet) - 1)
+                    yield
+                    while not (yield dut.dma.sink.ready):
+                        yield
+                yield dut.dma.sink.valid.eq(0)
+
+        stream = passive(reader)(dut) if mode == "reader" else passive(writer)(dut)
+        run_simulation(dut, [generator(dut), passive(irq)(dut), stream])
+        self.irqs = irqs
+        return data
+
+    def ring_status(self, index):
+        return self.mem[1024 - 64 + 8*index + 6]
+
+    def test_ring_reader(self):
+        descriptors = [
+            # address, next, length, control.
+            (0x100,    0,    4*5,    0),
+            (0x300,    0,    4*33,   DMA_DESCRIPTOR_LAST),
+            (0x008,    0,    4*3,    DMA_DESCRIPTOR_LAST | DMA_DESCRIPTOR_IRQ),
+            (0x040,    0,    4*2,    0),
+            (0x080,    0,    4*4,    DMA_DESCRIPTOR_LAST),
+        ]
+        expected = []
+        for address, next, length, control in descriptors:
+            for i in range(length//4):
+                last = (i == length//4 - 1) and bool(control & DMA_DESCRIPTOR_LAST)
+                expected.append((0x10000 + address//4 + i, int(last)))
+        # IRQs: Count (1), Flag (2), Count (0).
+        data = self.ring_test("reader", descriptors, irq_count=2)
+        self.assertEqual(data, expected)
+        self.assertEqual(self.irqs, [1, 2, 0])
+        # Status written back (wrapped descriptors 4 in slot 0, 3 in slot 3).
+        for index, n in enumerate([4, 1, 2, 3]):
+            last = DMA_STATUS_LAST if descriptors[n][3] & DMA_DESCRIPTOR_LAST else 0
+            self.assertEqual(self.ring_status(index), DMA_STATUS_DONE | last | descriptors[n][2])
+        # IRQs: Flag (2) then Timeout (with 3 and 4 completed).
+        data = self.ring_test("reader", descriptors, irq_count=3, irq_timeout=100)
+        self.assertEqual(data, expected)
+        self.assertEqual(self.irqs, [2, 1])
+
+    def test_ring_writer(self):
+        # Packet 0 split over 2 buffers, packet 1 shorter than its buffer.
+        descriptors = [
+            # address, next, length, control.
+            (0x100,    0,    4*20,   0),
+            (0x400,    0,    4*64,   0),
+            (0x800,    0,    4*64,   0),
+        ]
+        packets = [[0x30000 + i for i in range(50)], [0x40000 + i for i in range(7)]]
+        self.ring_test("writer", descriptors, packets)
+        self.assertEqual(self.mem[0x40:0x40 + 20],  packets[0][:20])
+        self.assertEqual(self.mem[0x100:0x100 + 31], packets[0][20:] + [0])
+        self.assertEqual(self.mem[0x200:0x200 + 8],  packets[1] + [0])
+        self.assertEqual(self.ring_status(0), DMA_STATUS_DONE | 4*20)
+        self.assertEqual(self.ring_status(1), DMA_STATUS_DONE | DMA_STATUS_LAST | 4*30)
+        self.assertEqual(self.ring_status(2), DMA_STATUS_DONE | DMA_STATUS_LAST | 4*7)
+        self.assertEqual(self.irqs, [0, 1, 2])
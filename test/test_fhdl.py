@@ -0,0 +1,61 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import tempfile
+import unittest
+
+from migen import *
+
+from litex.gen import *
+from litex.gen.fhdl.verilog import convert
+
+# Test Design --------------------------------------------------------------------------------------
+
+class MemDUT(LiteXModule):
+    def __init__(self, width, init):
+        self.cd_sys = ClockDomain("sys")
+        self.adr    = Signal(8)
+        self.dat_r  = Signal(width)
+        mem  = Memory(width, 256, init=init)
+        port = mem.get_port()
+        self.specials += mem, port
+        self.comb += [
+            port.adr.eq(self.adr),
+            self.dat_r.eq(port.dat_r),
+        ]
+
+# Test FHDL ----------------------------------------------------------------------------------------
+
+class TestFHDL(unittest.TestCase):
+    def test_memory_init(self):
+        for width in [8, 12, 32, 64, 72]:
+            init = [(i*0x9e3779b97f4a7c15) % 2**width for i in range(256)]
+            dut  = MemDUT(width, init)
+            v    = convert(dut, ios={dut.cd_sys.clk, dut.cd_sys.rst, dut.adr, dut.dat_r})
+            (filename, content), = v.data_files.items()
+            self.assertEqual("".join(content), "".join(f"{d:0{width//4}x}\n" for d in init))
+
+    def test_memory_init_write(self):
+        dut = MemDUT(32, list(range(256)))
+        v   = convert(dut, ios={dut.cd_sys.clk, dut.cd_sys.rst, dut.adr, dut.dat_r})
+        with tempfile.TemporaryDirectory() as d:
+            cwd = os.getcwd()
+            os.chdir(d)
+            try:
+                v.write("top.v")
+                (filename, content), = v.data_files.items()
+                os.utime(filename, (0, 0))
+                # Unchanged content: not rewritten.
+                v.write("top.v")
+                self.assertEqual(os.stat(filename).st_mtime, 0)
+                # Changed content: rewritten.
+                v.data_files[filename] = "".join(content).replace("00000000", "ffffffff")
+                v.write("top.v")
+                self.assertNotEqual(os.stat(filename).st_mtime, 0)
+                with open(filename) as f:
+                    self.assertEqual(f.read(), v.data_files[filename])
+            finally:
+                os.chdir(cwd)
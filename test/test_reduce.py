@@ -6,8 +6,11 @@
 
 import unittest
 import random
+from functools import reduce
+from operator import or_, xor
 
 from migen import *
+from migen.fhdl.structure import _Operator
 
 from litex.gen import *
 
@@ -45,7 +48,7 @@ class TestReduce(unittest.TestCase):
         self.reduce_test(operator="NOR", value=Constant(0b10, 2), reduced=0b0)
         self.reduce_test(operator="NOR", value=Constant(0b11, 2), reduced=0b0)
 
-    def test_reduced_nor(self):
+    def test_reduced_xor(self):
         self.reduce_test(operator="XOR", value=Constant(0b00, 2), reduced=0b0)
         self.reduce_test(operator="XOR", value=Constant(0b01, 2), reduced=0b1)
         self.reduce_test(operator="XOR", value=Constant(0b10, 2), reduced=0b1)
@@ -59,3 +62,43 @@ class TestReduce(unittest.TestCase):
         self.reduce_test(operator="ADD", value=Constant(0b011, 3), reduced=2)
         self.reduce_test(operator="ADD", value=Constant(0b110, 3), reduced=2)
         self.reduce_test(operator="ADD", value=Constant(0b111, 3), reduced=3)
+
+    def test_reduce_balanced(self):
+        def depth(node):
+            if isinstance(node, _Operator):
+                return 1 + max(depth(o) for o in node.operands)
+            return 0
+        values = [Signal() for _ in range(64)]
+        self.assertEqual(depth(Reduce("OR", values)), 6)
+        values = [Signal() for _ in range(5)]
+        self.assertEqual(depth(Reduce("XOR", values)), 3)
+        with self.assertRaises(ValueError):
+            Reduce("OR", [])
+        with self.assertRaises(ValueError):
+            Reduce("MUL", values)
+
+    def pipelined_reduce_test(self, operator, n, pipeline_stages, reference):
+        inputs = [Signal(4) for _ in range(n)]
+        dut    = PipelinedReduce(operator, inputs, pipeline_stages=pipeline_stages)
+        self.assertEqual(dut.latency, pipeline_stages)
+        vectors = [[random.randrange(16) for _ in range(n)] for _ in range(16)]
+        errors  = []
+        def generator():
+            for i in range(len(vectors) + pipeline_stages):
+                if i < len(vectors):
+                    for s, v in zip(inputs, vectors[i]):
+                        yield s.eq(v)
+                yield
+                if i >= pipeline_stages:
+                    expected = reference(vectors[i - pipeline_stages]) & (2**len(dut.o) - 1)
+                    if (yield dut.o) != expected:
+                        errors.append(i)
+        run_simulation(dut, generator())
+        self.assertEqual(errors, [])
+
+    def test_pipelined_reduce(self):
+        for n in [1, 2, 7, 64]:
+            for pipeline_stages in [1, 2, 4, 8]:
+                self.pipelined_reduce_test("OR",  n, pipeline_stages, lambda v: reduce(or_,  v))
+                self.pipelined_reduce_test("XOR", n, pipeline_stages, lambda v: reduce(xor,  v))
+                self.pipelined_reduce_test("ADD", n, pipeline_stages, lambda v: sum(v))
@@ -0,0 +1,533 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import io
+import os
+import json
+import zlib
+import socket
+import tempfile
+import threading
+import unittest
+import contextlib
+import collections
+from unittest import mock
+
+from litex.tools.litex_server import RemoteServer
+from litex.tools.litex_client import RemoteClient, read_memory, write_memory
+from litex.tools.remote.csr_builder import CSRBuilder, CSRMap, load_csr_map
+from litex.tools.remote.comm_pcie import CommPCIe
+from litex.tools.remote.comm_udp import CommUDP
+from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
+from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites, EtherboneIPC
+from litex.tools.remote.etherbone import EtherboneWrite
+
+# Memory Comm --------------------------------------------------------------------------------------
+
+class CommMemory:
+    def __init__(self):
+        self.mem   = {}
+        self.reads = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def read(self, addr, length=None, burst="incr"):
+        length_int = 1 if length is None else length
+        incr       = (burst == "incr")
+        self.reads.append((addr, length_int, burst))
+        datas = [self.mem.get(addr + 4*incr*i, 0) for i in range(length_int)]
+        return datas[0] if length is None else datas
+
+    def write(self, addr, datas):
+        datas = datas if isinstance(datas, list) else [datas]
+        for i, data in enumerate(datas):
+            self.mem[addr + 4*i] = data
+
+# UDP Etherbone Server ----------------------------------------------------------------------------
+
+class UDPEtherboneServer:
+    """Etherbone over UDP server on CommMemory, dropping every ``drop``-th received packet."""
+    def __init__(self, drop=0):
+        self.comm    = CommMemory()
+        self.drop    = drop
+        self.packets = 0
+        self.socket  = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("localhost", 0))
+        self.socket.settimeout(0.01)
+        self.port    = self.socket.getsockname()[1]
+        self.running = True
+        self.thread  = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            try:
+                datas, addr = self.socket.recvfrom(8192)
+            except socket.timeout:
+                continue
+            self.packets += 1
+            if self.drop and (self.packets % self.drop) == 0:
+                continue
+            packet = EtherbonePacket(32, datas)
+            packet.decode()
+            reply = EtherbonePacket(32)
+            reply.pr = packet.pf
+            for record in packet.records:
+                if record.writes is not None:
+                    self.comm.write(record.writes.base_addr, record.writes.get_datas())
+                if record.reads is not None:
+                    r = EtherboneRecord(4)
+                    r.writes = EtherboneWrites(addr_size=4,
+                        base_addr = record.reads.base_ret_addr,
+                        datas     = [self.comm.read(addr) for addr in record.reads.get_addrs()])
+                    reply.records.append(r)
+            if reply.records or reply.pr:
+                reply.encode()
+                self.socket.sendto(reply.bytes, addr)
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.socket.close()
+
+# Test Remote --------------------------------------------------------------------------------------
+
+class TestRemote(unittest.TestCase):
+    def test_etherbone_codec(self):
+        reference = bytes.fromhex(
+            "4e6f104400000000" + # Packet header.
+            "100f0203"         + # Record header.
+            "00001000" + "12345678" + "deadbeef" + # Writes.
+            "0000002a" + "00002000" + "00002004" + "00003000") # Reads.
+        def packet():
+            record = EtherboneRecord(4)
+            record.cyc    = 1
+            record.writes = EtherboneWrites(addr_size=4, base_addr=0x1000, datas=[0x12345678, 0xdeadbeef])
+            record.reads  = EtherboneReads(addr_size=4, base_ret_addr=0x2a, addrs=[0x2000, 0x2004, 0x3000])
+            packet = EtherbonePacket(32)
+            packet.records = [record]
+            return packet
+
+        # Encode.
+        p = packet()
+        p.encode()
+        self.assertEqual(bytes(p.bytes), reference)
+        buffer = bytearray(256)
+        p = packet()
+        p.encode(buffer)
+        self.assertEqual(bytes(p.bytes), reference)
+        with self.assertRaises(ValueError):
+            packet().encode(bytearray(16))
+        self.assertEqual([w.data for w in p.records[0].writes], [0x12345678, 0xdeadbeef])
+        self.assertEqual(len(p.records[0].reads), 3)
+
+        # Decode.
+        p = EtherbonePacket(32, reference)
+        p.decode()
+        record, = p.records
+        self.assertEqual((record.cyc, record.byte_enable, record.wcount, record.rcount), (1, 0xf, 2, 3))
+        self.assertEqual(record.writes.base_addr, 0x1000)
+        self.assertEqual(record.writes.get_datas(), [0x12345678, 0xdeadbeef])
+        self.assertEqual(record.reads.base_ret_addr, 0x2a)
+        self.assertEqual(record.reads.get_addrs(), [0x2000, 0x2004, 0x3000])
+        self.assertEqual([r.addr for r in record.reads.reads], [0x2000, 0x2004, 0x3000])
+        self.assertEqual([r.addr for r in record.reads], [0x2000, 0x2004, 0x3000])
+        self.assertTrue(all(isinstance(w, EtherboneWrite) for w in record.writes))
+
+    def server_test(self, nclients=4, naccesses=64, **kwargs):
+        comm   = CommMemory()
+        server = RemoteServer(comm, "localhost", 0, **kwargs)
+        server.open()
+        server.start()
+        port   = server.socket.getsockname()[1]
+        errors = []
+        def client_thread(n):
+            bus = RemoteClient(port=port)
+            bus.open()
+            try:
+                for i in range(naccesses):
+                    addr = 0x1000*n + 4*i
+                    bus.write(addr, [i + n, i*n])
+                    if bus.read(addr, length=2) != [i + n, i*n]:
+                        errors.append((n, i))
+            finally:
+                bus.close()
+        try:
+            threads = [threading.Thread(target=client_thread, args=(n,)) for n in range(nclients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.close()
+        self.assertEqual(errors, [])
+        return comm
+
+    def test_server_clients(self):
+        self.server_test()
+
+    def test_server_clients_coalesce(self):
+        self.server_test(coalesce=True)
+
+    def test_client_pipelined_reads(self):
+        comm   = CommMemory()
+        comm.mem.update({4*i: i*0x01010101 for i in range(256)})
+        server = RemoteServer(comm, "localhost", 0)
+        server.open()
+        server.start()
+        try:
+            bus = RemoteClient(port=server.socket.getsockname()[1], window=4)
+            bus.open()
+            # Futures.
+            requests = [bus.read_async(4*i) for i in range(16)]
+            self.assertLessEqual(len(bus.pending), 4)
+            self.assertEqual([r.result() for r in reversed(requests)], [i*0x01010101 for i in reversed(range(16))])
+            # Read many (single words and bursts), interleaved with writes.
+            reads = [4*i for i in range(64)] + [(0x100, 8), (0x200, 4, "fixed")]
+            datas = bus.read_many(reads)
+            self.assertEqual(datas[:64], [i*0x01010101 for i in range(64)])
+            self.assertEqual(datas[64], [i*0x01010101 for i in range(64, 72)])
+            self.assertEqual(datas[65], [0x80808080]*4)
+            request = bus.read_async(0x300)
+            bus.write(0x300, 0x12345678)
+            self.assertEqual([bus.read(0x300), request.result()], [0x12345678, 0xc0c0c0c0])
+            bus.close()
+        finally:
+            server.close()
+
+    def test_client_memory_file(self):
+        comm   = CommMemory()
+        server = RemoteServer(comm, "localhost", 0)
+        server.open()
+        server.start()
+        port   = server.socket.getsockname()[1]
+        data   = bytes((i*13 + 7) & 0xff for i in range(10000))
+        try:
+            with tempfile.TemporaryDirectory() as d, contextlib.redirect_stdout(None):
+                for endianness in ["little", "big"]:
+                    wfile = os.path.join(d, "w.bin")
+                    rfile = os.path.join(d, "r.bin")
+                    with open(wfile, "wb") as f:
+                        f.write(data)
+                    write_memory("localhost", None, port, 0x1000, 0, file=wfile,
+                        endianness=endianness, verify=True)
+                    read_memory("localhost", None, port, 0x1000, len(data), file=rfile,
+                        endianness=endianness, verify=True)
+                    with open(rfile, "rb") as f:
+                        self.assertEqual(f.read(), data)
+            # Partial last word: CRC/length reported on the exact payload.
+            with tempfile.TemporaryDirectory() as d:
+                for endianness in ["little", "big"]:
+                    wfile = os.path.join(d, "w.bin")
+                    with open(wfile, "wb") as f:
+                        f.write(data[:1003])
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(output):
+                        write_memory("localhost", None, port, 0x2000, 0, file=wfile,
+                            endianness=endianness, verify=True)
+                    self.assertIn("Wrote 1003 bytes", output.getvalue())
+                    self.assertIn(f"CRC32: 0x{zlib.crc32(data[:1003]):08x}", output.getvalue())
+                    rfile  = os.path.join(d, "r.bin")
+                    output = io.StringIO()
+                    with contextlib.redirect_stdout(output):
+                        read_memory("localhost", None, port, 0x2000, 1003, file=rfile,
+                            endianness=endianness, verify=True)
+                    self.assertIn("Read 1003 bytes", output.getvalue())
+                    self.assertIn("Read verification: OK.", output.getvalue())
+                    with open(rfile, "rb") as f:
+                        self.assertEqual(f.read(), data[:1003])
+        finally:
+            server.close()
+
+    csr_csv = [
+        "csr_base,ctrl,0x00000000,,",
+        "csr_base,timer,0x00000800,,",
+        "constant,config_csr_data_width,8,,",
+        "constant,config_bus_address_width,32,,",
+        "constant,config_cpu_type,vexriscv,,",
+        "csr_register,ctrl_reset,0x00000000,1,rw",
+        "csr_register,ctrl_scratch,0x00000004,4,rw",
+        "csr_register,timer_value,0x00000810,4,ro",
+        "memory_region,sram,0x10000000,8192,cached",
+    ]
+
+    def test_csr_map_cache(self):
+        def registers(csr):
+            return {n: (r.addr, r.length, r.mode) for n, r in csr.regs.d.items()}
+        with tempfile.TemporaryDirectory() as d:
+            filename  = os.path.join(d, "csr.csv")
+            cache_dir = os.path.join(d, "cache")
+            with open(filename, "w") as f:
+                f.write("\n".join(self.csr_csv) + "\n")
+            with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": cache_dir}):
+                csr = CSRBuilder(CommMemory(), filename)
+                self.assertEqual(registers(csr), {
+                    "ctrl_reset"   : (0x000, 1, "rw"),
+                    "ctrl_scratch" : (0x004, 4, "rw"),
+                    "timer_value"  : (0x810, 4, "ro")})
+                self.assertEqual(csr.bases.d, {"ctrl": 0, "timer": 0x800})
+                self.assertEqual(csr.constants.config_cpu_type, "vexriscv")
+                self.assertEqual(csr.mems.sram.base, 0x10000000)
+                self.assertEqual(len(os.listdir(os.path.join(cache_dir, "litex", "csr"))), 1)
+
+            # Cache hits (also with a new mtime but same content), then miss on modification.
+            with mock.patch.object(CSRMap, "from_file", wraps=CSRMap.from_file) as from_file:
+                csr_map = load_csr_map(filename, cache_dir=os.path.join(cache_dir, "litex", "csr"))
+                self.assertEqual(csr_map.index["timer_value"], 2)
+                os.utime(filename, ns=(0, 0))
+                load_csr_map(filename, cache_dir=os.path.join(cache_dir, "litex", "csr"))
+                self.assertEqual(from_file.call_count, 0)
+                with open(filename, "a") as f:
+                    f.write("csr_register,timer_en,0x00000820,1,rw\n")
+                csr_map = load_csr_map(filename, cache_dir=os.path.join(cache_dir, "litex", "csr"))
+                self.assertEqual(from_file.call_count, 1)
+                self.assertEqual(csr_map.names[-1], "timer_en")
+
+            # JSON.
+            json_filename = os.path.join(d, "csr.json")
+            with open(json_filename, "w") as f:
+                json.dump({
+                    "csr_bases"     : {"ctrl": 0, "timer": 0x800},
+                    "csr_registers" : {name: {"addr": addr, "size": length, "type": mode}
+                        for name, (addr, length, mode) in registers(csr).items()},
+                    "constants"     : {"config_csr_data_width": 8, "config_bus_address_width": 32},
+                    "memories"      : {"sram": {"base": 0x10000000, "size": 8192, "type": "cached"}},
+                }, f)
+            csr_json = CSRBuilder(CommMemory(), json_filename, csr_cache=False)
+            self.assertEqual(registers(csr_json), registers(csr))
+            self.assertEqual(csr_json.mems.sram.size, 8192)
+
+    def test_csr_snapshot(self):
+        csr_csv = [
+            "constant,config_csr_data_width,8,,",
+            "constant,config_bus_address_width,32,,",
+            "csr_register,ctrl_reset,0x00000000,1,rw",
+            "csr_register,ctrl_scratch,0x00000004,4,rw",
+            "csr_register,ctrl_bus_errors,0x00000014,4,ro",
+            "csr_register,timer_load,0x00000800,4,wo",
+            "csr_register,timer_value,0x00000810,4,ro",
+            "csr_register,timer_en,0x00000820,1,rw",
+        ]
+        comm = CommMemory()
+        comm.mem.update({4*i: i & 0xff for i in range(1024)})
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "csr.csv")
+            with open(filename, "w") as f:
+                f.write("\n".join(csr_csv) + "\n")
+            csr = CSRBuilder(comm, filename)
+        values = csr.snapshot()
+        self.assertEqual(values, {name: r.read() for name, r in csr.regs.d.items() if r.mode != "wo"})
+        self.assertEqual(values["ctrl_scratch"], 0x01020304)
+        self.assertEqual(comm.reads[:2], [(0x000, 9, "incr"), (0x810, 5, "incr")])
+        self.assertEqual(list(csr.snapshot(filter="timer")), ["timer_value", "timer_en"])
+
+    def test_server_next_requests(self):
+        class Record:
+            def __init__(self, writes=None):
+                self.writes = writes
+        class Client:
+            def __init__(self, *records):
+                self.records = collections.deque(records)
+        r = [Record() for i in range(5)]
+        w = Record(writes=[0])
+        server = RemoteServer(CommMemory(), "localhost")
+        a, b, c = Client(r[0], r[1]), Client(w, r[2]), Client(r[3])
+        # Round-robin.
+        server.clients = collections.deque([a, b, c])
+        self.assertEqual([req[1] for req in server._next_requests()], [r[0]])
+        self.assertEqual([req[1] for req in server._next_requests()], [w])
+        self.assertEqual([req[1] for req in server._next_requests()], [r[3]])
+        self.assertEqual([req[1] for req in server._next_requests()], [r[1]])
+        # Coalescing: reads are grouped, writes executed alone.
+        a, b, c = Client(r[0], r[1]), Client(w, r[2]), Client(r[3])
+        server.clients  = collections.deque([a, b, c])
+        server.coalesce = True
+        self.assertEqual([req[1] for req in server._next_requests()], [r[0]])
+        self.assertEqual([req[1] for req in server._next_requests()], [w])
+        self.assertEqual([req[1] for req in server._next_requests()], [r[3], r[1], r[2]])
+        self.assertEqual(server._next_requests(), [])
+
+    def test_client_responses(self):
+        def serve(s, info, tag):
+            client, addr = s.accept()
+            client.sendall(info)
+            with client:
+                while True:
+                    request = EtherboneIPC().receive_packet(client, 4)
+                    if request == 0:
+                        return
+                    packet = EtherbonePacket(32, request)
+                    packet.decode()
+                    reads = packet.records[0].reads
+                    if reads.get_addrs()[0] == 0xdead0000:
+                        continue # No response.
+                    record = EtherboneRecord(4)
+                    record.writes = EtherboneWrites(addr_size=4,
+                        base_addr = reads.base_ret_addr if tag else 0,
+                        datas     = [0x5a]*len(reads))
+                    reply = EtherbonePacket(32)
+                    reply.records = [record]
+                    reply.encode()
+                    client.sendall(reply.bytes)
+        def client(info, tag):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.bind(("localhost", 0))
+            s.listen()
+            thread = threading.Thread(target=serve, args=(s, info, tag))
+            thread.start()
+            bus = RemoteClient(port=s.getsockname()[1], timeout_error=True)
+            bus.open()
+            bus.socket.settimeout(0.1)
+            return s, thread, bus
+
+        for info, tag, error in [
+            (b"CommMemory:localhost:1234:tags", True,  None),
+            (b"CommMemory:localhost:1234",      False, None),       # Legacy server: tag 0 accepted.
+            (b"CommMemory:localhost:1234:tags", False, ValueError), # Tag 0 from a tagged server.
+            ]:
+            s, thread, bus = client(info, tag)
+            try:
+                if error is None:
+                    self.assertEqual(bus.read_many([0x0, (0x4, 2)]), [0x5a, [0x5a]*2])
+                else:
+                    with self.assertRaises(error):
+                        bus.read(0x0)
+                # Timeout: raised for all outstanding reads (with timeout_error).
+                requests = [bus.read_async(0xdead0000), bus.read_async(0xdead0000, 2)]
+                for request in requests:
+                    with self.assertRaises(TimeoutError):
+                        request.result()
+            finally:
+                bus.close()
+                thread.join()
+                s.close()
+
+        # Timeout: default values returned (without timeout_error).
+        s, thread, bus = client(b"CommMemory:localhost:1234:tags", True)
+        try:
+            bus.timeout_error = False
+            self.assertEqual(bus.read_many([0xdead0000, (0xdead0000, 2)]), [0, [0, 0]])
+        finally:
+            bus.close()
+            thread.join()
+            s.close()
+
+        # Tags wrap on the address width.
+        bus = RemoteClient()
+        bus.csr_bus_address_width = 16
+        bus.tag = 2**16 - 1
+        bus._send_read = lambda *args: None
+        self.assertEqual(bus.read_async(0).tag, 1)
+
+    def test_server_errors(self):
+        class CommFaulty(CommMemory):
+            def read(self, addr, length=None, burst="incr"):
+                if addr == 0xdead0000:
+                    raise OSError("Comm failure.")
+                return CommMemory.read(self, addr, length, burst)
+        def connect(port):
+            s = socket.create_connection(("localhost", port))
+            s.settimeout(2.0)
+            s.recv(128) # Server info.
+            return s
+        def read_packet(addr):
+            record = EtherboneRecord(4)
+            record.reads  = EtherboneReads(addr_size=4, base_ret_addr=0, addrs=[addr])
+            record.rcount = 1
+            packet = EtherbonePacket(32)
+            packet.records = [record]
+            packet.encode()
+            return bytes(packet.bytes)
+        server = RemoteServer(CommFaulty(), "localhost", 0)
+        server.open()
+        server.start()
+        port   = server.socket.getsockname()[1]
+        try:
+            bus = RemoteClient(port=port)
+            bus.open()
+            bus.write(0x100, 0x12345678)
+            with contextlib.redirect_stdout(None):
+                # Malformed packet: only this client is disconnected.
+                s = connect(port)
+                s.sendall(bytes(8) + bytes([0, 0, 0, 1]) + bytes(8))
+                self.assertEqual(s.recv(128), b"")
+                s.close()
+                self.assertEqual(bus.read(0x100), 0x12345678)
+                # Comm error: client of the failed request is closed, server keeps running.
+                s = connect(port)
+                s.sendall(read_packet(0xdead0000))
+                self.assertEqual(s.recv(128), b"")
+                s.close()
+                self.assertEqual(bus.read(0x100), 0x12345678)
+            bus.close()
+        finally:
+            server.close()
+
+    def test_comm_pcie(self):
+        # Regular file standing in for the BAR.
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(bytes(4096))
+            f.flush()
+            comm = CommPCIe(f.name)
+            comm.open()
+            comm.write(0x10, 0x12345678)
+            comm.write(0x20, list(range(64)))
+            comm.write(0x200, bytes(range(16)))
+            self.assertEqual(comm.read(0x10), 0x12345678)
+            self.assertEqual(comm.read(0x20, 64), list(range(64)))
+            self.assertEqual(comm.read(0x20, 4, burst="fixed"), [0]*4)
+            self.assertEqual(comm.read_bulk(0x200, 4).tobytes(), bytes(range(16)))
+            results = comm.benchmark(length=256, duration=0.01, write=True)
+            self.assertEqual(list(results), ["read", "write"])
+            self.assertEqual(comm.read(0x20, 64), list(range(64)))
+            comm.close()
+            comm.close()
+
+    def comm_udp_test(self, drop=0, **kwargs):
+        server = UDPEtherboneServer(drop=drop)
+        server.comm.mem.update({4*i: 0x10000 + i for i in range(1024)})
+        comm = CommUDP("127.0.0.1", server.port, local_port=0, timeout=0.2, **kwargs)
+        try:
+            comm.open()
+            reads = [4*i for i in range(512)] + [(0x800, 300), (0x10, 4, "fixed")]
+            datas = comm.read_many(reads)
+            self.assertEqual(datas[:512], [0x10000 + i for i in range(512)])
+            self.assertEqual(datas[512], [0x10000 + i for i in range(0x200, 0x200 + 300)])
+            self.assertEqual(datas[513], [0x10004]*4)
+            comm.write(0x20, [1, 2, 3])
+            self.assertEqual(comm.read(0x20, 3), [1, 2, 3])
+            return comm.get_stats()
+        finally:
+            comm.close()
+            server.close()
+
+    def test_comm_udp(self):
+        stats = self.comm_udp_test(window=4, records_per_packet=2, max_record_reads=16)
+        self.assertEqual(stats["requests"], (512 + 300 + 4)//16 + 1)
+        self.assertGreater(stats["rtt_count"], 0)
+        self.assertIsNotNone(stats["rtt_avg"])
+
+    def test_comm_udp_loss(self):
+        stats = self.comm_udp_test(drop=5, window=8, max_record_reads=32)
+        self.assertGreater(stats["retransmissions"], 0)
+        self.assertGreater(stats["loss"], 0)
+
+    def test_comm_udp_no_retransmit(self):
+        # All packets lost: non-idempotent reads and "fixed" bursts time out without retransmission.
+        server = UDPEtherboneServer(drop=1)
+        comm   = CommUDP("127.0.0.1", server.port, local_port=0, timeout=0.05)
+        try:
+            comm.open(probe=False)
+            for reads, idempotent in [([0x0, 0x4], False), ([(0x10, 4, "fixed")], True)]:
+                with self.assertRaises(socket.timeout):
+                    comm.read_many(reads, idempotent=idempotent)
+            self.assertEqual(comm.get_stats()["retransmissions"], 0)
+        finally:
+            comm.close()
+            server.close()
@@ -0,0 +1,424 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import os
+import gzip
+import tempfile
+import unittest
+from fractions import Fraction
+
+from migen import *
+
+from litex.gen import *
+from litex.gen.sim import Simulator, run_simulation
+from litex.gen.sim.core import TimeManager
+from litex.gen.sim import SimulationJob, run_simulations
+
+from litex.soc.interconnect import stream
+
+# Test Design --------------------------------------------------------------------------------------
+
+class SimDUT(LiteXModule):
+    def __init__(self):
+        self.counter = counter = Signal(8, name="counter")
+        self.signed  = signed  = Signal((6, True))
+        self.cat     = cat     = Signal(12)
+        self.slice   = slice   = Signal(16, name="slice")
+        self.sel     = sel     = Signal(2)
+        self.muxed   = muxed   = Signal(8)
+        self.state   = state   = Signal(2)
+        self.rdata   = rdata   = Signal(8)
+
+        # Sync.
+        self.sync += [
+            counter.eq(counter + 1),
+            signed.eq(signed - 3),
+            slice[4:8].eq(counter),
+            If(counter[0],
+                slice[12:].eq(slice[12:] + 1)
+            ),
+        ]
+
+        # Comb.
+        a = Signal(4)
+        b = Signal(8)
+        self.comb += [
+            Cat(a, b).eq(Replicate(counter[:3], 4)),
+            cat.eq(Cat(b, a) ^ (signed << 2)),
+            sel.eq(counter[2:4]),
+            muxed.eq(Array([counter, cat[:8], 0x5a, signed])[sel]),
+        ]
+
+        # FSM.
+        self.fsm = fsm = FSM(reset_state="IDLE")
+        self.run = fsm.ongoing("RUN")
+        fsm.act("IDLE",
+            If(counter[1], NextState("RUN"))
+        )
+        fsm.act("RUN",
+            NextValue(state, state + 1),
+            If(state == 2, NextState("IDLE"))
+        )
+
+        # Memory.
+        mem = Memory(8, 16, init=[i*3 for i in range(16)])
+        wport = mem.get_port(write_capable=True)
+        rport = mem.get_port(async_read=True)
+        self.specials += mem, wport, rport
+        self.comb += [
+            wport.adr.eq(counter),
+            wport.dat_w.eq(counter + 0x10),
+            wport.we.eq(counter[3]),
+            rport.adr.eq(counter + 4),
+            rdata.eq(rport.dat_r),
+        ]
+
+# Parallel Jobs ------------------------------------------------------------------------------------
+
+def fifo_factory(depth):
+    return stream.SyncFIFO([("data", 16)], depth)
+
+def fifo_generators(dut):
+    dut.data = []
+    def writer():
+        for i in range(32):
+            yield dut.sink.valid.eq(1)
+            yield dut.sink.data.eq(i)
+            yield
+            while not (yield dut.sink.ready):
+                yield
+        yield dut.sink.valid.eq(0)
+
+    def reader():
+        yield dut.source.ready.eq(1)
+        while len(dut.data) < 32:
+            yield
+            if (yield dut.source.valid):
+                dut.data.append((yield dut.source.data))
+    return [writer(), reader()]
+
+def fifo_result(dut):
+    if dut.depth == 0:
+        raise ValueError("Invalid depth")
+    return dut.data
+
+class UnpicklableError(Exception):
+    def __init__(self, dut):
+        Exception.__init__(self, "Unpicklable")
+        self.dut = dut
+
+def unpicklable_result(dut):
+    if dut.depth == 2:
+        raise UnpicklableError(dut)
+    return lambda: dut.data
+
+# Test Sim -----------------------------------------------------------------------------------------
+
+class TestSim(unittest.TestCase):
+    def sim_trace(self, backend):
+        dut   = SimDUT()
+        trace = []
+        def generator():
+            for i in range(64):
+                if i == 20:
+                    yield dut.signed.eq(7)
+                trace.append((yield [dut.counter, dut.signed, dut.cat, dut.slice, dut.muxed,
+                    dut.state, dut.rdata, dut.run]))
+                yield
+        run_simulation(dut, generator(), backend=backend)
+        return trace
+
+    def test_compiled_backend(self):
+        self.assertEqual(self.sim_trace("interpreted"), self.sim_trace("compiled"))
+
+    def test_compiled_backend_fifo(self):
+        def fifo_test(backend):
+            dut = stream.SyncFIFO([("data", 16)], 8)
+            data = []
+            def writer():
+                for i in range(64):
+                    yield dut.sink.valid.eq(1)
+                    yield dut.sink.data.eq(i)
+                    yield
+                    while not (yield dut.sink.ready):
+                        yield
+                yield dut.sink.valid.eq(0)
+
+            def reader():
+                for i in range(64):
+                    yield dut.source.ready.eq(i%3 != 0)
+                    yield
+                    if (yield dut.source.valid) and (yield dut.source.ready):
+                        data.append((yield dut.source.data))
+                yield dut.source.ready.eq(1)
+                while len(data) < 64:
+                    yield
+                    if (yield dut.source.valid):
+                        data.append((yield dut.source.data))
+            run_simulation(dut, [writer(), reader()], backend=backend)
+            return data
+        self.assertEqual(fifo_test("compiled"), list(range(64)))
+        self.assertEqual(fifo_test("compiled"), fifo_test("interpreted"))
+
+    def test_comb_propagation(self):
+        for backend in ["interpreted", "compiled"]:
+            class DUT(LiteXModule):
+                def __init__(self):
+                    self.i = i = Signal(8)
+                    self.a = a = Signal(8)
+                    self.b = b = Signal(8)
+                    self.c = c = Signal(8)
+                    # Declared in reverse order of dependency.
+                    self.comb += c.eq(b + 1)
+                    self.comb += b.eq(a ^ 0xff)
+                    self.comb += If(i[0], a.eq(i)).Else(a.eq(i + 2))
+
+            dut    = DUT()
+            values = []
+            def generator():
+                for n in range(8):
+                    yield dut.i.eq(n)
+                    if n == 4:
+                        # Overriding a comb signal is undone by comb propagation.
+                        yield dut.b.eq(0)
+                    yield
+                    values.append((yield dut.c))
+            run_simulation(dut, generator(), backend=backend)
+            self.assertEqual(values, [((n + (0 if n & 1 else 2)) ^ 0xff) + 1 for n in range(8)])
+
+    def count_edges(self, time, until):
+        edges = {k: 0 for k in time.clocks.keys()}
+        while time.time < until:
+            dt, rising, falling = time.tick()
+            for k in rising:
+                edges[k] += 1
+        return edges
+
+    def test_time_manager_ratios(self):
+        time = TimeManager({"a": 10, "b": 15.0, "c": (10, 5)})
+        self.assertEqual(self.count_edges(time, 300), {"a": 30, "b": 20, "c": 30})
+        time = TimeManager({"a": 2.5, "b": 10, "c": 3.3})
+        self.assertEqual(self.count_edges(time, 33), {"a": 13, "b": 3, "c": 10})
+
+    def test_time_manager_gating(self):
+        time = TimeManager({"a": 10, "b": 20})
+        self.assertEqual(self.count_edges(time, 100), {"a": 10, "b": 5})
+        time.set_enable("a", False)
+        self.assertEqual(self.count_edges(time, 200), {"a": 0, "b": 5})
+        time.set_enable("a", True)
+        self.assertEqual(self.count_edges(time, 300), {"a": 10, "b": 5})
+        time.set_enable("a", False)
+        time.set_enable("b", False)
+        with self.assertRaises(ValueError):
+            time.tick()
+
+    def test_time_manager_jitter(self):
+        time = TimeManager({"a": (10, 0, 1)})
+        for i in range(100):
+            dt, rising, falling = time.tick()
+            self.assertGreaterEqual(dt, 0)
+            self.assertLessEqual(abs(time.time - 5*(i + 1)), 1)
+        # Jitter larger than the half-period: no zero-width half-periods (clock toggling twice at
+        # the same time).
+        for seed in range(4):
+            time = TimeManager({"a": (2, 0, 3), "b": 10}, seed=seed)
+            last = {"a": None, "b": None}
+            for i in range(200):
+                dt, rising, falling = time.tick()
+                self.assertGreater(dt, 0)
+                for k in rising + falling:
+                    self.assertEqual(rising.count(k) + falling.count(k), 1)
+                    self.assertNotEqual(last[k], time.time)
+                    last[k] = time.time
+
+    def test_time_manager_resolution(self):
+        # Decimal periods: exact times on the coarsest power of ten resolution.
+        time = TimeManager({"a": 2.5, "b": 10})
+        self.assertEqual(time.resolution, Fraction(1, 100))
+        for i in range(64):
+            time.tick()
+            self.assertEqual((time.time/time.resolution).denominator, 1)
+        # Non-decimal periods: times rounded to the resolution, without drift.
+        time = TimeManager({"a": Fraction(10, 3)}, resolution=Fraction(1, 1000))
+        for i in range(300):
+            time.tick()
+            self.assertEqual((time.time/time.resolution).denominator, 1)
+            self.assertLessEqual(abs(time.time - Fraction(5, 3)*(i + 1)), Fraction(1, 2000))
+        # Jitter.
+        time = TimeManager({"a": (10, 0, 1)}, resolution=Fraction(1, 10))
+        for i in range(64):
+            time.tick()
+            self.assertEqual((time.time/time.resolution).denominator, 1)
+
+    def test_simulator_set_enable(self):
+        class DUT(LiteXModule):
+            def __init__(self):
+                self.a = Signal(8)
+                self.b = Signal(8)
+                self.sync   += self.a.eq(self.a + 1)
+                self.sync.b += self.b.eq(self.b + 1)
+        def generator(dut, sim, values):
+            for i in range(30):
+                if i == 10:
+                    sim.set_enable("b", False)
+                if i == 20:
+                    sim.set_enable("b", True)
+                values.append((yield dut.b))
+                yield
+        dut    = DUT()
+        values = []
+        with Simulator(dut, {"sys": []}, clocks={"sys": 10, "b": 10}) as sim:
+            sim.generators["sys"].append(generator(dut, sim, values))
+            with self.assertRaises(ValueError):
+                sim.set_enable("c", False)
+            sim.run()
+        # b counts with sys, is frozen while gated and then resumes.
+        self.assertEqual(values[:10], list(range(10)))
+        self.assertEqual(len(set(values[11:21])), 1)
+        self.assertEqual(values[29] - values[21], 8)
+
+    def vcd_test(self, filename, **vcd_options):
+        dut = SimDUT()
+        def generator():
+            for i in range(32):
+                yield
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, filename)
+            run_simulation(dut, generator(), vcd_name=filename, vcd_options=vcd_options)
+            opener = gzip.open if filename.endswith(".gz") else open
+            with opener(filename, "rt") as f:
+                return f.read()
+
+    def test_vcd(self):
+        vcd = self.vcd_test("sim.vcd")
+        self.assertIn("$timescale 1ns $end", vcd)
+        self.assertIn("$enddefinitions $end", vcd)
+        self.assertIn("$dumpvars", vcd)
+        self.assertIn("counter", vcd)
+        self.assertIn("#0\n", vcd)
+        self.assertIn("#320\n", vcd)
+        self.assertEqual(sorted(vcd.splitlines()), sorted(self.vcd_test("sim.vcd.gz").splitlines()))
+
+    def test_vcd_timescale(self):
+        dut = SimDUT()
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "sim.vcd")
+            def generator():
+                for i in range(8):
+                    yield
+            run_simulation(dut, generator(), clocks={"sys": 2.5}, vcd_name=filename)
+            with open(filename) as f:
+                vcd = f.read()
+        self.assertIn("$timescale 10ps $end", vcd)
+        self.assertIn("#125\n", vcd)
+        self.assertIn("#2125\n", vcd)
+
+    def test_vcd_filter(self):
+        vcd = self.vcd_test("sim.vcd", include=["*counter*", "*slice*"], exclude="*slice*")
+        names = [l.split()[4] for l in vcd.splitlines() if l.startswith("$var")]
+        self.assertEqual(names, ["simdut_counter"])
+
+    def test_vcd_window(self):
+        vcd = self.vcd_test("sim.vcd", start=100, stop=200)
+        times = [int(l[1:]) for l in vcd.splitlines() if l.startswith("#")]
+        self.assertEqual(times[0],  100)
+        self.assertEqual(times[-1], 200)
+        self.assertTrue(all(100 <= t <= 200 for t in times))
+
+    def test_run_simulations(self):
+        depths = [2, 4, 8, 0]
+        jobs   = [SimulationJob(fifo_factory, fifo_generators, kwargs={"depth": depth},
+            result=fifo_result, backend="compiled") for depth in depths]
+        for max_workers in [1, 2]:
+            results = run_simulations(jobs, max_workers=max_workers)
+            self.assertEqual(len(results), len(depths))
+            for depth, r in zip(depths, results):
+                self.assertIs(r.job.kwargs["depth"], depth)
+                self.assertGreaterEqual(r.duration, 0)
+                if depth:
+                    self.assertIsNone(r.exception)
+                    self.assertEqual(r.check(), list(range(32)))
+                else:
+                    self.assertIsInstance(r.exception, ValueError)
+                    with self.assertRaises(RuntimeError):
+                        r.check()
+
+    def test_run_simulations_unpicklable(self):
+        jobs = [SimulationJob(fifo_factory, fifo_generators, kwargs={"depth": depth}, result=result)
+            for depth, result in [(2, unpicklable_result), (4, unpicklable_result), (4, fifo_result)]]
+        results = run_simulations(jobs, max_workers=2)
+        self.assertIsInstance(results[0].exception, RuntimeError)
+        self.assertIn("UnpicklableError", results[0].traceback)
+        self.assertIsInstance(results[1].exception, RuntimeError)
+        self.assertEqual(results[2].check(), list(range(32)))
+
+    def test_save_restore_state(self):
+        def generator(dut, n, trace):
+            for i in range(n):
+                trace.append((yield [dut.counter, dut.slice, dut.state, dut.rdata, dut.run]))
+                yield
+
+        for backend in ["interpreted", "compiled"]:
+            # Reference.
+            dut = SimDUT()
+            ref = []
+            run_simulation(dut, generator(dut, 61, ref), backend=backend)
+
+            with tempfile.TemporaryDirectory() as d:
+                filename = os.path.join(d, "state.gz")
+                # Warm-up and save.
+                dut = SimDUT()
+                with Simulator(dut, generator(dut, 40, []), backend=backend) as sim:
+                    sim.run()
+                    sim.save_state(filename)
+
+                # Restore in a new simulation and continue.
+                dut   = SimDUT()
+                trace = []
+                with Simulator(dut, generator(dut, 20, trace), backend=backend) as sim:
+                    sim.restore_state(filename)
+                    sim.run()
+            # Simulation stops on the clock edge following the last generator cycle.
+            self.assertEqual(trace, ref[41:])
+
+    def test_restore_state_vcd(self):
+        def generator(dut, n):
+            for i in range(n):
+                yield
+        def vcd_times(filename, **vcd_options):
+            with tempfile.TemporaryDirectory() as d:
+                vcd_name = os.path.join(d, "sim.vcd")
+                dut = SimDUT()
+                with Simulator(dut, generator(dut, 10), vcd_name=vcd_name, vcd_options=vcd_options) as sim:
+                    sim.restore_state(filename)
+                    sim.run()
+                with open(vcd_name) as f:
+                    return [int(l[1:]) for l in f.read().splitlines() if l.startswith("#")]
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "state.gz")
+            dut = SimDUT()
+            with Simulator(dut, generator(dut, 40)) as sim:
+                sim.run()
+                sim.save_state(filename)
+            t = sim.time.time
+            # Restored in the dump window: dump starts at the restored time.
+            times = vcd_times(filename, start=100)
+            self.assertEqual(times[0], t)
+            # Restored after the dump window: nothing dumped.
+            self.assertEqual(vcd_times(filename, start=100, stop=200), [])
+
+    def test_restore_state_mismatch(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "state.gz")
+            with Simulator(SimDUT(), []) as sim:
+                sim.save_state(filename)
+            with Simulator(stream.SyncFIFO([("data", 8)], 4), []) as sim:
+                with self.assertRaises(ValueError):
+                    sim.restore_state(filename)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            run_simulation(SimDUT(), [], backend="unknown")
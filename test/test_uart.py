@@ -0,0 +1,68 @@
+#
+# This file is part of LiteX.
+#
+# SPDX-License-Identifier: BSD-2-Clause
+
+import unittest
+
+from migen import *
+
+from litex.gen import *
+from litex.gen.sim import run_simulation
+
+from litex.soc.interconnect import stream
+from litex.soc.interconnect import wishbone
+from litex.soc.cores.uart import UARTBone
+
+# Test Design --------------------------------------------------------------------------------------
+
+class PHYModel(LiteXModule):
+    def __init__(self):
+        self.source = stream.Endpoint([("data", 8)])
+        self.sink   = stream.Endpoint([("data", 8)])
+
+
+class UARTBoneDUT(LiteXModule):
+    def __init__(self, rx_fifo_depth):
+        self.phy      = PHYModel()
+        self.uartbone = UARTBone(self.phy, clk_freq=1e5, rx_fifo_depth=rx_fifo_depth)
+        self.sram     = wishbone.SRAM(64, init=[0x11223344*i & 0xffffffff for i in range(16)])
+        self.comb += self.uartbone.wishbone.connect(self.sram.bus)
+
+# Test UART ----------------------------------------------------------------------------------------
+
+class TestUART(unittest.TestCase):
+    def uartbone_test(self, rx_fifo_depth):
+        dut = UARTBoneDUT(rx_fifo_depth)
+        rx  = []
+
+        # Two read commands (2 words from word 1 and 1 word from word 8), sent back-to-back with
+        # no flow-control (like a UART PHY).
+        commands = [0x02, 2, 0, 0, 0, 1, 0x02, 1, 0, 0, 0, 8]
+        def phy_rx():
+            for byte in commands:
+                yield dut.phy.source.valid.eq(1)
+                yield dut.phy.source.data.eq(byte)
+                yield
+                yield dut.phy.source.valid.eq(0)
+                for i in range(3):
+                    yield
+
+        # UART PHY TX: one byte every 8 cycles.
+        def phy_tx():
+            for i in range(400):
+                yield dut.phy.sink.ready.eq((i % 8) == 0)
+                yield
+                if (yield dut.phy.sink.valid) and (yield dut.phy.sink.ready):
+                    rx.append((yield dut.phy.sink.data))
+
+        run_simulation(dut, [phy_rx(), phy_tx()])
+        words = [int.from_bytes(bytes(rx[i:i + 4]), "big") for i in range(0, len(rx), 4)]
+        return words
+
+    def test_uartbone(self):
+        # Without RX FIFO, second command is lost while the first one is responding.
+        self.assertEqual(self.uartbone_test(rx_fifo_depth=0), [0x11223344, 0x22446688])
+
+    def test_uartbone_rx_fifo(self):
+        self.assertEqual(self.uartbone_test(rx_fifo_depth=16), [0x11223344, 0x22446688, 0x89119a20])
@@ -317,3 +317,253 @@ class TestWishbone(unittest.TestCase):
 
     def test_origin_region_remap_word(self):
         self.origin_region_remap_test(addressing="word")
+
+    def crossbar_test(self, interconnect, connectivity=None, **kwargs):
+        def generator(dut, n):
+            for i in range(8):
+                for j, mem in enumerate(dut.mems):
+                    if dut.reachable(n, j):
+                        yield from dut.masters[n].write((j << 8) | (n << 4) | i, (n << 24) | (j << 16) | i)
+            for i in range(8):
+                for j, mem in enumerate(dut.mems):
+                    if dut.reachable(n, j):
+                        data = (yield from dut.masters[n].read((j << 8) | (n << 4) | i))
+                        self.assertEqual(data, (n << 24) | (j << 16) | i)
+
+        class DUT(LiteXModule):
+            def __init__(self, n_masters=3, n_slaves=3):
+                self.masters = [wishbone.Interface(data_width=32, adr_width=30) for _ in range(n_masters)]
+                slaves       = [wishbone.Interface(data_width=32, adr_width=30) for _ in range(n_slaves)]
+                self.mems    = [wishbone.SRAM(1024, bus=s) for s in slaves]
+                self.submodules += self.mems
+                decoders = [lambda a, j=j: a[8:10] == j for j in range(n_slaves)]
+                self.interconnect = interconnect(self.masters, list(zip(decoders, slaves)),
+                    connectivity=connectivity, **kwargs)
+
+            def reachable(self, n, j):
+                return (connectivity is None) or connectivity[n][j]
+
+        dut = DUT()
+        run_simulation(dut, [generator(dut, n) for n in range(len(dut.masters))])
+
+    def test_crossbar(self):
+        self.crossbar_test(wishbone.Crossbar)
+
+    def test_crossbar_connectivity(self):
+        connectivity = [[1, 1, 1], [1, 0, 0], [0, 1, 1]]
+        self.crossbar_test(wishbone.Crossbar,          connectivity=connectivity)
+        self.crossbar_test(wishbone.PipelinedCrossbar, connectivity=connectivity)
+        with self.assertRaises(ValueError):
+            self.crossbar_test(wishbone.Crossbar, connectivity=[[1, 1, 1], [0, 0, 0], [1, 1, 1]])
+        with self.assertRaises(ValueError):
+            self.crossbar_test(wishbone.Crossbar, connectivity=[[1, 1], [1, 1], [1, 1]])
+
+    def test_pipelined_crossbar(self):
+        self.crossbar_test(wishbone.PipelinedCrossbar)
+        self.crossbar_test(wishbone.PipelinedCrossbar, register=True)
+        self.crossbar_test(wishbone.PipelinedCrossbar, register_masters=False)
+        self.crossbar_test(wishbone.PipelinedCrossbar, register_slaves=False)
+
+    def burst(self, bus, adr, n, datas=None, bte=0b00, abort=None):
+        # Incrementing burst of n accesses (reads if datas is None), returns read datas and cycles.
+        mask   = [0b0000, 0b0011, 0b0111, 0b1111][bte]
+        reads  = []
+        cycles = 0
+        yield bus.cyc.eq(1)
+        yield bus.stb.eq(1)
+        yield bus.we.eq(datas is not None)
+        yield bus.sel.eq(2**len(bus.sel) - 1)
+        yield bus.bte.eq(bte)
+        for i in range(n):
+            if i == abort:
+                break
+            yield bus.adr.eq((adr & ~mask) | ((adr + i) & mask) if mask else adr + i)
+            yield bus.cti.eq(wishbone.CTI_BURST_END if i == n - 1 else wishbone.CTI_BURST_INCREMENTING)
+            if datas is not None:
+                yield bus.dat_w.eq(datas[i])
+            yield
+            cycles += 1
+            while not ((yield bus.ack) or (yield bus.err)):
+                yield
+                cycles += 1
+            reads.append((yield bus.dat_r))
+        yield bus.cyc.eq(0)
+        yield bus.stb.eq(0)
+        yield bus.cti.eq(0)
+        yield bus.bte.eq(0)
+        yield
+        return reads, cycles
+
+    def burst_test(self, interconnect, **kwargs):
+        class DUT(LiteXModule):
+            def __init__(self):
+                self.master = wishbone.Interface(data_width=32, adr_width=30)
+                slave       = wishbone.Interface(data_width=32, adr_width=30, bursting=True)
+                self.mem    = wishbone.SRAM(1024, bus=slave, init=[0x100 + i for i in range(256)])
+                self.interconnect = interconnect([self.master], [(lambda a: 1, slave)], **kwargs)
+
+        stats = {}
+        def generator(dut):
+            # Incrementing/wrapping read bursts.
+            reads, stats["read"] = yield from self.burst(dut.master, 0x10, 64)
+            self.assertEqual(reads, [0x100 + 0x10 + i for i in range(64)])
+            reads, _ = yield from self.burst(dut.master, 0x26, 8, bte=0b10)
+            self.assertEqual(reads, [0x100 + 0x20 + (6 + i)%8 for i in range(8)])
+            # Write burst.
+            _, stats["write"] = yield from self.burst(dut.master, 0x80, 64, datas=[0x200 + i for i in range(64)])
+            reads, _ = yield from self.burst(dut.master, 0x7f, 66)
+            self.assertEqual(reads, [0x17f] + [0x200 + i for i in range(64)] + [0x1c0])
+            # Aborted bursts (cyc deasserted) then classic accesses.
+            yield from self.burst(dut.master, 0x00, 16, abort=5)
+            yield from self.burst(dut.master, 0x40, 16, datas=[0x300 + i for i in range(16)], abort=3)
+            yield dut.master.cyc.eq(1)
+            yield dut.master.stb.eq(1)
+            yield dut.master.adr.eq(0x50)
+            yield
+            yield dut.master.cyc.eq(0)
+            yield dut.master.stb.eq(0)
+            yield
+            yield from dut.master.write(0x30, 0xdeadbeef)
+            self.assertEqual((yield from dut.master.read(0x30)), 0xdeadbeef)
+            self.assertEqual((yield from dut.master.read(0x31)), 0x131)
+            reads, _ = yield from self.burst(dut.master, 0x40, 4)
+            self.assertEqual(reads, [0x300, 0x301, 0x302, 0x143])
+
+        dut = DUT()
+        run_simulation(dut, generator(dut))
+        return stats
+
+    def test_pipelined_crossbar_bursts(self):
+        crossbar  = self.burst_test(wishbone.Crossbar)
+        pipelined = self.burst_test(wishbone.PipelinedCrossbar)
+        # Bursts are pipelined through the slices (latency only added once per burst).
+        for k in ["read", "write"]:
+            self.assertLess(pipelined[k], crossbar[k] + 16)
+            self.assertLess(pipelined[k], 64*1.25)
+
+    def cache_test(self, accesses, master_width=32, slave_width=32, cachesize=64, **kwargs):
+        # Master words initialized to 0x10000 + address, accesses as (adr, dat, sel) with dat=None for reads.
+        ratio = max(slave_width//master_width, 1)
+        split = max(master_width//slave_width, 1)
+        def slave_word(n):
+            if ratio > 1:
+                return sum((0x10000 + n*ratio + i) << (master_width*i) for i in range(ratio))
+            return ((0x10000 + n//split) >> (slave_width*(n%split))) & (2**slave_width - 1)
+
+        class DUT(LiteXModule):
+            def __init__(self):
+                self.master = wishbone.Interface(data_width=master_width, address_width=32, addressing="word")
+                self.slave  = wishbone.Interface(data_width=slave_width,  address_width=32, addressing="word", bursting=True)
+                self.cache  = wishbone.SetAssociativeCache(cachesize, self.master, self.slave, reverse=False, **kwargs)
+                self.mem    = wishbone.SRAM(1024*slave_width//8, bus=self.slave, init=[slave_word(n) for n in range(1024)])
+
+        model = {}
+        stats = {"hit": 0, "miss": 0, "eviction": 0}
+        def generator(dut):
+            self.latencies = []
+            for adr, dat, sel in accesses:
+                if dat is None:
+                    cycles = 0
+                    yield dut.master.adr.eq(adr)
+                    yield dut.master.we.eq(0)
+                    yield dut.master.cyc.eq(1)
+                    yield dut.master.stb.eq(1)
+                    yield
+                    while not (yield dut.master.ack):
+                        cycles += 1
+                        yield
+                    yield dut.master.cyc.eq(0)
+                    yield dut.master.stb.eq(0)
+                    self.assertEqual((yield dut.master.dat_r), model.get(adr, 0x10000 + adr))
+                    self.latencies.append(cycles)
+                    yield
+                else:
+                    mask = sum(0xff << (8*i) for i in range(master_width//8) if (sel >> i) & 0b1)
+                    model[adr] = (model.get(adr, 0x10000 + adr) & ~mask) | (dat & mask)
+                    yield from dut.master.write(adr, dat, sel=sel)
+            for i in range(32):
+                yield
+            self.mem = []
+            for i in range(1024):
+                self.mem.append((yield dut.mem.mem[i]))
+
+        def monitor(dut):
+            while True:
+                for name in stats.keys():
+                    stats[name] += (yield getattr(dut.cache, name))
+                yield
+
+        dut = DUT()
+        run_simulation(dut, [generator(dut), passive(monitor)(dut)])
+        return stats
+
+    def cache_random_accesses(self, n, size, width=32, seed=0):
+        import random
+        prng     = random.Random(seed)
+        accesses = []
+        for i in range(n):
+            adr = prng.randrange(size)
+            if prng.random() < 0.4:
+                accesses.append((adr, prng.randrange(2**width), prng.choice([2**(width//8) - 1, 0b1, 0b10])))
+            else:
+                accesses.append((adr, None, None))
+        return accesses
+
+    def test_set_associative_cache(self):
+        for kwargs in [
+            {"ways": 1},
+            {"ways": 2, "replacement": "lru"},
+            {"ways": 4, "replacement": "plru"},
+            {"ways": 4, "replacement": "random"},
+            {"ways": 2, "line_words": 4},
+            {"ways": 2, "line_words": 8, "replacement": "plru"},
+            {"ways": 2, "slave_width": 128},
+            {"ways": 2, "slave_width": 128, "line_words": 2},
+            {"ways": 4, "master_width": 64, "slave_width": 32},
+        ]:
+            with self.subTest(**kwargs):
+                width = kwargs.get("master_width", 32)
+                stats = self.cache_test(self.cache_random_accesses(150, 256, width), **kwargs)
+                self.assertEqual(stats["hit"] + stats["miss"], 150)
+                self.assertGreater(stats["eviction"], 0)
+
+    def test_set_associative_cache_write_through(self):
+        accesses = self.cache_random_accesses(150, 256)
+        for kwargs in [{"ways": 2}, {"ways": 2, "line_words": 4}, {"ways": 2, "slave_width": 64}]:
+            with self.subTest(**kwargs):
+                self.cache_test(accesses, write_through=True, **kwargs)
+                # Memory is up to date without evictions.
+                model = {}
+                for adr, dat, sel in accesses:
+                    if dat is not None:
+                        mask = sum(0xff << (8*i) for i in range(4) if (sel >> i) & 0b1)
+                        model[adr] = (model.get(adr, 0x10000 + adr) & ~mask) | (dat & mask)
+                ratio = kwargs.get("slave_width", 32)//32
+                for adr, value in model.items():
+                    self.assertEqual((self.mem[adr//ratio] >> (32*(adr%ratio))) & 0xffffffff, value)
+
+    def test_set_associative_cache_replacement(self):
+        # A, B, C alias on the same set: LRU keeps A (hit), evicts B on C.
+        sequence = [(adr, None, None) for adr in [0x00, 0x40, 0x00, 0x80, 0x00, 0x40]]
+        stats = self.cache_test(sequence, ways=2, replacement="lru")
+        self.assertEqual(stats, {"hit": 2, "miss": 4, "eviction": 2})
+        stats = self.cache_test(sequence, ways=1)
+        self.assertEqual(stats, {"hit": 0, "miss": 6, "eviction": 5})
+
+    def test_set_associative_cache_critical_word_first(self):
+        # Read of the last word of a line is acked with the first refilled word.
+        sequence = [(adr, None, None) for adr in [0x07, 0x00]]
+        self.cache_test(sequence, ways=2, line_words=1)
+        latency = self.latencies[0]
+        self.cache_test(sequence, ways=2, line_words=8)
+        self.assertEqual(self.latencies[0], latency)
+
+    def test_set_associative_cache_linear_bursts(self):
+        # Lines without wrapping bursts (2, 32 words) are refilled with linear bursts.
+        for line_words in [2, 32]:
+            with self.subTest(line_words=line_words):
+                self.cache_test(self.cache_random_accesses(100, 256), ways=2, line_words=line_words, cachesize=128)
+                # Read of the last word then of the first word, waiting for the end of the refill.
+                sequence = [(adr, None, None) for adr in [line_words - 1, 0x00]]
+                self.cache_test(sequence, ways=2, line_words=line_words, cachesize=128)
+                self.assertLess(self.latencies[1], line_words + 8)